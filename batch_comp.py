@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+'''runs connectivity_comp on many raw cases using a pool of processes'''
+
+import argparse, contextlib, csv, glob, io, json, multiprocessing, os, sys, time, traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import connectivity_comp
+
+
+def load_manifest(file_name):
+    '''reads the cases to process from a .json list or .csv table, each case
+    has a raw_file and optionally bus_geolocations and output'''
+    if file_name.lower().endswith('.json'):
+        with open(file_name, 'r') as jsonfile:
+            cases = json.load(jsonfile)
+    elif file_name.lower().endswith('.csv'):
+        with open(file_name, 'r') as csvfile:
+            cases = [dict(row) for row in csv.DictReader(csvfile)]
+    else:
+        raise ValueError("Invalid file extension")
+
+    for case in cases:
+        for key in list(case.keys()):
+            if case[key] == None or len(str(case[key]).strip()) == 0:
+                del case[key]
+    return cases
+
+
+def glob_cases(pattern, bus_geolocations=None):
+    cases = []
+    for raw_file in sorted(glob.glob(pattern)):
+        case = {'raw_file': raw_file}
+        if bus_geolocations != None:
+            case['bus_geolocations'] = bus_geolocations
+        cases.append(case)
+    return cases
+
+
+def case_output(case, output_dir):
+    if 'output' in case:
+        return case['output']
+    name = os.path.splitext(os.path.basename(case['raw_file']))[0]
+    return os.path.join(output_dir, name + '.json')
+
+
+def check_outputs(cases, output_dir, log_dir=None):
+    '''raises a ValueError if two cases would write the same output (or log)
+    file, e.g. globbed a/case.raw and b/case.raw'''
+    files = {}
+    for case in cases:
+        output = case_output(case, output_dir)
+        paths = [output]
+        if log_dir != None:
+            name = os.path.splitext(os.path.basename(output))[0]
+            paths.append(os.path.join(log_dir, name + '.log'))
+        for path in paths:
+            files.setdefault(os.path.normcase(os.path.abspath(path)), []).append(case['raw_file'])
+
+    duplicates = ['{} <- {}'.format(path, ', '.join(raw_files)) for path, raw_files in sorted(files.items()) if len(raw_files) > 1]
+    if len(duplicates) > 0:
+        raise ValueError('cases with the same output file, give them explicit outputs in a manifest: {}'.format('; '.join(duplicates)))
+
+
+def case_arguments(case, output_dir, options):
+    arguments = [case['raw_file'], '-o', case_output(case, output_dir)]
+    if 'bus_geolocations' in case:
+        arguments.extend(['-g', case['bus_geolocations']])
+    return arguments + list(options)
+
+
+def run_case(arguments, log_file=None):
+    '''runs connectivity_comp with the given command line arguments, returns
+    (success, seconds, error message).  console output goes to log_file.'''
+    start = time.time()
+    log = io.StringIO()
+    error = None
+    try:
+        with contextlib.redirect_stdout(log):
+            connectivity_comp.main(connectivity_comp.build_cli_parser().parse_args(arguments))
+    except BaseException as e:
+        error = '{}: {}'.format(type(e).__name__, e)
+        log.write(traceback.format_exc())
+    seconds = time.time() - start
+
+    if log_file != None:
+        with open(log_file, 'w') as outfile:
+            outfile.write(log.getvalue())
+
+    return error == None, seconds, error
+
+
+def run_batch(cases, output_dir='.', options=(), processes=None, log_dir=None):
+    '''processes all cases, failures are recorded and do not stop the batch.
+    returns a list of per case result dicts, in the order of cases.'''
+    check_outputs(cases, output_dir, log_dir)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    if log_dir != None and not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {}
+        for case in cases:
+            log_file = None
+            if log_dir != None:
+                name = os.path.splitext(os.path.basename(case_output(case, output_dir)))[0]
+                log_file = os.path.join(log_dir, name + '.log')
+            arguments = case_arguments(case, output_dir, options)
+            result = {'raw_file': case['raw_file'], 'output': case_output(case, output_dir)}
+            results.append(result)
+            futures[executor.submit(run_case, arguments, log_file)] = result
+
+        for future in as_completed(futures):
+            result = futures[future]
+            try:
+                success, seconds, error = future.result()
+            except BaseException as e:
+                # the worker process itself failed (e.g. it was killed)
+                success, seconds, error = False, None, '{}: {}'.format(type(e).__name__, e)
+            result['success'] = success
+            result['seconds'] = seconds
+            result['error'] = error
+
+            if success:
+                print('ok     {:8.2f}s {} -> {}'.format(seconds, result['raw_file'], result['output']))
+            else:
+                print('FAILED {} - {}'.format(result['raw_file'], error))
+            sys.stdout.flush()
+
+    return results
+
+
+def main(args):
+    cases = []
+    if args.manifest != None:
+        cases.extend(load_manifest(args.manifest))
+    for pattern in args.glob:
+        cases.extend(glob_cases(pattern, args.bus_geolocations))
+
+    if len(cases) == 0:
+        print('no cases to process')
+        return 0
+
+    options = ['-k', str(args.kv_threshold)]
+    if args.compact:
+        options.append('-c')
+    if args.cache_dir != None:
+        options.extend(['--cache-dir', args.cache_dir])
+    if args.force:
+        options.append('--force')
+    if args.quiet:
+        options.append('--quiet')
+
+    start = time.time()
+    results = run_batch(cases, args.output_dir, options, args.processes, args.log_dir)
+    failures = [result for result in results if not result['success']]
+
+    print('')
+    print('Cases: %d' % len(results))
+    print('Failed: %d' % len(failures))
+    print('Time: %.2f s' % (time.time() - start))
+
+    if args.report != None:
+        with open(args.report, 'w') as outfile:
+            json.dump(results, outfile, sort_keys=True, indent=2, separators=(',', ': '))
+
+    return 1 if len(failures) > 0 else 0
+
+
+def build_cli_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('glob', nargs='*', help='glob patterns of psse files to operate on (.raw)')
+    parser.add_argument('-m', '--manifest', help='cases to process (.json/csv) with raw_file, bus_geolocations and output fields')
+    parser.add_argument('-g', '--bus-geolocations', help='bus geolocation data (.geojson/csv) used for the globbed cases')
+    parser.add_argument('-d', '--output-dir', help='where to put outputs of cases without an explicit output', default='.')
+    parser.add_argument('-l', '--log-dir', help='write the console output of each case to a log file in this directory')
+    parser.add_argument('-p', '--processes', help='number of worker processes (default: number of cpus)', type=int)
+    parser.add_argument('-r', '--report', help='write per case success, error and timing (.json)')
+    parser.add_argument('-k', '--kv-threshold', help='the minimum voltage to be represented in the network connectivity', type=float, default=0.0)
+    parser.add_argument('-c', '--compact', help='write the outputs without indentation', action='store_true', default=False)
+    parser.add_argument('--cache-dir', help='directory for caching parsed cases between runs')
+    parser.add_argument('--force', help='rebuild the outputs of cases whose inputs have not changed since they were written', action='store_true', default=False)
+    parser.add_argument('-q', '--quiet', help='only log the counts of the warnings about individual components of each case', action='store_true', default=False)
+
+    return parser
+
+
+if __name__ == '__main__':
+    # the workers of a frozen (pyinstaller) windows executable start it
+    # again, freeze_support runs them as workers instead of as main
+    multiprocessing.freeze_support()
+    parser = build_cli_parser()
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+'''times the main steps of connectivity_comp.py and geojson_comp.py on
+synthetic cases (case_generator.py) of increasing size.  each run is appended
+to a results file with the commit it was made at, so runs can be compared
+across commits (--compare).'''
+
+import argparse, contextlib, datetime, json, os, subprocess, sys
+
+import numpy
+
+import case_generator, connectivity_comp, geojson_comp
+from stage_profile import StageProfiler
+
+# the benchmarks of each case, in the order they are run
+benchmark_names = ['load_case', 'contract_transformers', 'contract_voltage_level', 'main', 'create_geojson']
+
+
+def git_commit():
+    '''the commit of the source tree and whether it has uncommitted changes,
+    (None, None) outside of a git checkout'''
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=directory, stderr=subprocess.DEVNULL)
+        status = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=directory, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit.decode('utf-8').strip(), len(status.strip()) > 0
+
+
+def case_inputs(directory, bus_count, seed=0):
+    '''the raw and geolocations files of a synthetic case, generated the first
+    time they are needed'''
+    raw_file, coordinates_file, geolocations_file = case_generator.case_files(directory, bus_count, seed)
+    if not os.path.isfile(raw_file) or not os.path.isfile(geolocations_file):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        case_generator.write_case(raw_file, coordinates_file, geolocations_file, bus_count, seed)
+    return raw_file, geolocations_file
+
+
+def benchmark_case(raw_file, geolocations_file, work_dir, repeat=1, kv_threshold=100, trace_memory=False):
+    '''runs each of benchmark_names on the case repeat times, returns the
+    stage records (see StageProfiler) of the fastest run of each.  the outputs
+    are written to work_dir and removed afterwards.'''
+    root = os.path.join(work_dir, os.path.splitext(os.path.basename(raw_file))[0])
+    output = root + '_connectivity.json'
+    output_geojson = root + '.geojson'
+    main_args = connectivity_comp.build_cli_parser().parse_args([raw_file, '-g', geolocations_file,
+        '-k', str(kv_threshold), '-o', output, '--force'])
+
+    runs = {name: [] for name in benchmark_names}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(repeat):
+            profiler = StageProfiler(trace_memory)
+            with profiler.stage('load_case') as record:
+                case_tables = connectivity_comp.load_case(raw_file)
+                record['items'] = bus_count = len(case_tables.buses)
+            with profiler.stage('contract_transformers', items=len(case_tables.transformers)):
+                bus_metabuses = connectivity_comp.contract_transformers(numpy.arange(bus_count), case_tables.transformers)
+            with profiler.stage('contract_voltage_level', items=bus_count):
+                connectivity_comp.contract_voltage_level(bus_metabuses, case_tables.buses, case_tables.branches, kv_threshold)
+            del case_tables, bus_metabuses
+
+            with profiler.stage('main', items=bus_count):
+                connectivity_comp.main(main_args)
+            with profiler.stage('create_geojson', items=bus_count):
+                geojson_comp.create_geojson(output, output_geojson)
+
+            profiler.close()
+            for record in profiler.stages:
+                runs[record['name']].append(record)
+
+    for file_name in [output, output + '.manifest.json', output_geojson]:
+        if os.path.isfile(file_name):
+            os.remove(file_name)
+
+    return [min(runs[name], key=lambda record: record['wall_seconds']) for name in benchmark_names]
+
+
+def load_results(file_name):
+    '''the runs saved in a results file, oldest first'''
+    if not os.path.isfile(file_name):
+        return []
+    with open(file_name, 'r') as infile:
+        return json.load(infile)
+
+
+def compare_runs(previous, current):
+    '''lines comparing the wall times of two runs, benchmark by benchmark'''
+    previous_times = { (result['buses'], result['name']): result['wall_seconds'] for result in previous['results'] }
+    lines = ['compared to {} ({})'.format(previous['commit'], previous['date'])]
+    for result in current['results']:
+        key = (result['buses'], result['name'])
+        if key in previous_times and previous_times[key] > 0:
+            lines.append('  {:>7d} {:<24s} {:9.3f}s {:9.3f}s {:6.2f}x'.format(result['buses'], result['name'],
+                previous_times[key], result['wall_seconds'], result['wall_seconds']/previous_times[key]))
+    return lines
+
+
+def main(args):
+    commit, dirty = git_commit()
+    run = {
+        'commit': commit,
+        'dirty': dirty,
+        'date': datetime.datetime.now().replace(microsecond=0).isoformat(),
+        'python': sys.version.split()[0],
+        'repeat': args.repeat,
+        'results': []
+    }
+
+    for bus_count in sorted(args.buses):
+        raw_file, geolocations_file = case_inputs(args.directory, bus_count, args.seed)
+        for record in benchmark_case(raw_file, geolocations_file, args.directory, args.repeat, args.kv_threshold, args.memory):
+            result = dict(record)
+            result['buses'] = bus_count
+            run['results'].append(result)
+            print('{:>7d} {:<24s} {:9.3f}s wall {:9.3f}s cpu {:>8} MB max rss'.format(bus_count, result['name'],
+                result['wall_seconds'], result['cpu_seconds'], '{:.1f}'.format(result['max_rss_mb']) if result['max_rss_mb'] != None else '-'))
+
+    runs = load_results(args.results)
+    if args.compare and len(runs) > 0:
+        for line in compare_runs(runs[-1], run):
+            print(line)
+
+    runs.append(run)
+    with open(args.results, 'w') as outfile:
+        json.dump(runs, outfile, sort_keys=True, indent=2, separators=(',', ': '))
+    print('saved results to {}'.format(args.results))
+
+
+def build_cli_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b', '--buses', help='the number of buses of each case', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('-d', '--directory', help='the directory of the generated cases and outputs', default='benchmark_cases')
+    parser.add_argument('-r', '--results', help='the results file the run is appended to (.json)', default='benchmark_results.json')
+    parser.add_argument('-k', '--kv-threshold', help='the voltage level of the contraction benchmarks', type=float, default=100)
+    parser.add_argument('-n', '--repeat', help='run each benchmark this many times and keep the fastest', type=int, default=1)
+    parser.add_argument('--seed', help='the seed of the generated cases', type=int, default=0)
+    parser.add_argument('--memory', help='also trace the peak python allocations of each benchmark (slower)', action='store_true', default=False)
+    parser.add_argument('--compare', help='print the change from the previous run in the results file', action='store_true', default=False)
+    return parser
+
+
+if __name__ == '__main__':
+    parser = build_cli_parser()
+    main(parser.parse_args())
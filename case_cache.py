@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+'''on-disk cache of parsed cases, keyed by a hash of the case file contents'''
+
+import hashlib, os, pickle, tempfile
+
+# bump when the layout of the cached values changes
+cache_format_version = 2
+
+cache_extension = '.pickle'
+
+
+def file_hash(file_name, block_size=1<<20):
+    '''sha256 of the contents of file_name'''
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as infile:
+        block = infile.read(block_size)
+        while len(block) > 0:
+            digest.update(block)
+            block = infile.read(block_size)
+    return digest.hexdigest()
+
+
+def write_pickle(path, value):
+    '''pickles value to path through a temporary file in the same directory,
+    so that concurrent readers never see a partial file'''
+    handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as outfile:
+            pickle.dump(value, outfile, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class CaseCache(object):
+    '''a directory of pickled values with least recently used eviction once
+    the total size of the entries exceeds max_bytes.
+
+    entries are keyed by the content hash of the source file together with
+    a version tag (e.g. the parser version), so editing the file or
+    upgrading the parser invalidates them automatically.
+    '''
+
+    def __init__(self, cache_dir, max_bytes, version=''):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.version = '{}-{}'.format(cache_format_version, version)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def key(self, file_name):
+        digest = hashlib.sha256()
+        digest.update(self.version.encode('utf-8'))
+        digest.update(file_hash(file_name).encode('utf-8'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + cache_extension)
+
+    def get(self, key):
+        '''returns the cached value, or None if there is no usable entry'''
+        path = self.path(key)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            with open(path, 'rb') as infile:
+                value = pickle.load(infile)
+        except Exception as e:
+            print('WARNING: discarding unreadable cache entry {} ({})'.format(path, e))
+            self.remove(path)
+            return None
+
+        # mark as most recently used
+        os.utime(path, None)
+        return value
+
+    def put(self, key, value):
+        write_pickle(self.path(key), value)
+        self.evict()
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def entries(self):
+        '''returns (mtime, size, path) of every entry, oldest first'''
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(cache_extension):
+                path = os.path.join(self.cache_dir, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        '''removes least recently used entries until the cache fits in
+        max_bytes, the newest entry is always kept'''
+        entries = self.entries()
+        total_bytes = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries[:-1]:
+            if total_bytes <= self.max_bytes:
+                break
+            self.remove(path)
+            total_bytes -= size
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+
+'''writes synthetic psse v33 raw cases with a matching coordinates.csv
+location table and a bus geolocation file, for exercising the tools at scale.
+
+the case is a grid of sites (substations) spread over a region.  each site
+has a few buses at transmission voltages joined by two and three winding
+transformers, a 13.8 kv bus with radial feeders and sometimes a generator.
+neighboring sites are joined by lines at their highest common voltage, and a
+few facts devices and two-terminal and vsc dc lines join distant sites.'''
+
+import argparse, bisect, itertools, math, os, random
+
+from collections import namedtuple
+
+# the voltage levels (kv) of a site and its transformers as (from level, to
+# level, tertiary level or None), with the share of sites of each kind
+site_kinds = [
+    (0.1, [500.0, 345.0, 138.0, 13.8], [(0, 1, 3), (1, 2, None)]),
+    (0.4, [230.0, 138.0, 13.8], [(0, 1, None), (1, 2, None)]),
+    (0.4, [138.0, 13.8], [(0, 1, None)]),
+    (0.1, [138.0, 34.5, 13.8], [(0, 1, 2)]),
+]
+
+# components per bus or per site, roughly those of large planning cases.  a
+# case with more than one site has at least one facts device and dc line of
+# each kind.
+load_ratio = 0.5
+fixed_shunt_ratio = 0.03
+switched_shunt_ratio = 0.02
+generator_site_ratio = 0.6
+parallel_line_ratio = 0.1
+equivalent_line_ratio = 0.01
+diagonal_line_ratio = 0.3
+facts_ratio = 1/5000.0
+tt_dc_ratio = 1/50000.0
+vsc_dc_ratio = 1/50000.0
+
+# the feeder buses of a site, on average
+feeder_buses = 6
+
+# the region covered by the sites, the south west corner and the spacing of
+# the site grid (degrees)
+region_longitude = -120.0
+region_latitude = 32.0
+site_spacing = 0.05
+
+# transformers are (from level, to level, tertiary level) positions in kvs
+Site = namedtuple('Site', ['site_id', 'longitude', 'latitude', 'kvs', 'transformers', 'buses'])
+
+
+def build_sites(bus_count, rng):
+    '''the sites of a case with bus_count buses, bus ids are numbered from 1
+    in site order with gaps between sites as in real cases'''
+    site_count = max(1, int(round(bus_count/(3.0 + feeder_buses))))
+    columns = int(math.ceil(math.sqrt(site_count)))
+
+    # the site kinds drawn by weight, as random.choices (python 3.6) does
+    cum_weights = list(itertools.accumulate(kind[0] for kind in site_kinds))
+    total = cum_weights[-1] + 0.0
+    site_levels = [site_kinds[bisect.bisect(cum_weights, rng.random()*total, 0, len(site_kinds)-1)] for i in range(site_count)]
+
+    # the buses left after the core buses of each site go to feeders
+    core_count = sum(len(kind[1]) for kind in site_levels)
+    feeder_counts = [0]*site_count
+    for i in range(max(0, bus_count - core_count)):
+        feeder_counts[rng.randrange(site_count)] += 1
+
+    sites = []
+    bus_id = 0
+    remaining = bus_count
+    for site_id, (weight, kvs, transformers) in enumerate(site_levels):
+        row, column = divmod(site_id, columns)
+        longitude = region_longitude + column*site_spacing + rng.uniform(-0.3, 0.3)*site_spacing
+        latitude = region_latitude + row*site_spacing + rng.uniform(-0.3, 0.3)*site_spacing
+
+        bus_id = (bus_id//10 + 1)*10
+        levels = kvs[:remaining]
+        buses = []
+        for kv in levels + [kvs[-1]]*min(feeder_counts[site_id], remaining - len(levels)):
+            bus_id += 1
+            buses.append((bus_id, kv))
+        remaining -= len(buses)
+        sites.append(Site(site_id, longitude, latitude, kvs, transformers, buses))
+
+    return sites, columns
+
+
+def bus_name(site, bus_position, kv):
+    '''names such as 'S001234 345' or 'S001234 F12', at most 12 characters'''
+    if bus_position < len(site.kvs):
+        return 'S{:06d} {:g}'.format(site.site_id % 1000000, kv)[:12]
+    return 'S{:06d} F{}'.format(site.site_id % 1000000, bus_position - len(site.kvs) + 1)[:12]
+
+
+def write_case(raw_file, coordinates_file, geolocations_file, bus_count, seed=0):
+    '''writes a case with bus_count buses to raw_file, its location table to
+    coordinates_file and the bus geolocations to geolocations_file (either
+    may be None), returns the number of each kind of component written'''
+    rng = random.Random(seed)
+    sites, columns = build_sites(bus_count, rng)
+    three_winding_count = 0
+
+    buses = []
+    loads = []
+    fixed_shunts = []
+    generators = []
+    branches = []
+    transformers = []
+    tt_dc_lines = []
+    vsc_dc_lines = []
+    facts = []
+    switched_shunts = []
+
+    def branch(from_bus, to_bus, ckt, length):
+        branches.append("{},{},'{}',{:.5E},{:.5E},{:.5E},  1086.00,  1086.00,  1086.00,  0.00000,  0.00000,  0.00000,  0.00000,1,1,{:6.1f},   1,1.0000,   0,1.0000,   0,1.0000,   0,1.0000".format(
+            from_bus, to_bus, ckt, 0.001*length, 0.01*length, 0.02*length, length))
+
+    swing_bus = None
+    for site in sites:
+        site_buses = site.buses
+        for position, (bus_id, kv) in enumerate(site_buses):
+            bus_type = 1
+            if position == len(site.kvs) - 1 and rng.random() < generator_site_ratio:
+                bus_type = 2 if swing_bus != None else 3
+                if swing_bus == None:
+                    swing_bus = bus_id
+                generators.append("{},'1 ',{:10.3f},     0.000,   100.000,  -100.000,1.02000,    0,   200.000,   0.00000,   0.20000,   0.00000,   0.00000,1.00000,1,  100.0,   200.000,     0.000,   1,1.0000,   0,1.0000,   0,1.0000,   0,1.0000,0, 1.0000".format(
+                    bus_id, rng.uniform(10.0, 150.0)))
+            buses.append("{},'{:12s}',{:10.4f}, {}, {:3d}, {:3d},   1,1.00000000,   0.000000, 1.10000, 0.90000, 1.10000, 0.90000".format(
+                bus_id, bus_name(site, position, kv), kv, bus_type, 1 + site.site_id//10000, 1 + site.site_id//1000))
+
+            if position >= len(site.kvs) - 1 and rng.random() < load_ratio:
+                loads.append("{},'1 ',1,   1,   1,{:10.3f},{:10.3f},     0.000,     0.000,     0.000,     0.000,   1,1".format(
+                    bus_id, rng.uniform(1.0, 20.0), rng.uniform(0.0, 5.0)))
+            if rng.random() < fixed_shunt_ratio:
+                fixed_shunts.append("{},'1 ', 1,     0.000,{:10.3f}".format(bus_id, rng.uniform(5.0, 50.0)))
+            if rng.random() < switched_shunt_ratio:
+                switched_shunts.append("{},0,0,1,1.05000,0.95000,    0,100.0,'        ',    6.00, 1,   6.00".format(bus_id))
+
+        # the transformers between the core buses of the site
+        core = site_buses[:len(site.kvs)]
+        for from_level, to_level, tertiary_level in site.transformers:
+            if to_level >= len(core) or (tertiary_level != None and tertiary_level >= len(core)):
+                continue
+            (from_bus, from_kv), (to_bus, to_kv) = core[from_level], core[to_level]
+            if tertiary_level == None:
+                transformers.extend([
+                    "{},{},    0,'1 ',1,1,1,0.00000E0,0.00000E0,2,'T{:<11d}',1,   1,1.0000,   0,1.0000,   0,1.0000,   0,1.0000,'            '".format(from_bus, to_bus, len(transformers)),
+                    "  1.00000E-7,1.00000E-1, 100.00",
+                    "  1.000000,{:8.3f},   0.000, 100.00, 100.00, 100.00,0,     0,1.100000,0.900000,1.100000,0.900000,  33, 0, 0.00000, 0.00000,  0.000".format(from_kv),
+                    "  1.000000,{:8.3f}".format(to_kv)
+                ])
+            else:
+                tertiary_bus, tertiary_kv = core[tertiary_level]
+                transformers.extend([
+                    "{},{},{},'1 ',1,1,1,0.00000E0,0.00000E0,2,'T{:<11d}',1,   1,1.0000,   0,1.0000,   0,1.0000,   0,1.0000,'            '".format(from_bus, to_bus, tertiary_bus, len(transformers)),
+                    "  1.00000E-3,5.00000E-2, 100.00,1.00000E-3,5.00000E-2, 100.00,1.00000E-3,5.00000E-2, 100.00,1.00000000,   0.000000",
+                    "  1.000000,{:8.3f},   0.000, 300.00, 300.00, 300.00,0,     0,1.100000,0.900000,1.100000,0.900000,  33, 0, 0.00000, 0.00000,  0.000".format(from_kv),
+                    "  1.000000,{:8.3f},   0.000, 300.00, 300.00, 300.00,0,     0,1.100000,0.900000,1.100000,0.900000,  33, 0, 0.00000, 0.00000,  0.000".format(to_kv),
+                    "  1.000000,{:8.3f},   0.000, 100.00, 100.00, 100.00,0,     0,1.100000,0.900000,1.100000,0.900000,  33, 0, 0.00000, 0.00000,  0.000".format(tertiary_kv)
+                ])
+                three_winding_count += 1
+
+        # radial feeders from the lowest core bus
+        feeder_root = core[-1][0]
+        previous = feeder_root
+        for position, (bus_id, kv) in enumerate(site_buses[len(site.kvs):]):
+            # a new feeder every few buses
+            if rng.random() < 0.3:
+                previous = feeder_root
+            branch(previous, bus_id, '1 ', rng.uniform(0.5, 5.0))
+            previous = bus_id
+
+    # lines between neighboring sites at their highest common voltage
+    def site_bus(site, kv):
+        for bus_id, bus_kv in site.buses[:len(site.kvs)]:
+            if bus_kv == kv:
+                return bus_id
+        return None
+
+    def connect(site, other):
+        common = [kv for kv in site.kvs if kv in other.kvs and site_bus(site, kv) != None and site_bus(other, kv) != None]
+        if len(common) == 0:
+            return
+        from_bus, to_bus = site_bus(site, common[0]), site_bus(other, common[0])
+        length = 111.0*site_spacing*rng.uniform(0.8, 1.5)
+        circuits = ['1 ']
+        if rng.random() < parallel_line_ratio:
+            circuits.append('2 ')
+        if rng.random() < equivalent_line_ratio:
+            circuits.append('99')
+        for ckt in circuits:
+            branch(from_bus, to_bus, ckt, length)
+
+    for site in sites:
+        row, column = divmod(site.site_id, columns)
+        if column + 1 < columns and site.site_id + 1 < len(sites):
+            connect(site, sites[site.site_id + 1])
+        if site.site_id + columns < len(sites):
+            connect(site, sites[site.site_id + columns])
+            if column + 1 < columns and site.site_id + columns + 1 < len(sites) and rng.random() < diagonal_line_ratio:
+                connect(site, sites[site.site_id + columns + 1])
+
+    # devices between distant sites, at their highest voltage bus
+    def distant_pairs(count):
+        for i in range(count):
+            if len(sites) < 2:
+                return
+            site, other = rng.sample(sites, 2)
+            yield site.buses[0][0], other.buses[0][0]
+
+    for i, (from_bus, to_bus) in enumerate(distant_pairs(max(1, int(round(bus_count*facts_ratio))))):
+        # every other device is a shunt device at a single bus
+        if i % 2 == 1:
+            to_bus = 0
+        facts.append("{},{}, {}, 1,   0.00,   0.00, 1.03000, 204.000,   0.00,0.90000,1.10000,1.00000,   0.000, 0.05000,100.0,  1,  0.0000,  0.0000,0".format(
+            i+1, from_bus, to_bus))
+
+    for i, (from_bus, to_bus) in enumerate(distant_pairs(max(1, int(round(bus_count*tt_dc_ratio))))):
+        tt_dc_lines.extend([
+            "'TTDC {:<7d}', 1,     0.1000,     -20.00,       7.50,       0.00,     0.0000,    0.00000,I,       0.00,  20,1.00000".format(i+1),
+            "  {},  2, 90.00, 18.10,  0.0140,  0.5780,  230.0, 0.09772, 1.00000, 1.00000, 1.00000, 0.00624,     0,     0,     0, 1, 0.00000".format(from_bus),
+            "  {},  2, 90.00, 17.40,  0.0140,  0.5670,  230.0, 0.07134, 1.00000, 1.00000, 1.00000, 0.00625,     0,     0,     0, 1, 0.00000".format(to_bus)
+        ])
+
+    for i, (from_bus, to_bus) in enumerate(distant_pairs(max(1, int(round(bus_count*vsc_dc_ratio))))):
+        vsc_dc_lines.extend([
+            "'VSC {:<8d}', 1, 0.0000, 1, 1.0, 0, 1.0, 0, 1.0, 0, 1.0".format(i+1),
+            "  {}, 1, 1, 142.000,1.03400,1118.6000,1.6400,  0.00, 226.00, 1499.79,0.5000, 100.00,-100.00,   0,100.00".format(from_bus),
+            "  {}, 2, 1, -20.000,1.02100,1118.6000,1.6400,  0.00, 226.00, 1499.79,0.5000, 100.00,-100.00,   0,100.00".format(to_bus)
+        ])
+
+    transformer_count = sum(1 for line in transformers if not line.startswith(' '))
+    counts = {
+        'sites': len(sites),
+        'buses': len(buses),
+        'loads': len(loads),
+        'fixed_shunts': len(fixed_shunts),
+        'generators': len(generators),
+        'branches': len(branches),
+        'transformers': transformer_count,
+        'three_winding_transformers': three_winding_count,
+        'facts': len(facts),
+        'tt_dc_lines': len(tt_dc_lines)//3,
+        'vsc_dc_lines': len(vsc_dc_lines)//3,
+        'switched_shunts': len(switched_shunts)
+    }
+
+    sections = [
+        ('BUS', buses), ('LOAD', loads), ('FIXED SHUNT', fixed_shunts), ('GENERATOR', generators),
+        ('BRANCH', branches), ('TRANSFORMER', transformers), ('AREA', area_lines(sites)),
+        ('TWO-TERMINAL DC', tt_dc_lines), ('VOLTAGE SOURCE CONVERTER', vsc_dc_lines),
+        ('IMPEDANCE CORRECTION', []), ('MULTI-TERMINAL DC', []), ('MULTI-SECTION LINE', []),
+        ('ZONE', zone_lines(sites)), ('INTER-AREA TRANSFER', []), ('OWNER', ["1,'OWNER 1 '"]),
+        ('FACTS CONTROL DEVICE', facts), ('SWITCHED SHUNT', switched_shunts), ('GNE DEVICE', [])
+    ]
+
+    with open(raw_file, 'w') as outfile:
+        outfile.write('0,    100.00, 33, 0, 1, 60.00\n')
+        outfile.write('synthetic case of {} buses (case_generator.py, seed {})\n'.format(bus_count, seed))
+        outfile.write('{} sites, {} transformers\n'.format(len(sites), transformer_count))
+        for i, (name, lines) in enumerate(sections):
+            for line in lines:
+                outfile.write(line)
+                outfile.write('\n')
+            if i+1 < len(sections):
+                outfile.write('0 / END OF {} DATA, BEGIN {} DATA\n'.format(name, sections[i+1][0]))
+            else:
+                outfile.write('0 / END OF {} DATA\n'.format(name))
+        outfile.write('Q\n')
+
+    if coordinates_file != None:
+        with open(coordinates_file, 'w') as outfile:
+            outfile.write('OBJECTID,Bus_Name,LOCATION_ZONE,LOCATION_ID,Largest_Bus,Longitude,Latitude,Raw_Bus_Name\n')
+            for site in sites:
+                max_kv = max(site.kvs)
+                for position, (bus_id, kv) in enumerate(site.buses):
+                    outfile.write('-1,{},{},{},{:g},{!r},{!r},{}\n'.format(bus_id, 1 + site.site_id//1000, site.site_id, max_kv,
+                        site.longitude, site.latitude, bus_name(site, position, kv)))
+
+    if geolocations_file != None:
+        with open(geolocations_file, 'w') as outfile:
+            outfile.write('bus_id,longitude,latitude\n')
+            for site in sites:
+                for bus_id, kv in site.buses:
+                    outfile.write('{},{!r},{!r}\n'.format(bus_id, site.longitude, site.latitude))
+
+    return counts
+
+
+def area_lines(sites):
+    return ["{},    0,     0.000,     1.000,'AREA {:<5d}'".format(area, area) for area in range(1, 2 + (len(sites)-1)//10000)]
+
+
+def zone_lines(sites):
+    return ["{},'ZONE {:<5d}'".format(zone, zone) for zone in range(1, 2 + (len(sites)-1)//1000)]
+
+
+def case_files(directory, bus_count, seed=0):
+    '''the raw, coordinates and geolocations files of a generated case in
+    directory'''
+    root = os.path.join(directory, 'synthetic_{}_{}'.format(bus_count, seed))
+    return root + '.raw', root + '_coordinates.csv', root + '_geolocations.csv'
+
+
+def main(args):
+    if not os.path.isdir(args.directory):
+        os.makedirs(args.directory)
+    for bus_count in args.buses:
+        raw_file, coordinates_file, geolocations_file = case_files(args.directory, bus_count, args.seed)
+        counts = write_case(raw_file, coordinates_file, geolocations_file, bus_count, args.seed)
+        print('{}: {}'.format(raw_file, ', '.join('{} {}'.format(count, field) for field, count in sorted(counts.items()))))
+
+
+def build_cli_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('buses', help='the number of buses of each case (1000 to 500000)', type=int, nargs='+')
+    parser.add_argument('-d', '--directory', help='the directory the cases are written to', default='.')
+    parser.add_argument('--seed', help='the seed of the random case layout, the same seed gives the same case', type=int, default=0)
+    return parser
+
+
+if __name__ == '__main__':
+    parser = build_cli_parser()
+    main(parser.parse_args())
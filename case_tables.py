@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+'''columnar tables of the components of a pss/e case.  the tables keep only
+what the clustering and grouping stages use, bus numbers, base voltages and
+names, as numpy arrays and interned strings, and are built one section
+chunk at a time so that the parsed component objects never all exist at
+once.'''
+
+import hashlib, operator
+from collections import OrderedDict
+
+import numpy
+
+import grg_pssedata.io
+
+from raw_sections import v33_sections, header_lines, RawFile, parse_parallel
+
+
+class NameTable(object):
+    '''interned strings, each distinct string is kept once and referred to
+    by its code'''
+
+    def __init__(self, names=()):
+        self.names = []
+        self.name_codes = {}
+        self.encode(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, code):
+        return self.names[code]
+
+    def encode(self, names):
+        '''the codes of names as an array, names not seen before are added'''
+        names_list = self.names
+        name_codes = self.name_codes
+        codes = []
+        for name in names:
+            code = name_codes.get(name)
+            if code == None:
+                code = len(names_list)
+                name_codes[name] = code
+                names_list.append(name)
+            codes.append(code)
+        return numpy.array(codes, dtype=numpy.int32)
+
+    def decode(self, codes):
+        '''the strings of an array of codes, as a list'''
+        names = self.names
+        return [names[code] for code in codes.tolist()]
+
+
+class ComponentTable(object):
+    '''components of one kind in file order, row r is the component with id
+    r+1.  ends holds the bus rows (see BusTable) of the component ends, one
+    column per end (-1 for an unused end), names the codes of the component
+    names (empty for components without a name).'''
+
+    def __init__(self, ends, names):
+        self.ends = ends
+        self.names = names
+
+    def __len__(self):
+        return len(self.ends)
+
+    def bus_ids(self, buses):
+        '''the bus numbers of the component ends, 0 for unused ends'''
+        return numpy.where(self.ends >= 0, buses.ids[self.ends], 0)
+
+    def bus_groups(self, bus_count, end=0):
+        '''(order, starts) grouping the components by the bus row of one end,
+        the rows of the components at bus row r are
+        order[starts[r]:starts[r+1]], in file order'''
+        rows = self.ends[:, end]
+        order = numpy.argsort(rows, kind='stable')
+        starts = numpy.searchsorted(rows[order], numpy.arange(bus_count+1))
+        return order, starts
+
+
+class BusTable(object):
+    '''buses in file order, with their numbers, base voltages, zones and
+    name codes.  the position of a bus in the table, its row, is a dense
+    number from 0 to n-1 that the other tables use in place of the sparse
+    bus numbers.'''
+
+    def __init__(self, ids, base_kvs, zones, names):
+        self.ids = ids
+        self.base_kvs = base_kvs
+        self.zones = zones
+        self.names = names
+        self.order = numpy.argsort(ids, kind='stable')
+        self.sorted_ids = ids[self.order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, bus_ids, missing=None):
+        '''the rows of an array of bus numbers.  bus numbers that are not in
+        the table raise KeyError, or are given the row missing.'''
+        bus_ids = numpy.asarray(bus_ids, dtype=numpy.int64)
+        if len(self.ids) == 0:
+            found = numpy.zeros(bus_ids.shape, dtype=bool)
+            rows = numpy.zeros(bus_ids.shape, dtype=numpy.int64)
+        else:
+            positions = numpy.minimum(numpy.searchsorted(self.sorted_ids, bus_ids), len(self.ids)-1)
+            found = self.sorted_ids[positions] == bus_ids
+            rows = self.order[positions]
+        if not found.all():
+            if missing == None:
+                raise KeyError('unknown bus ids {}'.format(bus_ids[~found][:10].tolist()))
+            rows = numpy.where(found, rows, missing)
+        return rows
+
+
+# for each component list of a grg_pssedata Case that is tabled, the fields
+# of the bus numbers at its ends and of its name
+component_fields = OrderedDict([
+    ('loads', (['i'], 'id')),
+    ('fixed_shunts', (['i'], 'id')),
+    ('generators', (['i'], 'id')),
+    ('branches', (['i', 'j'], 'ckt')),
+    ('transformers', (['p1.i', 'p1.j', 'p1.k'], 'p1.ckt')),
+    ('tt_dc_lines', (['rectifier.ipr', 'inverter.ipi'], 'params.name')),
+    ('vsc_dc_lines', (['c1.ibus', 'c2.ibus'], 'params.name')),
+    ('facts', (['i', 'j'], 'name')),
+    ('switched_shunts', (['i'], None)),
+])
+
+# the Case component lists, in the order of v33_sections
+case_section_fields = [
+    'buses', 'loads', 'fixed_shunts', 'generators', 'branches', 'transformers',
+    'areas', 'tt_dc_lines', 'vsc_dc_lines', 'transformer_corrections',
+    'mt_dc_lines', 'line_groupings', 'zones', 'transfers', 'owners', 'facts',
+    'switched_shunts', 'gnes', 'induction_machines'
+]
+
+
+def component_columns(field, components):
+    '''the columns of a list of components of a Case field, names are
+    returned as a list of strings'''
+    if field == 'buses':
+        return (
+            numpy.array([bus.i for bus in components], dtype=numpy.int64),
+            numpy.array([bus.basekv for bus in components], dtype=float),
+            numpy.array([bus.zone for bus in components], dtype=numpy.int64),
+            ['{}'.format(bus.name) for bus in components]
+        )
+
+    end_fields, name_field = component_fields[field]
+    buses = numpy.zeros((len(components), len(end_fields)), dtype=numpy.int64)
+    for end, end_field in enumerate(end_fields):
+        buses[:, end] = [int(end_bus) for end_bus in map(operator.attrgetter(end_field), components)]
+    names = []
+    if name_field != None:
+        names = ['{}'.format(name) for name in map(operator.attrgetter(name_field), components)]
+    return buses, names
+
+
+class CaseTables(object):
+    '''the component tables of a case, see from_case and load_case_tables'''
+
+    def __init__(self, names, buses, components):
+        self.names = names
+        self.buses = buses
+        for field in component_fields:
+            setattr(self, field, components[field])
+
+    @classmethod
+    def from_columns(cls, field_columns):
+        '''builds the tables from a Case field -> list of component_columns
+        mapping, the columns of a field are joined in order'''
+        names = NameTable()
+
+        bus_columns = field_columns.get('buses', [])
+        if len(bus_columns) > 0:
+            buses = BusTable(
+                numpy.concatenate([columns[0] for columns in bus_columns]),
+                numpy.concatenate([columns[1] for columns in bus_columns]),
+                numpy.concatenate([columns[2] for columns in bus_columns]),
+                numpy.concatenate([names.encode(columns[3]) for columns in bus_columns])
+            )
+        else:
+            empty = numpy.zeros(0, dtype=numpy.int64)
+            buses = BusTable(empty, numpy.zeros(0, dtype=float), empty, numpy.zeros(0, dtype=numpy.int32))
+
+        components = {}
+        for field, (end_fields, name_field) in component_fields.items():
+            columns = field_columns.get(field, [])
+            if len(columns) > 0:
+                component_buses = numpy.concatenate([column[0] for column in columns])
+                component_names = numpy.concatenate([names.encode(column[1]) for column in columns])
+            else:
+                component_buses = numpy.zeros((0, len(end_fields)), dtype=numpy.int64)
+                component_names = numpy.zeros(0, dtype=numpy.int32)
+            # bus number 0 marks an unused end
+            ends = numpy.full(component_buses.shape, -1, dtype=numpy.int64)
+            used = component_buses != 0
+            ends[used] = buses.rows(component_buses[used])
+            components[field] = ComponentTable(ends, component_names)
+
+        return cls(names, buses, components)
+
+    @classmethod
+    def from_case(cls, raw_case):
+        '''builds the tables of a parsed grg_pssedata Case'''
+        field_columns = {'buses': [component_columns('buses', raw_case.buses)]}
+        for field in component_fields:
+            field_columns[field] = [component_columns(field, getattr(raw_case, field))]
+        return cls.from_columns(field_columns)
+
+
+def read_header(raw_file):
+    with open(raw_file, 'r') as psse_file:
+        return [psse_file.readline() for i in range(header_lines)]
+
+
+def parse_psse_quietly(lines):
+    '''parse_psse_case_lines without its progress output on stderr'''
+    print_err = grg_pssedata.io.print_err
+    grg_pssedata.io.print_err = lambda *args, **kwargs: None
+    try:
+        return grg_pssedata.io.parse_psse_case_lines(lines)
+    finally:
+        grg_pssedata.io.print_err = print_err
+
+
+def section_case_lines(header, name, lines):
+    '''a case made of the given header and the lines of a single section,
+    every other section is empty'''
+    case_lines = list(header)
+    for section_name in v33_sections:
+        if section_name == name:
+            case_lines.extend(lines)
+        case_lines.append('0')
+    case_lines.append('Q')
+    return case_lines
+
+
+def parse_psse_section_chunk(raw_file, name, start, end):
+    '''parses the components in a byte range of one section of raw_file'''
+    with RawFile(raw_file) as psse_file:
+        lines = list(psse_file.iter_range_lines(start, end))
+    case = parse_psse_quietly(section_case_lines(read_header(raw_file), name, lines))
+    return getattr(case, case_section_fields[v33_sections.index(name)])
+
+
+def parse_table_chunk(raw_file, name, start, end):
+    '''the component_columns of a byte range of one section of raw_file, as a
+    one item list for parse_parallel'''
+    field = case_section_fields[v33_sections.index(name)]
+    return [component_columns(field, parse_psse_section_chunk(raw_file, name, start, end))]
+
+
+def tabled_section_names(psse_file):
+    '''the names of the sections of a RawFile that are loaded into CaseTables,
+    in file order, warns about the sections that are not v33_sections'''
+    tabled_fields = ['buses'] + list(component_fields)
+    section_names = psse_file.section_names()
+
+    unknown = [name for name in section_names if name not in v33_sections]
+    if len(unknown) > 0:
+        print('WARNING: skipping unknown sections {}'.format(', '.join(unknown)))
+
+    return [name for name in section_names if name in v33_sections
+        and case_section_fields[v33_sections.index(name)] in tabled_fields]
+
+
+def load_case_tables(raw_file, processes=None, chunk_bytes=1<<22):
+    '''parses raw_file into CaseTables, one section chunk of about
+    chunk_bytes at a time, in a pool of processes when processes is
+    given'''
+    with RawFile(raw_file) as psse_file:
+        names = tabled_section_names(psse_file)
+
+        if processes == None:
+            section_results = OrderedDict()
+            for name in names:
+                section_results[name] = [parse_table_chunk(raw_file, name, start, end)
+                    for start, end in psse_file.section_chunks(name, chunk_bytes)]
+
+    if processes != None:
+        section_results = parse_parallel(raw_file, parse_table_chunk, names, processes, chunk_bytes)
+
+    field_columns = {}
+    for name, chunks in section_results.items():
+        field_columns[case_section_fields[v33_sections.index(name)]] = [columns for chunk in chunks for columns in chunk]
+    return CaseTables.from_columns(field_columns)
+
+
+def chunk_digest(header, name, chunk):
+    '''the key of a section chunk, a hash of its bytes together with the
+    case header and section name that its parse depends on'''
+    digest = hashlib.sha256()
+    for part in header:
+        digest.update(part.encode('utf-8'))
+    digest.update(name.encode('utf-8'))
+    digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_case_tables_incremental(raw_file, chunk_columns, processes=None, chunk_lines=1024):
+    '''load_case_tables reusing the columns of chunks that were already
+    parsed.  the sections are split with RawFile.content_chunks and
+    chunk_columns maps the chunk_digest of a chunk to its
+    component_columns, only the chunks that are not in it are parsed.
+
+    returns the CaseTables, the chunk_columns of raw_file (to pass to the
+    next call) and the number of chunks that were parsed.'''
+    header = read_header(raw_file)
+    with RawFile(raw_file) as psse_file:
+        names = tabled_section_names(psse_file)
+
+        section_keys = OrderedDict()
+        missing_chunks = OrderedDict()
+        missing_keys = []
+        missing_key_set = set()
+        for name in names:
+            section_keys[name] = []
+            for start, end in psse_file.content_chunks(name, chunk_lines):
+                key = chunk_digest(header, name, psse_file.data[start:end])
+                section_keys[name].append(key)
+                if key not in chunk_columns and key not in missing_key_set:
+                    missing_chunks.setdefault(name, []).append((start, end))
+                    missing_keys.append(key)
+                    missing_key_set.add(key)
+
+    if processes != None:
+        section_results = parse_parallel(raw_file, parse_table_chunk, list(missing_chunks), processes, chunks=missing_chunks)
+    else:
+        section_results = OrderedDict((name, [parse_table_chunk(raw_file, name, start, end) for start, end in chunks])
+            for name, chunks in missing_chunks.items())
+
+    parsed_columns = [columns for chunks in section_results.values() for chunk in chunks for columns in chunk]
+    new_chunk_columns = dict(zip(missing_keys, parsed_columns))
+    for keys in section_keys.values():
+        for key in keys:
+            if key not in new_chunk_columns:
+                new_chunk_columns[key] = chunk_columns[key]
+
+    field_columns = {}
+    for name, keys in section_keys.items():
+        field_columns[case_section_fields[v33_sections.index(name)]] = [new_chunk_columns[key] for key in keys]
+    return CaseTables.from_columns(field_columns), new_chunk_columns, len(missing_keys)
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+'''clustering primitives shared by sub_comp.py and connectivity_comp.py'''
+
+import itertools
+from collections import OrderedDict
+
+import numpy
+
+
+class DisjointSet(object):
+    '''union-find over hashable items (e.g. bus ids), with path compression
+    and union by rank.  items remember the order in which they were added (in
+    an OrderedDict, python < 3.7 dicts are unordered) so that cluster ids are
+    deterministic across runs.
+    '''
+
+    def __init__(self, items=()):
+        self.parent = OrderedDict()
+        self.rank = {}
+        for item in items:
+            self.add(item)
+
+    @classmethod
+    def from_set_lookup(cls, set_lookup):
+        '''builds a disjoint set from an item -> set of items mapping, as
+        used by metabus_lookup and bus_sub_lookup, joining every item with
+        the members of its set.
+        '''
+        disjoint_set = cls(set_lookup.keys())
+        for item, item_set in set_lookup.items():
+            for other in item_set:
+                disjoint_set.add(other)
+                disjoint_set.union(item, other)
+        return disjoint_set
+
+    @classmethod
+    def from_lookup(cls, cluster_lookup):
+        '''builds a disjoint set from an item -> cluster id mapping, as
+        returned by lookup'''
+        disjoint_set = cls(cluster_lookup.keys())
+        cluster_items = {}
+        for item, cluster_id in cluster_lookup.items():
+            disjoint_set.union(cluster_items.setdefault(cluster_id, item), item)
+        return disjoint_set
+
+    def __len__(self):
+        return len(self.parent)
+
+    def __contains__(self, item):
+        return item in self.parent
+
+    def add(self, item):
+        if item not in self.parent:
+            self.parent[item] = item
+            self.rank[item] = 0
+
+    def find(self, item):
+        parent = self.parent
+        root = item
+        while parent[root] != root:
+            root = parent[root]
+
+        while parent[item] != root:
+            parent[item], item = root, parent[item]
+
+        return root
+
+    def union(self, item_1, item_2):
+        '''joins the clusters of the two items, returns True if they were
+        previously in different clusters'''
+        root_1 = self.find(item_1)
+        root_2 = self.find(item_2)
+        if root_1 == root_2:
+            return False
+
+        rank_1 = self.rank[root_1]
+        rank_2 = self.rank[root_2]
+        if rank_1 < rank_2:
+            root_1, root_2 = root_2, root_1
+        self.parent[root_2] = root_1
+        if rank_1 == rank_2:
+            self.rank[root_1] += 1
+
+        return True
+
+    def union_all(self, items):
+        '''joins the clusters of all given items, returns the number of
+        clusters that were merged away'''
+        items = iter(items)
+        first = next(items, None)
+        merge_count = 0
+        for item in items:
+            if self.union(first, item):
+                merge_count += 1
+        return merge_count
+
+    def lookup(self):
+        '''returns an item -> cluster id mapping, in the order the items
+        were added, cluster ids are assigned 0..n-1 in the order each
+        cluster's first item was added'''
+        root_ids = {}
+        cluster_lookup = OrderedDict()
+        for item in self.parent:
+            root = self.find(item)
+            if root not in root_ids:
+                root_ids[root] = len(root_ids)
+            cluster_lookup[item] = root_ids[root]
+        return cluster_lookup
+
+    def groups(self):
+        '''returns the clusters as lists of items, ordered by cluster id'''
+        cluster_groups = []
+        for item, cluster_id in self.lookup().items():
+            if cluster_id == len(cluster_groups):
+                cluster_groups.append([])
+            cluster_groups[cluster_id].append(item)
+        return cluster_groups
+
+
+class IndexDisjointSet(object):
+    '''union-find over the indexes 0..count-1 (e.g. bus rows), the same as
+    DisjointSet with lists in place of dicts'''
+
+    def __init__(self, count):
+        self.parent = list(range(count))
+        self.rank = [0]*count
+
+    @classmethod
+    def from_labels(cls, labels):
+        '''builds a disjoint set joining the indexes with equal labels, e.g.
+        a cluster id for each index as returned by labels'''
+        disjoint_set = cls(len(labels))
+        # every index points at the first index with its label
+        firsts = {}
+        disjoint_set.parent = [firsts.setdefault(label, item) for item, label in enumerate(numpy.asarray(labels).tolist())]
+        for item, root in enumerate(disjoint_set.parent):
+            if item != root:
+                disjoint_set.rank[root] = 1
+        return disjoint_set
+
+    def __len__(self):
+        return len(self.parent)
+
+    def find(self, item):
+        parent = self.parent
+        root = item
+        while parent[root] != root:
+            root = parent[root]
+
+        while parent[item] != root:
+            parent[item], item = root, parent[item]
+
+        return root
+
+    def union(self, item_1, item_2):
+        '''joins the clusters of the two indexes, returns True if they were
+        previously in different clusters'''
+        root_1 = self.find(item_1)
+        root_2 = self.find(item_2)
+        if root_1 == root_2:
+            return False
+
+        rank_1 = self.rank[root_1]
+        rank_2 = self.rank[root_2]
+        if rank_1 < rank_2:
+            root_1, root_2 = root_2, root_1
+        self.parent[root_2] = root_1
+        if rank_1 == rank_2:
+            self.rank[root_1] += 1
+
+        return True
+
+    def union_all(self, items):
+        '''joins the clusters of all given indexes, returns the number of
+        clusters that were merged away'''
+        items = iter(items)
+        first = next(items, None)
+        merge_count = 0
+        for item in items:
+            if self.union(first, item):
+                merge_count += 1
+        return merge_count
+
+    def labels(self):
+        '''an array of the cluster id of each index, cluster ids are
+        assigned 0..n-1 in the order of the first index of each cluster'''
+        find = self.find
+        roots = numpy.array([find(item) for item in range(len(self.parent))], dtype=numpy.int64)
+        unique_roots, firsts, labels = numpy.unique(roots, return_index=True, return_inverse=True)
+        # renumber the clusters from root order to first index order
+        renumber = numpy.empty(len(unique_roots), dtype=numpy.int64)
+        renumber[numpy.argsort(firsts, kind='stable')] = numpy.arange(len(unique_roots))
+        return renumber[labels.reshape(-1)]
+
+
+def grid_pairs(points, distance, batch_size=1<<20):
+    '''yields each pair (i, j), i < j, of rows of points (an (n, dimensions)
+    array of coordinates) that are within distance of each other.
+
+    points are hashed into a uniform grid of cells distance wide, so a point
+    is only compared with the points of its own and the adjacent cells.  the
+    cells are numbered by the rank of their coordinates along each axis, the
+    adjacent cells are found by sorted search, and the points of about
+    batch_size pairs of cells are compared at a time.
+    '''
+    points = numpy.asarray(points, dtype=float)
+    if len(points) == 0:
+        return
+    distance = max(distance, 0.0)
+    # with no distance only equal points are paired, these share a cell of
+    # any size
+    cell_size = distance if distance > 0 else 1.0
+
+    cells = numpy.floor(points/cell_size).astype(numpy.int64)
+    count, dimensions = cells.shape
+    axis_values = [numpy.unique(cells[:, axis]) for axis in range(dimensions)]
+    strides = numpy.ones(dimensions, dtype=numpy.int64)
+    for axis in range(dimensions-2, -1, -1):
+        strides[axis] = strides[axis+1]*len(axis_values[axis+1])
+
+    def cell_keys(cells):
+        '''the numbers of cells, -1 for cells with a coordinate not taken by
+        any point'''
+        keys = numpy.zeros(len(cells), dtype=numpy.int64)
+        for axis, values in enumerate(axis_values):
+            ranks = numpy.searchsorted(values, cells[:, axis])
+            found = values[numpy.minimum(ranks, len(values)-1)] == cells[:, axis]
+            keys = numpy.where(found & (keys >= 0), keys + ranks*strides[axis], -1)
+        return keys
+
+    keys = cell_keys(cells)
+    order = numpy.argsort(keys, kind='stable')
+    cell_numbers, starts, sizes = numpy.unique(keys[order], return_index=True, return_counts=True)
+    first_cells = cells[order[starts]]
+
+    # each cell with itself and with the half of its adjacent cells that
+    # comes after it, the other half finds the same pairs
+    cell_pairs = [(numpy.arange(len(cell_numbers)), numpy.arange(len(cell_numbers)))]
+    for offset in itertools.product((-1, 0, 1), repeat=dimensions):
+        if offset <= (0,)*dimensions:
+            continue
+        keys = cell_keys(first_cells + numpy.array(offset, dtype=numpy.int64))
+        positions = numpy.searchsorted(cell_numbers, keys)
+        found = (keys >= 0) & (cell_numbers[numpy.minimum(positions, len(cell_numbers)-1)] == keys)
+        cell_pairs.append((numpy.flatnonzero(found), positions[found]))
+    cells_1 = numpy.concatenate([pair[0] for pair in cell_pairs])
+    cells_2 = numpy.concatenate([pair[1] for pair in cell_pairs])
+
+    max_distance = distance*distance
+    pair_counts = sizes[cells_1]*sizes[cells_2]
+    batch_ends = numpy.cumsum(pair_counts)
+    start = 0
+    while start < len(cells_1):
+        end = max(numpy.searchsorted(batch_ends, batch_ends[start] - pair_counts[start] + batch_size, side='right'), start+1)
+        batch_1, batch_2 = cells_1[start:end], cells_2[start:end]
+        batch_counts = pair_counts[start:end]
+
+        # every point of the first cell with every point of the second
+        pair_cells = numpy.repeat(numpy.arange(len(batch_1)), batch_counts)
+        pair_offsets = numpy.arange(len(pair_cells)) - numpy.repeat(numpy.cumsum(batch_counts) - batch_counts, batch_counts)
+        size_2 = sizes[batch_2][pair_cells]
+        ids_1 = order[starts[batch_1][pair_cells] + pair_offsets//size_2]
+        ids_2 = order[starts[batch_2][pair_cells] + pair_offsets%size_2]
+
+        differences = points[ids_1] - points[ids_2]
+        within = numpy.einsum('ij,ij->i', differences, differences) <= max_distance
+        # pairs within a cell are taken once
+        within &= (batch_1[pair_cells] != batch_2[pair_cells]) | (ids_1 < ids_2)
+        ids_1, ids_2 = ids_1[within], ids_2[within]
+        yield from zip(numpy.minimum(ids_1, ids_2).tolist(), numpy.maximum(ids_1, ids_2).tolist())
+        start = end
@@ -1,9 +1,18 @@
 #!/usr/bin/env python3
 
-import argparse, json, csv, itertools, math, shlex, grg_pssedata
-from grg_pssedata.io import parse_psse_case_file
-
-from collections import namedtuple
+import argparse, json, csv, hashlib, math, multiprocessing, os, pickle, shlex, sys, warnings, grg_pssedata
+import numpy
+
+import json_stream, output_manifest
+from clustering import IndexDisjointSet, grid_pairs
+from case_cache import CaseCache, write_pickle
+from stage_profile import StageProfiler
+from diagnostics import Diagnostics
+from connectivity_index import Connectivity
+from name_matching import encode_names, encoded_edit_distances
+from case_tables import component_fields, ComponentTable, load_case_tables, load_case_tables_incremental
+
+from collections import namedtuple, deque
 Location = namedtuple('Location', ['id', 'bus_name', 'zone', 'location_id', 'max_kv', 'longitude', 'latitude', 'raw_bus_name'])
 
 LocationCanditate = namedtuple('LocationCanditate', ['bus_id', 'bus_name', 'match_name', 'score', 'location'])
@@ -21,140 +30,351 @@ def typed_location(item_id, bus_name, zone, location_id, max_kv, longitude, lati
     return Location(item_id, bus_name, zone, location_id, max_kv, longitude, latitude, raw_bus_name)
 
 
-def prefix_size(s1, s2):
-    length = min(len(s1), len(s2))
-    prefix_length = 0
-    for i in range(length):
-        if s1[i] == s2[i]:
-            prefix_length = i+1
-        else:
-            break
-
-    #print('{} {} {} {}'.format(s1, s2, length, prefix_length))
-    return prefix_length/float(length)
-
-
-def edit_distance(s1, s2):
-    m=len(s1)+1
-    n=len(s2)+1
-
-    tbl = {}
-    for i in range(m): tbl[i,0]=i
-    for j in range(n): tbl[0,j]=j
-    for i in range(1, m):
-        for j in range(1, n):
-            cost = 0 if s1[i-1] == s2[j-1] else 1
-            tbl[i,j] = min(tbl[i, j-1]+1, tbl[i-1, j]+1, tbl[i-1, j-1]+cost)
-
-    return tbl[i,j]
-
-
-def contract_transformers(metabus_lookup, buses, transformers):
+# the weight of name similarity in a location match score, the rest is voltage
+# agreement, and the tolerance for equal voltages (kv)
+location_name_weight = 0.8
+location_kv_tolerance = 1e-1
+
+# the location table columns, in the order of typed_location's arguments
+location_columns = ['OBJECTID', 'Bus_Name', 'LOCATION_ZONE', 'LOCATION_ID', 'Largest_Bus', 'Longitude', 'Latitude', 'Raw_Bus_Name']
+location_types = [int, str, int, int, float, float, float, str]
+
+class LocationTable(object):
+    '''a location table stored by column, the Location of a row is only
+    built when it is needed'''
+
+    def __init__(self, item_ids, bus_names, zones, location_ids, max_kvs, longitudes, latitudes, raw_bus_names):
+        self.item_ids = numpy.asarray(item_ids, dtype=numpy.int64)
+        self.bus_names = [name.strip() for name in bus_names]
+        self.zones = numpy.asarray(zones, dtype=numpy.int64)
+        self.location_ids = numpy.asarray(location_ids, dtype=numpy.int64)
+        self.max_kvs = numpy.asarray(max_kvs, dtype=numpy.float64)
+        self.longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+        self.latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+        self.raw_bus_names = [name.strip() for name in raw_bus_names]
+
+    @classmethod
+    def from_locations(cls, locations):
+        return cls(*[list(column) for column in zip(*locations)] if len(locations) > 0 else [[]]*len(Location._fields))
+
+    def __len__(self):
+        return len(self.raw_bus_names)
+
+    def location(self, position):
+        return Location(int(self.item_ids[position]), self.bus_names[position], int(self.zones[position]),
+            int(self.location_ids[position]), float(self.max_kvs[position]), float(self.longitudes[position]),
+            float(self.latitudes[position]), self.raw_bus_names[position])
+
+
+def load_locations(file_name):
+    '''reads a location table (.csv) with the location_columns, e.g. a
+    coordinates.csv file, as a LocationTable.  a table without quoted values
+    is parsed by numpy.loadtxt, one pass per column type, quoted values (bus
+    names with commas) need the csv module.'''
+    with open(file_name, 'r', newline='') as csvfile:
+        header = [column.strip() for column in next(csv.reader([csvfile.readline()]), [])]
+        quoted = any('"' in block for block in iter(lambda: csvfile.read(1 << 20), ''))
+    missing = [column for column in location_columns if column not in header]
+    if len(missing) > 0:
+        raise ValueError('location table {} is missing columns {}'.format(file_name, ', '.join(missing)))
+    positions = [header.index(column) for column in location_columns]
+
+    if quoted:
+        with open(file_name, 'r', newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            next(reader)
+            rows = [[row[position] for position in positions] for row in reader if len(row) > 0]
+        if len(rows) == 0:
+            return LocationTable.from_locations([])
+        return LocationTable(*[list(map(convert, column)) for convert, column in zip(location_types, zip(*rows))])
+
+    def load_columns(columns, dtype):
+        with warnings.catch_warnings():
+            # a table without rows is not an error
+            warnings.simplefilter('ignore', UserWarning)
+            values = numpy.loadtxt(file_name, delimiter=',', skiprows=1, usecols=[header.index(column) for column in columns],
+                dtype=dtype, ndmin=2, encoding='utf-8')
+        return dict(zip(columns, values.T))
+
+    values = load_columns(['OBJECTID', 'LOCATION_ZONE', 'LOCATION_ID'], numpy.int64)
+    values.update(load_columns(['Largest_Bus', 'Longitude', 'Latitude'], numpy.float64))
+    values.update(load_columns(['Bus_Name', 'Raw_Bus_Name'], str))
+    values['Bus_Name'] = values['Bus_Name'].tolist()
+    values['Raw_Bus_Name'] = values['Raw_Bus_Name'].tolist()
+
+    return LocationTable(*[values[column] for column in location_columns])
+
+
+def normalize_name(name):
+    return ' '.join(name.upper().split())
+
+
+def name_grams(name, q):
+    '''the set of q-grams of name, padded so that the first and last
+    characters are in q of them'''
+    padded = '\x00'*(q-1) + name + '\x01'*(q-1)
+    return set(padded[i:i+q] for i in range(len(padded) - q + 1))
+
+
+class LocationIndex(object):
+    '''inverted q-gram indexes of the normalized raw bus names of a location
+    table, one per zone, built the first time a zone is looked up.  a bus is
+    only scored against the candidate_limit locations of its zone that share
+    the most q-grams with its name, buses in a zone without locations
+    against those of every zone.
+
+    q-grams found in many names say little about a match, the q-grams of a
+    name are looked up rarest first and the common ones are skipped once
+    gram_budget postings have been counted, so names sharing a long prefix
+    or suffix do not make every location a candidate.
+    '''
+
+    def __init__(self, location_table, q=3, candidate_limit=100, gram_budget=5000):
+        self.location_table = location_table
+        self.q = q
+        self.candidate_limit = candidate_limit
+        self.gram_budget = gram_budget
+        self.match_names = [normalize_name(name) for name in location_table.raw_bus_names]
+
+        zones = location_table.zones
+        order = numpy.argsort(zones, kind='stable')
+        starts = numpy.concatenate(([0], numpy.flatnonzero(zones[order][1:] != zones[order][:-1]) + 1, [len(order)]))
+        self.zone_positions = {int(zones[order[start]]): order[start:end] for start, end in zip(starts[:-1].tolist(), starts[1:].tolist()) if end > start}
+        self.gram_indexes = {}
+
+    def gram_index(self, zone):
+        '''the q-gram -> positions mapping of the locations of a zone, of
+        every zone for None'''
+        if zone not in self.gram_indexes:
+            positions = self.zone_positions[zone] if zone != None else numpy.arange(len(self.match_names))
+            postings = {}
+            for position in positions.tolist():
+                for gram in name_grams(self.match_names[position], self.q):
+                    postings.setdefault(gram, []).append(position)
+            self.gram_indexes[zone] = {gram: numpy.array(gram_positions, dtype=numpy.intp) for gram, gram_positions in postings.items()}
+        return self.gram_indexes[zone]
+
+    def candidates(self, name, zone):
+        '''the positions in the table of the locations that are compared
+        with a bus of the given normalized name and zone, in table order'''
+        index = self.gram_index(zone if zone in self.zone_positions else None)
+        postings = sorted((index[gram] for gram in sorted(name_grams(name, self.q)) if gram in index), key=len)
+        if len(postings) == 0:
+            return numpy.zeros(0, dtype=numpy.intp)
+
+        used = 1
+        counted = len(postings[0])
+        while used < len(postings) and counted + len(postings[used]) <= self.gram_budget:
+            counted += len(postings[used])
+            used += 1
+
+        positions, counts = numpy.unique(numpy.concatenate(postings[:used]), return_counts=True)
+        if len(positions) > self.candidate_limit:
+            positions = numpy.sort(positions[numpy.argsort(-counts, kind='stable')[:self.candidate_limit]])
+        return positions
+
+def kv_agreement(base_kv, max_kvs):
+    '''an array with, for each location, 1 when a bus voltage matches its
+    largest voltage, 0.5 when it is lower or the location voltage is
+    unknown and 0 when it is higher than any bus at the location'''
+    return numpy.where(max_kvs <= 0.0, 0.5,
+        numpy.where(numpy.abs(base_kv - max_kvs) <= location_kv_tolerance, 1.0,
+        numpy.where(base_kv < max_kvs, 0.5, 0.0)))
+
+
+def match_bus_locations(case_tables, location_index, max_candidates=5, min_score=0.5):
+    '''scores the buses of case_tables against their candidate locations
+    (see LocationIndex) by name (1 - edit distance / longer name length) and voltage
+    (kv_agreement).  returns a bus id -> list of LocationCanditate mapping,
+    best first.'''
+    location_table = location_index.location_table
+    match_names = location_index.match_names
+    # the lowest name similarity that can still reach min_score
+    min_name_score = (min_score - (1.0 - location_name_weight))/location_name_weight
+
+    buses = case_tables.buses
+    bus_candidates = {}
+    for bus_id, raw_bus_name, zone, base_kv in zip(buses.ids.tolist(), case_tables.names.decode(buses.names), buses.zones.tolist(), buses.base_kvs.tolist()):
+        bus_name = normalize_name(raw_bus_name)
+        block = location_index.candidates(bus_name, zone)
+        if len(block) == 0 or len(bus_name) == 0:
+            bus_candidates[bus_id] = []
+            continue
+
+        codes, lengths = encode_names([match_names[position] for position in block.tolist()])
+        longer = numpy.maximum(lengths, len(bus_name))
+        max_distance = None
+        if min_name_score > 0.0:
+            max_distance = int((1.0 - min_name_score)*longer.max())
+        distances = encoded_edit_distances(bus_name, codes, lengths, max_distance)
+
+        name_scores = 1.0 - distances/longer
+        scores = location_name_weight*name_scores + (1.0 - location_name_weight)*kv_agreement(base_kv, location_table.max_kvs[block])
+        ranked = numpy.flatnonzero(scores >= min_score)
+        ranked = ranked[numpy.argsort(-scores[ranked], kind='stable')][:max_candidates]
+
+        bus_candidates[bus_id] = [LocationCanditate(bus_id, raw_bus_name.strip(), match_names[block[i]],
+            float(scores[i]), location_table.location(block[i])) for i in ranked.tolist()]
+
+    return bus_candidates
+
+
+def write_location_matches(file_name, bus_candidates):
+    '''writes the ranked location candidates of each bus (.csv)'''
+    with open(file_name, 'w') as csvfile:
+        writer = csv.writer(csvfile, lineterminator='\n')
+        writer.writerow(['bus_id', 'bus_name', 'rank', 'match_name', 'score', 'location_id', 'zone', 'longitude', 'latitude'])
+        for bus_id in sorted(bus_candidates.keys()):
+            for rank, candidate in enumerate(bus_candidates[bus_id], 1):
+                location = candidate.location
+                writer.writerow([bus_id, candidate.bus_name, rank, candidate.match_name, '{:.4f}'.format(candidate.score),
+                    location.location_id, location.zone, location.longitude, location.latitude])
+
+
+def contract_transformers(bus_metabuses, transformers):
+    '''joins the buses at the ends of each transformer.  bus_metabuses is the
+    metabus id of each bus row and transformers a ComponentTable with the
+    winding buses i, j and k (unused for two windings), returns the new
+    metabus ids.'''
+    metabus_sets = IndexDisjointSet.from_labels(bus_metabuses)
     contraction_count = 0
 
-    for trans in transformers:
-        pr_bus = int(trans.p1.i)
-        sn_bus = int(trans.p1.j)
-        tr_bus = int(trans.p1.k)
-
-        if tr_bus == 0:
-            bus_id_set = metabus_lookup[pr_bus] | metabus_lookup[sn_bus]
+    for pr_row, sn_row, tr_row in transformers.ends.tolist():
+        if tr_row < 0:
+            metabus_sets.union(pr_row, sn_row)
             contraction_count += 1
         else:
-            bus_id_set = metabus_lookup[pr_bus] | metabus_lookup[sn_bus] | metabus_lookup[tr_bus]
+            metabus_sets.union_all((pr_row, sn_row, tr_row))
             contraction_count += 2
 
-        for bus_id in bus_id_set:
-            metabus_lookup[bus_id] = bus_id_set
+    print('transformer contraction joined {} buses'.format(contraction_count))
 
-    metabuses_list = []
-    for bus_set in metabus_lookup.values():
-        if bus_set not in metabuses_list:
-            metabuses_list.append(bus_set)
+    return metabus_sets.labels()
+
+
+# mean earth radius (m)
+earth_radius = 6371008.8
+
+def sphere_points(longitudes, latitudes):
+    '''the points of geolocations on the unit sphere, as an (n, 3) array.
+    the straight line distance of two points increases with their distance
+    over the surface.'''
+    longitudes = numpy.radians(numpy.asarray(longitudes, dtype=float))
+    latitudes = numpy.radians(numpy.asarray(latitudes, dtype=float))
+    return numpy.column_stack((numpy.cos(latitudes)*numpy.cos(longitudes), numpy.cos(latitudes)*numpy.sin(longitudes), numpy.sin(latitudes)))
+
+
+def contract_geolocations(bus_metabuses, buses, geolocation_lookup, distance, diagnostics=None):
+    '''joins the metabuses of buses whose geolocations are within distance
+    (m) of each other, returns the new metabus id of each bus row.  ids
+    that are not bus numbers are reported to diagnostics when given.'''
+    if diagnostics == None:
+        diagnostics = Diagnostics()
+    metabus_sets = IndexDisjointSet.from_labels(bus_metabuses)
+
+    # geojson ids may be strings, e.g. "1001"
+    bus_ids = []
+    geolocations = []
+    for key, geolocation in geolocation_lookup.items():
+        try:
+            bus_ids.append(int(key))
+        except (TypeError, ValueError):
+            diagnostics.warning('geolocation_id_invalid', 'geolocation id {!r} is not a bus number, skipping it', key)
+            continue
+        geolocations.append(geolocation)
+
+    # buses at the same coordinates are joined directly and share a point
+    location_buses = {}
+    for geolocation, row in zip(geolocations, buses.rows(bus_ids, missing=-1).tolist()):
+        if row >= 0:
+            location_buses.setdefault((geolocation['longitude'], geolocation['latitude']), []).append(row)
 
-    print('transformer contraction joined {} buses'.format(contraction_count))
+    contraction_count = 0
+    for rows in location_buses.values():
+        contraction_count += metabus_sets.union_all(rows)
+
+    # the distance over the surface as a straight line distance
+    chord = 2*math.sin(min(distance/(2*earth_radius), math.pi/2))
+    location_rows = [rows[0] for rows in location_buses.values()]
+    points = sphere_points([location[0] for location in location_buses], [location[1] for location in location_buses])
+    for i, j in grid_pairs(points, chord):
+        if metabus_sets.union(location_rows[i], location_rows[j]):
+            contraction_count += 1
 
-    metabus_lookup = {}
-    for metabus_id, bus_set in enumerate(metabuses_list):
-        for bus in bus_set:
-            metabus_lookup[bus] = metabus_id
+    print('geolocation contraction joined {} buses'.format(contraction_count))
+
+    return metabus_sets.labels()
 
-    return metabus_lookup
 
+MetabusGraph = namedtuple('MetabusGraph', ['bus_metabuses', 'metabus_max_kv', 'neighbors'])
 
-def contract_voltage_level(metabus_lookup, bus_lookup, branches, kv_threshold):
-    metabuses_ids = {}
-    for bus, set_id in metabus_lookup.items():
-        if set_id not in metabuses_ids:
-            metabuses_ids[set_id] = set()
-        metabuses_ids[set_id].add(bus)
+def build_metabus_graph(bus_metabuses, buses, branches):
+    '''the metabuses of an array of bus row -> metabus id (0..n-1), with their
+    highest base voltage and their neighbors over the branches as lists
+    indexed by metabus id.  buses is a BusTable and branches a
+    ComponentTable.'''
+    metabus_count = int(bus_metabuses.max()) + 1 if len(bus_metabuses) > 0 else 0
+    metabus_max_kv = numpy.full(metabus_count, -numpy.inf)
+    numpy.maximum.at(metabus_max_kv, bus_metabuses, buses.base_kvs)
 
-    metabus_max_kv = {}
-    for i,v in metabuses_ids.items():
-        metabus_max_kv[i] = max(float(bus_lookup[bus_id].basekv) for bus_id in v)
+    neighbors = [[] for metabus_id in range(metabus_count)]
+    for from_metabus, to_metabus in bus_metabuses[branches.ends[:, :2]].tolist():
+        neighbors[from_metabus].append(to_metabus)
+        neighbors[to_metabus].append(from_metabus)
 
-    bus_to_metabus = {}
-    for metabus_id, metabus in metabuses_ids.items():
-        for bus_id in metabus:
-            bus_to_metabus[bus_id] = metabus_id
+    return MetabusGraph(bus_metabuses, metabus_max_kv.tolist(), neighbors)
 
-    #print(bus_to_metabus)
-    #incident = {}
-    neighbors = {}
-    for k in metabuses_ids:
-        neighbors[k] = set()
-    for branch in branches:
-        from_bus = int(branch.i)
-        to_bus = int(branch.j)
 
-        from_metabus = bus_to_metabus[from_bus]
-        to_metabus = bus_to_metabus[to_bus]
+def contract_voltage_level(bus_metabuses, buses, branches, kv_threshold):
+    metabus_graph = build_metabus_graph(bus_metabuses, buses, branches)
+    return contract_metabus_graph(metabus_graph, kv_threshold)
 
-        neighbors[from_metabus].add(to_metabus)
-        neighbors[to_metabus].add(from_metabus)
 
-    high_voltage_metabus_ids = { idx for idx in metabuses_ids if metabus_max_kv[idx] >= kv_threshold }
-    #print(high_voltage_metabus_ids)
+def contract_metabus_graph(metabus_graph, kv_threshold):
+    '''the substation id of each bus row'''
+    bus_metabuses, metabus_max_kv, neighbors = metabus_graph
+    metabus_count = len(metabus_max_kv)
 
-    metabus_unions = {i:set([i]) for i in high_voltage_metabus_ids}
-    merged = set()
+    # multi-source bfs from every high voltage metabus, each low voltage
+    # metabus is absorbed by the nearest high voltage metabus, ties go to the
+    # lowest metabus id because the frontier is seeded in id order
+    metabus_owner = [-1]*metabus_count
+    frontier = deque()
+    for metabus_id in range(metabus_count):
+        if metabus_max_kv[metabus_id] >= kv_threshold:
+            metabus_owner[metabus_id] = metabus_id
+            frontier.append(metabus_id)
+    high_voltage_metabus_ids = list(frontier)
 
     contraction_count = 0
-    contracted = True
-    while contracted:
-        contracted = False
-        for metabus_id in high_voltage_metabus_ids:
-            for metabus_neighbor_id in [i for i in neighbors[metabus_id]]:
-                if metabus_max_kv[metabus_neighbor_id] < kv_threshold and metabus_neighbor_id not in merged:
-                    metabus_unions[metabus_id].add(metabus_neighbor_id)
-                    metabus_unions[metabus_neighbor_id] = metabus_unions[metabus_id]
-                    merged.add(metabus_neighbor_id)
-
-                    for metabus_neighbor_neighbor_id in neighbors[metabus_neighbor_id]:
-                        neighbors[metabus_id].add(metabus_neighbor_neighbor_id)
-
-                    contraction_count += 1
-                    contracted = True
-
-    metabuses_union_list = []
-    for metabus_set in metabus_unions.values():
-        if metabus_set not in metabuses_union_list:
-            metabuses_union_list.append(metabus_set)
-
-    # for value in metabuses_union_list:
-    #     print(value)
-
-    print('high voltage metabuses {}, number of metabus sets found {}'.format(len(high_voltage_metabus_ids), len(metabuses_union_list)))
+    while len(frontier) > 0:
+        metabus_id = frontier.popleft()
+        owner_id = metabus_owner[metabus_id]
+        for metabus_neighbor_id in neighbors[metabus_id]:
+            if metabus_owner[metabus_neighbor_id] < 0:
+                metabus_owner[metabus_neighbor_id] = owner_id
+                frontier.append(metabus_neighbor_id)
+                contraction_count += 1
+
+    # low voltage metabuses that are not connected to any high voltage
+    # metabus are kept as they are
+    isolated_metabus_ids = [idx for idx in range(metabus_count) if metabus_owner[idx] < 0]
+    for metabus_id in isolated_metabus_ids:
+        metabus_owner[metabus_id] = metabus_id
+
+    # substations are numbered in the order of their owners, the high
+    # voltage metabuses first
+    owner_substations = numpy.zeros(metabus_count, dtype=numpy.int64)
+    owner_ids = high_voltage_metabus_ids + isolated_metabus_ids
+    owner_substations[owner_ids] = numpy.arange(len(owner_ids))
+
+    print('high voltage metabuses {}, number of metabus sets found {}'.format(len(high_voltage_metabus_ids), len(owner_ids)))
     print('voltage level contraction joined {} metabuses'.format(contraction_count))
+    if len(isolated_metabus_ids) > 0:
+        print('WARNING: {} low voltage metabuses are not connected to a high voltage metabus'.format(len(isolated_metabus_ids)))
 
-    metabus_lookup_two = {}
-    for metabus_id, metabus_set in enumerate(metabuses_union_list):
-        for metabus in metabus_set:
-            for bus in metabuses_ids[metabus]:
-                metabus_lookup_two[bus] = metabus_id
-
-    #print(metabus_lookup_two)
-    return metabus_lookup_two
+    metabus_substations = owner_substations[numpy.array(metabus_owner, dtype=numpy.int64)]
+    return metabus_substations[bus_metabuses]
 
 
 def load_gic_file(file_name):
@@ -241,486 +461,723 @@ def load_lanl_geo_file(file_name):
 
 
 
-def main(args):
-    raw_case = parse_psse_case_file(args.raw_file)
-
-    # print('raw , %d, %d, %d' % (len(raw_case.buses), len(raw_case.branches), len(raw_case.transformers)))
-
-    # for k,v in raw_case.items():
-    #     print('{} - {}'.format(k, len(v)))
-    # print('')
-
-    bus_lookup = { int(bus.i):bus for bus in raw_case.buses }
-    load_lookup = { i+1:load for i, load in enumerate(raw_case.loads) }
-    owner_lookup = { int(owner.i):owner for i, owner in enumerate(raw_case.owners) }
-    fixed_shunt_lookup = { i+1:fs for i, fs in enumerate(raw_case.fixed_shunts) }
-    switched_shunt_lookup = { i+1:ss for i, ss in enumerate(raw_case.switched_shunts) }
-    generator_lookup = { i+1:g for i, g in enumerate(raw_case.generators) }
-
-    transformer_lookup = { i+1:tr for i, tr in enumerate(raw_case.transformers) }
-    branch_lookup = { i+1:branch for i, branch in enumerate(raw_case.branches) }
-    facts_lookup = { i+1:facts for i, facts in enumerate(raw_case.facts) }
-    tt_dc_lookup = { i+1:tt_dc for i, tt_dc in enumerate(raw_case.tt_dc_lines) }
-    vsc_dc_lookup = { i+1:vsc_dc for i, vsc_dc in enumerate(raw_case.vsc_dc_lines) }
-
-    metabus_lookup = {}
-    for bus in raw_case.buses:
-        bus_id = int(bus.i)
-        #print(bus_id)
-        metabus_lookup[bus_id] = set([bus_id])
-
-    metabus_data = None
-    bus_to_sub = None
-
-    metabus_lookup = contract_transformers(metabus_lookup, raw_case.buses, raw_case.transformers)
-    metabus_lookup = contract_voltage_level(metabus_lookup, bus_lookup, raw_case.branches, args.kv_threshold)
-
-    substation_buses = {}
-    for bus, set_id in metabus_lookup.items():
-        if set_id not in substation_buses:
-            substation_buses[set_id] = set()
-        substation_buses[set_id].add(bus)
+def load_bus_geolocations(file_name, index_field):
+    geolocation_lookup = {}
 
-
-    bus_data_lookup = {}
-    for bus in raw_case.buses:
-        bus_id = int(bus.i)
-        bus_data = {
-            'id':bus_id,
-            'type':'physical',
-            'name':'{}'.format(bus.name),
-            'loads':[],
-            'generators':[],
-            'fixed_shunts':[],
-            'switched_shunts':[],
-            'facts':[]
-        }
-        bus_data_lookup[bus_id] = bus_data
-
-    for i, load in enumerate(raw_case.loads):
-        load_id = i+1
-        bus_id = int(load.i)
-        load_data = {
-            'id':load_id,
-            'name':'{} {}'.format(load.i, load.id),
-        }
-        bus_data_lookup[bus_id]['loads'].append(load_data)
-
-    for i, generator in enumerate(raw_case.generators):
-        gen_id = i+1
-        bus_id = int(generator.i)
-        generator_data = {
-            'id':gen_id,
-            'name':'{} {}'.format(generator.i, generator.id),
-        }
-        bus_data_lookup[bus_id]['generators'].append(generator_data)
-
-    for i, fixed_shunt in enumerate(raw_case.fixed_shunts):
-        f_shunt_id = i+1
-        bus_id = int(fixed_shunt.i)
-        fixed_shunt_data = {
-            'id':f_shunt_id,
-            'name':'{} {}'.format(fixed_shunt.i, fixed_shunt.id),
-        }
-        bus_data_lookup[bus_id]['fixed_shunts'].append(fixed_shunt_data)
-
-    for i, switched_shunt in enumerate(raw_case.switched_shunts):
-        s_shunt_id = i+1
-        bus_id = int(switched_shunt.i)
-        switched_shunt_data = {
-            'id':s_shunt_id,
-            'name':'{}'.format(switched_shunt.i),
-        }
-        bus_data_lookup[bus_id]['switched_shunts'].append(switched_shunt_data)
-
-    for i, facts in enumerate(raw_case.facts):
-        facts_id = i+1
-        from_bus = facts.i
-        to_bus = facts.j
-        if to_bus == 0:
-            facts_data = {
-                'id':facts_id,
-                'name':'{} {}'.format(facts.i, facts.name),
+    if file_name.lower().endswith('.geojson'):
+        with open(file_name, 'r') as jsonfile:
+            geojson = json.load(jsonfile)
+        #print(geojson)
+        for feature in geojson['features']:
+            bus_id = feature['properties'][index_field]
+            geolocation_lookup[bus_id] = {
+                'longitude':feature['geometry']['coordinates'][0],
+                'latitude':feature['geometry']['coordinates'][1]
             }
-            bus_data_lookup[from_bus]['facts'].append(facts_data)
-
-
-    # for k,v in bus_data_lookup.items():
-    #     print('{} - {}'.format(k, v))
-    # print('')
+    elif file_name.lower().endswith('csv'):
+        with open(file_name, 'r') as csvfile:
+            csvfile.readline() # discard header row
+
+            for row in csvfile:
+                elems = row.split(',')
+                bus_id = int(elems[0])
+                x = float(elems[1])
+                y = float(elems[2])
+                geolocation_lookup[bus_id] = {'longitude': x, 'latitude': y}
+    else:
+        raise ValueError("Invalid file extension")
+
+    return geolocation_lookup
+
+
+def load_case(raw_file, cache_dir=None, cache_size=1024, processes=None):
+    '''parses raw_file into its CaseTables, when cache_dir is given the
+    tables are reused from (and saved to) an on-disk cache keyed by the
+    contents of raw_file, cache_size is the cache limit in MB.  when
+    processes is given the sections are parsed by that many processes.'''
+    cache = None
+    if cache_dir != None:
+        cache = CaseCache(cache_dir, cache_size*1024*1024, 'grg_pssedata-{}'.format(grg_pssedata.__version__))
+        cache_key = cache.key(raw_file)
+        case_tables = cache.get(cache_key)
+        if case_tables != None:
+            print('loaded parsed case from cache {}'.format(cache.path(cache_key)))
+            return case_tables
+
+    case_tables = load_case_tables(raw_file, processes)
+
+    if cache != None:
+        cache.put(cache_key, case_tables)
+
+    return case_tables
+
+
+# bump when the layout of the saved state changes
+state_format_version = 1
+
+def state_version():
+    return '{}-grg_pssedata-{}'.format(state_format_version, grg_pssedata.__version__)
+
+
+def load_state(state_file):
+    '''the state of a previous run saved by save_state, an empty state when
+    state_file does not exist or was saved by another version'''
+    state = {'version': state_version(), 'chunks': {}}
+    if state_file == None or not os.path.isfile(state_file):
+        return state
+
+    try:
+        with open(state_file, 'rb') as infile:
+            saved_state = pickle.load(infile)
+    except Exception as e:
+        print('WARNING: ignoring unreadable state file {} ({})'.format(state_file, e))
+        return state
+
+    if saved_state.get('version') != state['version']:
+        print('WARNING: ignoring state file {} of another version'.format(state_file))
+        return state
+    return saved_state
+
+
+def save_state(state_file, state):
+    write_pickle(state_file, state)
+
+
+def array_digest(*arrays):
+    '''a hash of the contents of numpy arrays'''
+    digest = hashlib.sha256()
+    for array in arrays:
+        digest.update(str(array.shape).encode('utf-8'))
+        digest.update(numpy.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+# arguments that do not change the output, input files are recorded by their
+# contents instead (the raw file name is part of the output)
+manifest_excluded_arguments = ['bus_geolocations', 'bus_locations', 'output', 'location_matches',
+    'cache_dir', 'cache_size', 'jobs', 'state', 'force', 'profile', 'profile_memory', 'quiet', 'diagnostics',
+    'diagnostic_samples', 'index']
+
+def connectivity_outputs(args):
+    '''the files written by a run'''
+    if args.kv_thresholds != None:
+        outputs = [kv_threshold_output(args.output, kv_threshold) for kv_threshold in sorted(set(args.kv_thresholds), reverse=True)]
+    else:
+        outputs = [args.output]
+    if args.bus_locations != None and args.location_matches != None:
+        outputs.append(args.location_matches)
+    if args.index != None:
+        if args.kv_thresholds != None:
+            outputs.extend(kv_threshold_output(args.index, kv_threshold) for kv_threshold in sorted(set(args.kv_thresholds), reverse=True))
+        else:
+            outputs.append(args.index)
+    return outputs
 
 
-    bus_sub_lookup = {}
-    substations = []
-    for i, sub_buses in substation_buses.items():
-        sub_id = i+1
-        substation = {
-            'id': sub_id,
-            'type':'physical',
-            'name': 'substation {}'.format(sub_id),
-            'transformer_groups': [],
-            'branch_groups': []
-        }
+def connectivity_sidecars(args):
+    '''the report files of a run, they are not part of its outputs and are
+    only written when the outputs are built'''
+    sidecars = []
+    if args.diagnostics != None:
+        if args.kv_thresholds != None:
+            sidecars.extend(kv_threshold_output(args.diagnostics, kv_threshold) for kv_threshold in sorted(set(args.kv_thresholds), reverse=True))
+        else:
+            sidecars.append(args.diagnostics)
+    if args.profile != None:
+        sidecars.append(args.profile)
+    return sidecars
 
-        if metabus_data != None and bus_to_sub != None:
-            sub_id = bus_to_sub[next(iter(sub_buses))]
-            substation['latitude'] = metabus_data[sub_id]['lat']
-            substation['longitude'] = metabus_data[sub_id]['lon']
-            substation['name'] = metabus_data[sub_id]['name']
 
-        buses = []
-        for bus_id in sub_buses:
-            buses.append(bus_data_lookup[bus_id])
-            bus_sub_lookup[bus_id] = substation
-        substation['buses'] = buses
+def connectivity_manifest(args):
+    '''the output_manifest of a run, its input files, options and the
+    version of the modules it is made of'''
+    modules = [sys.modules[__name__]] + [sys.modules[name] for name in
+        ['case_tables', 'clustering', 'name_matching', 'raw_sections', 'json_stream', 'connectivity_index']]
+    options = { name: value for name, value in vars(args).items() if name not in manifest_excluded_arguments }
+    return output_manifest.build_manifest(
+        {'bus_geolocations': args.bus_geolocations, 'bus_locations': args.bus_locations, 'raw_file': args.raw_file},
+        options,
+        '{}-grg_pssedata-{}'.format(output_manifest.source_version(modules), grg_pssedata.__version__))
 
-        substations.append(substation)
 
-        # if len(sub_data['bus_ids']) > 1:
-        #     print(sub_name)
-        #     print('  ' + str(sub_data['bus_ids']))
-        #     print('  ' + str(sub_data['bus_names']))
-        #     print('')
+def main(args):
+    # outputs made from the same inputs by the same version are kept
+    outputs = connectivity_outputs(args)
+    manifest = connectivity_manifest(args)
+    if not args.force and output_manifest.up_to_date(outputs, manifest):
+        print('outputs {} are up to date, skipping (--force to rebuild)'.format(', '.join(outputs)))
+        sidecars = connectivity_sidecars(args)
+        if len(sidecars) > 0:
+            print('WARNING: {} not written, they are left from a previous run if they exist'.format(', '.join(sidecars)))
+        return
+
+    # memory is only traced for the --profile report
+    profiler = StageProfiler(args.profile_memory and args.profile != None)
+    try:
+        build_outputs(args, outputs, manifest, profiler)
+    finally:
+        # the stages up to a failure are reported too
+        profiler.close()
+        if args.profile != None:
+            profiler.write(args.profile)
+            print('wrote stage profile to {}'.format(args.profile))
+
+
+def build_outputs(args, outputs, manifest, profiler):
+    '''the stages of main, recorded in profiler'''
+    diagnostics = Diagnostics(args.diagnostic_samples, args.quiet, args.diagnostics != None)
+
+    # with a state file only the parts of the case that changed since the
+    # previous run are parsed and contracted again
+    state = None
+    with profiler.stage('parse') as record:
+        if args.state != None:
+            if args.cache_dir != None:
+                print('WARNING: --cache-dir is not used with --state')
+            state = load_state(args.state)
+            case_tables, state['chunks'], parsed_count = load_case_tables_incremental(args.raw_file, state['chunks'], args.jobs)
+            print('parsed {} new section chunks, reused {}'.format(parsed_count, len(state['chunks']) - parsed_count))
+        else:
+            case_tables = load_case(args.raw_file, args.cache_dir, args.cache_size, args.jobs)
+        record['items'] = len(case_tables.buses)
+
+    # metabus and substation ids are kept in arrays indexed by bus row
+    with profiler.stage('transformer contraction', items=len(case_tables.transformers)):
+        bus_metabuses = numpy.arange(len(case_tables.buses))
+        transformer_key = array_digest(case_tables.buses.ids, case_tables.transformers.ends)
+        if state != None and state.get('transformer_key') == transformer_key:
+            bus_metabuses = state['transformer_metabuses']
+            print('reused the transformer contraction of the previous run')
+        else:
+            bus_metabuses = contract_transformers(bus_metabuses, case_tables.transformers)
 
-    substation_lookup = { sub['id'] : sub for sub in substations }
+    if state != None:
+        state['transformer_key'] = transformer_key
+        state['transformer_metabuses'] = bus_metabuses
+        save_state(args.state, state)
 
+    geolocation_lookup = None
     if args.bus_geolocations != None:
-        geolocation_lookup = {}
-
-        if args.bus_geolocations.lower().endswith('.geojson'):
-            with open(args.bus_geolocations, 'r') as jsonfile:
-                geojson = json.load(jsonfile)
-            #print(geojson)
-            for feature in geojson['features']:
-                bus_id = feature['properties'][args.bus_geolocations_index]
-                geolocation_lookup[bus_id] = {
-                    'longitude':feature['geometry']['coordinates'][0],
-                    'latitude':feature['geometry']['coordinates'][1]
-                }
-        elif args.bus_geolocations.lower().endswith('csv'):
-            with open(args.bus_geolocations, 'r') as csvfile:
-                csvfile.readline() # discard header row
-
-                for row in csvfile:
-                    elems = row.split(',')
-                    bus_id = int(elems[0])
-                    x = float(elems[1])
-                    y = float(elems[2])
-                    geolocation_lookup[bus_id] = {'longitude': x, 'latitude': y}
+        with profiler.stage('lookup build') as record:
+            geolocation_lookup = load_bus_geolocations(args.bus_geolocations, args.bus_geolocations_index)
+            record['items'] = len(geolocation_lookup)
+
+    if args.bus_locations != None:
+        with profiler.stage('location matching', items=len(case_tables.buses)):
+            location_index = LocationIndex(load_locations(args.bus_locations))
+            bus_candidates = match_bus_locations(case_tables, location_index, min_score=args.min_location_score)
+            if args.location_matches != None:
+                write_location_matches(args.location_matches, bus_candidates)
+
+            # buses without a geolocation are placed at their best match
+            if geolocation_lookup == None:
+                geolocation_lookup = {}
+            located = 0
+            for bus_id, candidates in bus_candidates.items():
+                if bus_id not in geolocation_lookup and len(candidates) > 0:
+                    location = candidates[0].location
+                    geolocation_lookup[bus_id] = {'longitude': location.longitude, 'latitude': location.latitude}
+                    located += 1
+        print('located {} of {} buses by name in {} locations'.format(located, len(case_tables.buses), len(location_index.location_table)))
+
+    if args.geolocation_distance != None:
+        if geolocation_lookup == None:
+            print('WARNING: --geolocation-distance requires bus geolocations, skipping geolocation contraction')
         else:
-            raise ValueError("Invalid file extension")
-
-
-
-
-        # import ipdb; ipdb.set_trace()
-
-
-        for substation in substations:
-            sub_location = None
+            with profiler.stage('geolocation contraction', items=len(geolocation_lookup)):
+                bus_metabuses = contract_geolocations(bus_metabuses, case_tables.buses, geolocation_lookup, args.geolocation_distance, diagnostics)
+
+    if args.kv_thresholds != None:
+        # the case is parsed and transformer contracted once, each voltage
+        # level is contracted from the same metabus graph
+        with profiler.stage('metabus graph', items=len(case_tables.branches)):
+            metabus_graph = build_metabus_graph(bus_metabuses, case_tables.buses, case_tables.branches)
+        for kv_threshold in sorted(set(args.kv_thresholds), reverse=True):
+            print('')
+            print('kv threshold: {}'.format(kv_threshold))
+            with profiler.stage('voltage contraction', items=len(case_tables.buses), kv_threshold=kv_threshold):
+                bus_substations = contract_metabus_graph(metabus_graph, kv_threshold)
+            # each level has the messages of the shared stages and its own,
+            # as in a run at that level alone
+            level_diagnostics = diagnostics.copy()
+            connectivity = build_connectivity(case_tables, bus_substations, geolocation_lookup, args.raw_file, profiler, level_diagnostics)
+            index = index_connectivity(connectivity, args.index != None)
+            # the corridors are built as they are written
+            with profiler.stage('write', kv_threshold=kv_threshold):
+                write_connectivity(connectivity, kv_threshold_output(args.output, kv_threshold), args.compact)
+            if index != None:
+                index.save(kv_threshold_output(args.index, kv_threshold))
+            level_diagnostics.print_summary()
+            if args.diagnostics != None:
+                level_diagnostics.write(kv_threshold_output(args.diagnostics, kv_threshold))
+                print('wrote diagnostics to {}'.format(kv_threshold_output(args.diagnostics, kv_threshold)))
+    else:
+        with profiler.stage('voltage contraction', items=len(case_tables.buses), kv_threshold=args.kv_threshold):
+            bus_substations = contract_voltage_level(bus_metabuses, case_tables.buses, case_tables.branches, args.kv_threshold)
+        connectivity = build_connectivity(case_tables, bus_substations, geolocation_lookup, args.raw_file, profiler, diagnostics)
+        index = index_connectivity(connectivity, args.index != None)
+        with profiler.stage('write'):
+            write_connectivity(connectivity, args.output, args.compact)
+        if index != None:
+            index.save(args.index)
+        diagnostics.print_summary()
+        if args.diagnostics != None:
+            diagnostics.write(args.diagnostics)
+            print('wrote diagnostics to {}'.format(args.diagnostics))
+
+    for output in outputs:
+        output_manifest.write_manifest(output, manifest)
+
+
+def index_connectivity(connectivity, enabled=True):
+    '''the Connectivity index of a connectivity built by build_connectivity,
+    filled in as the connectivity is written, None when not enabled'''
+    if not enabled:
+        return None
+    index = Connectivity(connectivity['case'])
+    index.index_streams(connectivity)
+    return index
+
+
+def load_connectivity(raw_file, kv_threshold=0.0, bus_geolocations=None, bus_geolocations_index='id', cache_dir=None):
+    '''the Connectivity index of a raw case at a voltage level, for using the
+    pipeline as a library without writing a connectivity file.  the warnings
+    about individual components are only counted.'''
+    case_tables = load_case(raw_file, cache_dir)
+    bus_metabuses = contract_transformers(numpy.arange(len(case_tables.buses)), case_tables.transformers)
+    geolocation_lookup = None
+    if bus_geolocations != None:
+        geolocation_lookup = load_bus_geolocations(bus_geolocations, bus_geolocations_index)
+    bus_substations = contract_voltage_level(bus_metabuses, case_tables.buses, case_tables.branches, kv_threshold)
+    connectivity = build_connectivity(case_tables, bus_substations, geolocation_lookup, raw_file, diagnostics=Diagnostics(quiet=True))
+    return Connectivity.from_connectivity(connectivity)
+
+
+def kv_threshold_output(output, kv_threshold):
+    '''adds the kv threshold to an output file name, connectivity.json -> connectivity_230kv.json'''
+    root, ext = os.path.splitext(output)
+    return '{}_{:g}kv{}'.format(root, kv_threshold, ext)
+
+
+def write_connectivity(connectivity, output, compact=False):
+    with open(output, 'w') as outfile:
+        if compact:
+            json_stream.dump(connectivity, outfile, sort_keys=True, separators=(',', ':'))
+        else:
+            json_stream.dump(connectivity, outfile, sort_keys=True, indent=2, separators=(',', ': '))
+
+
+# circuit ids of equivalent (virtual) branches and transformers
+virtual_circuits = ['\'99\'', "'EQ'", "99", "EQ"]
+
+# the edge components, those with two bus ends, that join substations into
+# corridors, as (CaseTables field, group list, component list, substation
+# group list).  only branches are kept within a substation, other edges
+# within a substation (e.g. after geolocation contraction) and facts at a
+# single bus are left out.
+corridor_components = [
+    ('branches', 'branch_groups', 'branches', 'branch_groups'),
+    ('facts', 'facts_groups', 'facts', None),
+    ('tt_dc_lines', 'tt_dc_groups', 'tt_dcs', None),
+    ('vsc_dc_lines', 'vsc_dc_groups', 'vsc_dcs', None),
+]
+
+EdgeGroups = namedtuple('EdgeGroups', ['edge_groups', 'group_kinds', 'group_ids', 'group_substations', 'group_corridors', 'corridor_substations'])
+
+def group_edges(kind_ends, bus_substations):
+    '''groups the edges of several kinds by bus pair and the bus pairs by
+    substation pair, all kinds at once.  kind_ends is a list of (n, 2) arrays
+    of the bus rows of the edges of each kind.
+
+    groups are numbered in the order of their first edge, kind by kind.
+    returns an EdgeGroups of arrays:
+    - edge_groups, the group of each edge, the kinds one after the other
+    - group_kinds and group_ids, the kind of each group and its id within
+      the kind, numbered from 1
+    - group_substations, the lower and higher substation of each group
+    - group_corridors, the corridor of each group, -1 within a substation
+    - corridor_substations, the substation pair of each corridor, corridors
+      are sorted by substation pair
+    '''
+    kinds = numpy.repeat(numpy.arange(len(kind_ends)), [len(ends) for ends in kind_ends])
+    ends = numpy.concatenate([numpy.asarray(ends, dtype=numpy.int64).reshape(-1, 2) for ends in kind_ends])
+    bus_count = max(len(bus_substations), 1)
+
+    keys = (kinds*bus_count + ends[:, 0])*bus_count + ends[:, 1]
+    unique_keys, firsts, edge_groups = numpy.unique(keys, return_index=True, return_inverse=True)
+    # renumber the groups from key order to first edge order
+    order = numpy.argsort(firsts)
+    renumber = numpy.empty(len(order), dtype=numpy.int64)
+    renumber[order] = numpy.arange(len(order))
+    edge_groups = renumber[edge_groups.reshape(-1)]
+    group_firsts = firsts[order]
+
+    group_kinds = kinds[group_firsts]
+    kind_starts = numpy.searchsorted(group_kinds, numpy.arange(len(kind_ends)))
+    group_ids = numpy.arange(len(group_firsts)) - kind_starts[group_kinds] + 1
+
+    group_substations = numpy.sort(bus_substations[ends[group_firsts]].reshape(-1, 2), axis=1)
+    substation_count = int(group_substations.max()) + 1 if len(group_substations) > 0 else 1
+    between = group_substations[:, 0] != group_substations[:, 1]
+    corridor_keys, corridors = numpy.unique(group_substations[between, 0]*substation_count + group_substations[between, 1], return_inverse=True)
+    group_corridors = numpy.full(len(group_firsts), -1, dtype=numpy.int64)
+    group_corridors[between] = corridors.reshape(-1)
+    corridor_substations = numpy.column_stack((corridor_keys // substation_count, corridor_keys % substation_count))
+
+    return EdgeGroups(edge_groups, group_kinds, group_ids, group_substations, group_corridors, corridor_substations)
+
+
+def component_physical(case_tables):
+    '''the status of each component as a flag array, True for physical,
+    by CaseTables field.  branches and transformers with an equivalent
+    circuit id (see virtual_circuits) are virtual, every other component is
+    physical.'''
+    names = case_tables.names
+    virtual_names = numpy.array([name.strip() in virtual_circuits for name in names.names], dtype=bool)
+
+    physical = {'buses': numpy.ones(len(case_tables.buses), dtype=bool)}
+    for field in component_fields:
+        table = getattr(case_tables, field)
+        if field in ['branches', 'transformers']:
+            physical[field] = ~virtual_names[table.names]
+        else:
+            physical[field] = numpy.ones(len(table), dtype=bool)
+    return physical
+
+
+def classify_groups(physical, bus_substations, transformers, edge_rows, edges):
+    '''the status of each substation and corridor as flag arrays, True for
+    physical, from the component flags of component_physical.  a
+    substation is physical when it has a physical bus, transformer or
+    branch and a corridor when it has a physical edge, each component is
+    looked at once.  edge_rows and edges are the edges of each kind of
+    corridor_components and their EdgeGroups.'''
+    substation_count = int(bus_substations.max()) + 1 if len(bus_substations) > 0 else 0
+    substation_physical = numpy.zeros(substation_count, dtype=bool)
+    substation_physical[bus_substations[physical['buses']]] = True
+    substation_physical[bus_substations[transformers.ends[physical['transformers'], 0]]] = True
+
+    edge_physical = numpy.concatenate([physical[field][rows]
+        for rows, (field, group_field, list_field, substation_field) in zip(edge_rows, corridor_components)])
+    group_physical = numpy.zeros(len(edges.group_kinds), dtype=bool)
+    group_physical[edges.edge_groups[edge_physical]] = True
+
+    within = edges.group_corridors < 0
+    substation_physical[edges.group_substations[within & group_physical, 0]] = True
+    corridor_physical = numpy.zeros(len(edges.corridor_substations), dtype=bool)
+    corridor_physical[edges.group_corridors[~within & group_physical]] = True
+
+    return substation_physical, corridor_physical
+
+
+def build_connectivity(case_tables, bus_substations, geolocation_lookup, case_name, profiler=None, diagnostics=None):
+    '''bus_substations is the substation id (0..n-1) of each bus row, the
+    stages are recorded in profiler and the warnings about components go to
+    diagnostics when given'''
+    if profiler == None:
+        profiler = StageProfiler()
+    if diagnostics == None:
+        diagnostics = Diagnostics()
+
+    with profiler.stage('bus data build', items=len(case_tables.buses)):
+        names = case_tables.names
+        buses = case_tables.buses
+        bus_ids = buses.ids.tolist()
+        physical = component_physical(case_tables)
+        bus_types = ['physical' if bus_physical else 'virtual' for bus_physical in physical['buses'].tolist()]
+
+        # the bus rows of each substation, in file order
+        substation_order = numpy.argsort(bus_substations, kind='stable')
+        substation_starts = numpy.searchsorted(bus_substations[substation_order], numpy.arange(bus_substations.max()+2 if len(bus_substations) > 0 else 1))
+
+        # the components at each bus, grouped by bus row in file order
+        bus_component_rows = {}
+        for field in ['loads', 'generators', 'fixed_shunts', 'switched_shunts']:
+            bus_component_rows[field] = getattr(case_tables, field).bus_groups(len(buses))
+
+        facts = case_tables.facts
+        bus_facts = ComponentTable(facts.ends[facts.ends[:, 1] < 0], facts.names[facts.ends[:, 1] < 0])
+        bus_facts_ids = numpy.flatnonzero(facts.ends[:, 1] < 0) + 1
+        bus_component_rows['facts'] = bus_facts.bus_groups(len(buses))
+
+        def bus_data(bus_id, row):
+            '''the output record of the bus in the given row'''
+            bus_record = {
+                'id':bus_id,
+                'type':bus_types[row],
+                'name':names[buses.names[row]],
+                'loads':[],
+                'generators':[],
+                'fixed_shunts':[],
+                'switched_shunts':[],
+                'facts':[]
+            }
 
-            for bus in substation['buses']:
-                if bus['id'] in geolocation_lookup:
-                    bus_location = geolocation_lookup[bus['id']]
-                    if sub_location != None:
-                        if sub_location['longitude'] != bus_location['longitude'] \
-                            or sub_location['latitude'] != bus_location['latitude']:
-                            print('WARNING: sub location {} and bus location differ {}'.format(sub_location, bus_location))
+            for field in ['loads', 'generators', 'fixed_shunts']:
+                order, starts = bus_component_rows[field]
+                table = getattr(case_tables, field)
+                for component_row in order[starts[row]:starts[row+1]].tolist():
+                    bus_record[field].append({
+                        'id':component_row+1,
+                        'name':'{} {}'.format(bus_id, names[table.names[component_row]]),
+                    })
+
+            order, starts = bus_component_rows['switched_shunts']
+            for component_row in order[starts[row]:starts[row+1]].tolist():
+                bus_record['switched_shunts'].append({
+                    'id':component_row+1,
+                    'name':'{}'.format(bus_id),
+                })
+
+            order, starts = bus_component_rows['facts']
+            for component_row in order[starts[row]:starts[row+1]].tolist():
+                bus_record['facts'].append({
+                    'id':int(bus_facts_ids[component_row]),
+                    'name':'{} {}'.format(bus_id, names[bus_facts.names[component_row]]),
+                })
+
+            return bus_record
+
+
+        substation_count = len(substation_starts)-1
+
+    substation_locations = None
+    if geolocation_lookup != None:
+        with profiler.stage('geolocation', items=substation_count):
+            substation_locations = []
+            for i in range(substation_count):
+                sub_location = None
+
+                for row in substation_order[substation_starts[i]:substation_starts[i+1]].tolist():
+                    bus_id = bus_ids[row]
+                    if bus_id in geolocation_lookup:
+                        bus_location = geolocation_lookup[bus_id]
+                        if sub_location != None:
+                            if sub_location['longitude'] != bus_location['longitude'] \
+                                or sub_location['latitude'] != bus_location['latitude']:
+                                diagnostics.warning('bus_location_differs', 'sub location {} and bus location differ {}', sub_location, bus_location)
+                        else:
+                            sub_location = bus_location
+                    # omit becouse there are a lot of these
                     else:
-                        sub_location = bus_location
-                # omit becouse there are a lot of these
-                else:
-                    print('WARNING: no location for bus id {} in substation {}'.format(bus['id'], substation['id']))
+                        diagnostics.warning('bus_location_missing', 'no location for bus id {} in substation {}', bus_id, i+1)
 
-            if sub_location != None:
-                substation['longitude'] = sub_location['longitude']
-                substation['latitude'] = sub_location['latitude']
-                #print(substation)
+                if sub_location != None:
+                    substation_locations.append((sub_location['longitude'], sub_location['latitude']))
+                else:
+                    substation_locations.append(None)
+                    diagnostics.warning('substation_location_missing', 'no location for substation {} {}', i+1, 'substation {}'.format(i+1))
+
+
+    with profiler.stage('transformer grouping', items=len(case_tables.transformers)) as record:
+        trans_group_id = 1
+        transformer_tuple_lookup = {}
+        transformers = case_tables.transformers
+        transformer_physical = physical['transformers'].tolist()
+        for i, ((pr_row, sn_row, tr_row), trans_ckt) in enumerate(zip(transformers.ends.tolist(), names.decode(transformers.names))):
+            trans_id = i+1
+            ckt = trans_ckt.strip()
+            pr_bus = bus_ids[pr_row]
+            sn_bus = bus_ids[sn_row]
+            tr_bus = bus_ids[tr_row] if tr_row >= 0 else 0
+
+            if tr_row < 0:
+                key = (pr_row, sn_row)
             else:
-                print('WARNING: no location for substation {} {}'.format(substation['id'], substation['name']))
-
-
-    trans_group_id = 1
-    transformer_tuple_lookup = {}
-    for i, trans in enumerate(raw_case.transformers):
-        trans_id = i+1
-        pr_bus = int(trans.p1.i)
-        sn_bus = int(trans.p1.j)
-        tr_bus = int(trans.p1.k)
-        ckt = str(trans.p1.ckt).strip()
-
-        if tr_bus == 0:
-            key = (pr_bus, sn_bus)
-        else:
-            key = (pr_bus, sn_bus, tr_bus)
-
-        comp_type = 'physical'
-        if ckt in ['\'99\'', "'EQ'", "99", "EQ"]:
-            comp_type = 'virtual'
-            print('marking transformer {} - {} {} {} {} as virtual'.format(trans_id, pr_bus, sn_bus, tr_bus, ckt))
+                key = (pr_row, sn_row, tr_row)
 
-        trans_data = {
-            'id':trans_id,
-            'type':comp_type,
-            'name':'{} {} {} {}'.format(trans.p1.i, trans.p1.j, trans.p1.k, trans.p1.ckt)
-        }
+            comp_type = 'physical'
+            if not transformer_physical[i]:
+                comp_type = 'virtual'
+                diagnostics.note('virtual_transformer', 'marking transformer {} - {} {} {} {} as virtual', trans_id, pr_bus, sn_bus, tr_bus, ckt)
 
-        if not key in transformer_tuple_lookup:
-            transformer_tuple_lookup[key] = {
-                'id':trans_group_id,
-                'transformers':[]
+            trans_data = {
+                'id':trans_id,
+                'type':comp_type,
+                'name':'{} {} {} {}'.format(pr_bus, sn_bus, tr_bus, trans_ckt)
             }
-            trans_group_id += 1
-
-        transformer_tuple_lookup[key]['transformers'].append(trans_data)
 
-    for k, v in transformer_tuple_lookup.items():
-        bus_sub = bus_sub_lookup[k[0]]
-        assert(all([ bus_sub == bus_sub_lookup[bus_id] for bus_id in k]))
-        bus_sub['transformer_groups'].append(v)
+            if not key in transformer_tuple_lookup:
+                transformer_tuple_lookup[key] = {
+                    'id':trans_group_id,
+                    'transformers':[]
+                }
+                trans_group_id += 1
+
+            transformer_tuple_lookup[key]['transformers'].append(trans_data)
+
+        # the groups of each substation, transformer groups first, see
+        # build_substations
+        bus_subs = bus_substations.tolist()
+        group_records = []
+        group_substations = []
+        for k, v in transformer_tuple_lookup.items():
+            bus_sub = bus_subs[k[0]]
+            assert(all([ bus_sub == bus_subs[row] for row in k]))
+            group_records.append(v)
+            group_substations.append(bus_sub)
+        group_fields = ['transformer_groups']*len(group_records)
+        record['groups'] = len(transformer_tuple_lookup)
+        del transformer_tuple_lookup
+
+
+    with profiler.stage('corridor aggregation') as record:
+        # the edges of each kind, by component row
+        edge_rows = []
+        for field, group_field, list_field, substation_field in corridor_components:
+            ends = getattr(case_tables, field).ends
+            used = ends[:, 1] >= 0
+            if substation_field == None:
+                used &= bus_substations[ends[:, 0]] != bus_substations[numpy.maximum(ends[:, 1], 0)]
+            edge_rows.append(numpy.flatnonzero(used))
+
+        edges = group_edges([getattr(case_tables, field).ends[rows, :2]
+            for rows, (field, group_field, list_field, substation_field) in zip(edge_rows, corridor_components)], bus_substations)
+
+        groups = [{'id':group_id, corridor_components[kind][2]:[]}
+            for kind, group_id in zip(edges.group_kinds.tolist(), edges.group_ids.tolist())]
+
+        edge_groups = edges.edge_groups.tolist()
+        edge_position = 0
+        for rows, (field, group_field, list_field, substation_field) in zip(edge_rows, corridor_components):
+            table = getattr(case_tables, field)
+            edge_physical = physical[field].tolist()
+            for row, group, (from_row, to_row), name in zip(rows.tolist(), edge_groups[edge_position:edge_position+len(rows)],
+                    table.ends[rows, :2].tolist(), names.decode(table.names[rows])):
+                from_bus = bus_ids[from_row]
+                to_bus = bus_ids[to_row]
+
+                # only branches are virtual, see component_physical
+                comp_type = 'physical'
+                if not edge_physical[row]:
+                    comp_type = 'virtual'
+                    diagnostics.note('virtual_branch', 'marking branch {} - {} {} {} as virtual', row+1, from_bus, to_bus, name.strip())
+
+                groups[group][list_field].append({
+                    'id':row+1,
+                    'type':comp_type,
+                    'name': '{} {} {}'.format(from_bus, to_bus, name)
+                })
+            edge_position += len(rows)
+
+        # groups within a substation go to the substation groups, the others
+        # are added to their corridors as the corridors are streamed out
+        for i in numpy.flatnonzero(edges.group_corridors < 0).tolist():
+            group_records.append(groups[i])
+            group_substations.append(int(edges.group_substations[i, 0]))
+            group_fields.append(corridor_components[edges.group_kinds[i]][3])
+            groups[i] = None
+        record['items'] = len(edges.edge_groups)
+        record['groups'] = len(groups)
+
+    with profiler.stage('classification', items=substation_count+len(edges.corridor_substations)):
+        substation_physical, corridor_physical = classify_groups(physical, bus_substations, transformers, edge_rows, edges)
+        for i in numpy.flatnonzero(~substation_physical).tolist():
+            diagnostics.note('virtual_substation', 'marking substation {} as virtual', i+1)
+
+    group_substations = numpy.array(group_substations, dtype=numpy.int64)
+    group_order = numpy.argsort(group_substations, kind='stable')
+    group_starts = numpy.searchsorted(group_substations[group_order], numpy.arange(substation_count+1))
+
+    corridor_count = len(edges.corridor_substations)
+    corridors = build_corridors(edges, groups, corridor_physical, diagnostics)
+    substations = build_substations((substation_order, substation_starts), bus_ids, bus_data, substation_locations,
+        (group_order, group_starts), group_records, group_fields, substation_physical)
 
+    connectivity = {
+        'case': case_name,
+        'substations': json_stream.StreamedList(substations),
+        'corridors': json_stream.StreamedList(corridors)
+    }
+    print('Nodes: %d' % len(buses))
+    print('Edges: %d' % (len(case_tables.branches)+len(transformers)+len(case_tables.tt_dc_lines)+len(case_tables.vsc_dc_lines)))
+    print('')
+    print('Substations: %d' % substation_count)
+    print('Corridors: %d' % corridor_count)
 
-    branch_bp_id = 1
-    branch_bp_lookup = {}
-    for i, branch in enumerate(raw_case.branches):
-        branch_id = i+1
-        from_bus = int(branch.i)
-        to_bus = int(branch.j)
-        ckt = str(branch.ckt).strip()
+    return connectivity
 
-        #print(from_bus, to_bus)
-        #assert(bus_sub_lookup[from_bus] != bus_sub_lookup[to_bus])
 
-        comp_type = 'physical'
-        if ckt in ['\'99\'', "'EQ'", "99", "EQ"]:
-            comp_type = 'virtual'
-            print('marking branch {} - {} {} {} as virtual'.format(branch_id, from_bus, to_bus, ckt))
+def build_substations(bus_rows, bus_ids, bus_data, locations, group_rows, group_records, group_fields, substation_physical):
+    '''yields each substation, its records are only built when it is
+    written.  bus_rows and group_rows are the (order, starts) of the bus rows
+    and of the groups of each substation, bus_data builds the record of a bus
+    row, locations is the (longitude, latitude) of each substation, or of
+    none without geolocations.  group_records are the group records and
+    group_fields the list of the substation each one goes in, the group
+    records are released as their substations are yielded.'''
+    bus_order, bus_starts = bus_rows
+    group_order, group_starts = group_rows
+    substation_physical = substation_physical.tolist()
 
-        branch_data = {
-            'id':branch_id,
-            'type':comp_type,
-            'name': '{} {} {}'.format(branch.i, branch.j, branch.ckt)
+    for i in range(len(bus_starts)-1):
+        sub_id = i+1
+        substation = {
+            'id': sub_id,
+            'type':'physical',
+            'name': 'substation {}'.format(sub_id),
+            'transformer_groups': [],
+            'branch_groups': []
         }
 
-        key = (from_bus, to_bus)
-        if not key in branch_bp_lookup:
-            branch_bp_lookup[key] = {
-                'id':branch_bp_id,
-                'branches':[]
-            }
-            branch_bp_id += 1
+        if locations != None and locations[i] != None:
+            substation['longitude'], substation['latitude'] = locations[i]
 
-        branch_bp_lookup[key]['branches'].append(branch_data)
+        substation['buses'] = [bus_data(bus_ids[row], row) for row in bus_order[bus_starts[i]:bus_starts[i+1]].tolist()]
 
+        for group in group_order[group_starts[i]:group_starts[i+1]].tolist():
+            substation[group_fields[group]].append(group_records[group])
+            group_records[group] = None
 
-    facts_bp_id = 1
-    facts_bp_lookup = {}
-    for i, facts in enumerate(raw_case.facts):
-        facts_id = i+1
-        from_bus = int(facts.i)
-        to_bus = int(facts.j)
+        if not substation_physical[i]:
+            substation['type'] = 'virtual'
 
-        if to_bus != 0:
-            assert(bus_sub_lookup[from_bus] != bus_sub_lookup[to_bus])
+        yield substation
 
-            facts_data = {
-                'id':facts_id,
-                'type':'physical',
-                'name': '{} {} {}'.format(branch.i, branch.j, branch.ckt)
-            }
 
-            key = (from_bus, to_bus)
-            if not key in facts_bp_lookup:
-                facts_bp_lookup[key] = {
-                    'id':facts_bp_id,
-                    'facts':[]
-                }
-                facts_bp_id += 1
-            facts_bp_lookup[key]['facts'].append(facts_data)
-
-
-    tt_dc_bp_id = 1
-    tt_dc_bp_lookup = {}
-    for i, tt_dc in enumerate(raw_case.tt_dc_lines):
-        tt_dc_id = i+1
-        from_bus = int(tt_dc.rectifier.ipr)
-        to_bus = int(tt_dc.inverter.ipi)
-        if bus_sub_lookup[from_bus] != bus_sub_lookup[to_bus]:
-            tt_dc_data = {
-                'id':tt_dc_id,
-                'type':'physical',
-                'name': '{} {} {}'.format(from_bus, to_bus, tt_dc.params.name)
-            }
-
-            key = (from_bus, to_bus)
-            if not key in tt_dc_bp_lookup:
-                tt_dc_bp_lookup[key] = {
-                    'id':tt_dc_bp_id,
-                    'tt_dcs':[]
-                }
-                tt_dc_bp_id += 1
-            tt_dc_bp_lookup[key]['tt_dcs'].append(tt_dc_data)
-
-    vsc_dc_bp_id = 1
-    vsc_dc_bp_lookup = {}
-    for i, vsc_dc in enumerate(raw_case.vsc_dc_lines):
-        vsc_dc_id = i+1
-        from_bus = int(vsc_dc.c1.ibus)
-        to_bus = int(vsc_dc.c2.ibus)
-        if bus_sub_lookup[from_bus] != bus_sub_lookup[to_bus]:
-            vsc_dc_data = {
-                'id':vsc_dc_id,
-                'type':'physical',
-                'name': '{} {} {}'.format(from_bus, to_bus, vsc_dc.params.name)
-            }
+def build_corridors(edges, groups, corridor_physical, diagnostics):
+    '''yields each corridor as soon as it is complete.  edges are the
+    EdgeGroups of the case, groups the record of each group and
+    corridor_physical the status of each corridor (see classify_groups), the
+    group records are released as their corridors are yielded.'''
+    corridor_order = numpy.argsort(edges.group_corridors, kind='stable')
+    corridor_starts = numpy.searchsorted(edges.group_corridors[corridor_order], numpy.arange(len(edges.corridor_substations)+1))
+    group_kinds = edges.group_kinds.tolist()
+    corridor_physical = corridor_physical.tolist()
 
-            key = (from_bus, to_bus)
-            if not key in vsc_dc_bp_lookup:
-                vsc_dc_bp_lookup[key] = {
-                    'id':tt_dc_bp_id,
-                    'vsc_dcs':[]
-                }
-                vsc_dc_bp_id += 1
-            vsc_dc_bp_lookup[key]['vsc_dcs'].append(vsc_dc_data)
-
-
-    corridor_branch_lookup = {}
-    for (from_bus, to_bus), branch_group in branch_bp_lookup.items():
-        #print('{} {} {}'.format(from_bus, to_bus, v))
-        sub_from = bus_sub_lookup[from_bus]
-        sub_to = bus_sub_lookup[to_bus]
-        if sub_from == sub_to:
-            sub_from['branch_groups'].append(branch_group)
-        else:
-            if sub_from['id'] > sub_to['id']:
-                sub_from = bus_sub_lookup[to_bus]
-                sub_to = bus_sub_lookup[from_bus]
-            corridor_key = (sub_from['id'], sub_to['id'])
-            if not corridor_key in corridor_branch_lookup:
-                corridor_branch_lookup[corridor_key] = []
-            corridor_branch_lookup[corridor_key].append(branch_group)
-
-
-    corridor_facts_lookup = {}
-    for (from_bus, to_bus), facts_group in facts_bp_lookup.items():
-        sub_from = bus_sub_lookup[from_bus]
-        sub_to = bus_sub_lookup[to_bus]
-
-        if sub_from['id'] > sub_to['id']:
-            sub_from = bus_sub_lookup[to_bus]
-            sub_to = bus_sub_lookup[from_bus]
-        corridor_key = (sub_from['id'], sub_to['id'])
-        if not corridor_key in corridor_facts_lookup:
-            corridor_facts_lookup[corridor_key] = []
-        corridor_facts_lookup[corridor_key].append(facts_group)
-
-
-    corridor_tt_dc_lookup = {}
-    for (from_bus, to_bus), tt_dc_group in tt_dc_bp_lookup.items():
-        sub_from = bus_sub_lookup[from_bus]
-        sub_to = bus_sub_lookup[to_bus]
-
-        if sub_from['id'] > sub_to['id']:
-            sub_from = bus_sub_lookup[to_bus]
-            sub_to = bus_sub_lookup[from_bus]
-        corridor_key = (sub_from['id'], sub_to['id'])
-        if not corridor_key in corridor_tt_dc_lookup:
-            corridor_tt_dc_lookup[corridor_key] = []
-        corridor_tt_dc_lookup[corridor_key].append(tt_dc_group)
-
-
-    corridor_vsc_dc_lookup = {}
-    for (from_bus, to_bus), vsc_dc_group in vsc_dc_bp_lookup.items():
-        sub_from = bus_sub_lookup[from_bus]
-        sub_to = bus_sub_lookup[to_bus]
-
-        if sub_from['id'] > sub_to['id']:
-            sub_from = bus_sub_lookup[to_bus]
-            sub_to = bus_sub_lookup[from_bus]
-        corridor_key = (sub_from['id'], sub_to['id'])
-        if not corridor_key in corridor_vsc_dc_lookup:
-            corridor_vsc_dc_lookup[corridor_key] = []
-        corridor_vsc_dc_lookup[corridor_key].append(vsc_dc_group)
-
-
-    corridors = []
-    corridor_keys = set().union(
-        corridor_branch_lookup.keys(),
-        corridor_facts_lookup.keys(),
-        corridor_tt_dc_lookup.keys(),
-        corridor_vsc_dc_lookup.keys()
-    )
-
-    for i, corridor_key in enumerate(corridor_keys):
+    for i, (sub_from, sub_to) in enumerate(edges.corridor_substations.tolist()):
         corr_id = i+1
         corridor = {
             'id': corr_id,
             'type':'physical',
             'name': 'corridor {}'.format(corr_id),
-            'from_substation': corridor_key[0],
-            'to_substation': corridor_key[1],
+            'from_substation': sub_from+1,
+            'to_substation': sub_to+1,
             'branch_groups': [],
             'facts_groups':[],
             'tt_dc_groups':[],
             'vsc_dc_groups':[],
         }
 
-        if corridor_key in corridor_branch_lookup:
-            corridor['branch_groups'] = corridor_branch_lookup[corridor_key]
-
-        if corridor_key in corridor_facts_lookup:
-            corridor['facts_groups'] = corridor_facts_lookup[corridor_key]
-
-        if corridor_key in corridor_tt_dc_lookup:
-            corridor['tt_dc_groups'] = corridor_tt_dc_lookup[corridor_key]
+        for group in corridor_order[corridor_starts[i]:corridor_starts[i+1]].tolist():
+            corridor[corridor_components[group_kinds[group]][1]].append(groups[group])
+            groups[group] = None
 
-        if corridor_key in corridor_vsc_dc_lookup:
-            corridor['vsc_dc_groups'] = corridor_vsc_dc_lookup[corridor_key]
-
-        physical_branch = any(branch['type']=='physical' for branch_group in corridor['branch_groups'] for branch in branch_group['branches'])
-        physical_facts = any(facts['type']=='physical' for facts_group in corridor['facts_groups'] for facts in facts_group['facts'])
-        physical_tt_dc = any(tt_dc['type']=='physical' for tt_dc_group in corridor['tt_dc_groups'] for tt_dc in tt_dc_group['tt_dcs'])
-        physical_vsc_dc = any(vsc_dc['type']=='physical' for vsc_dc_group in corridor['vsc_dc_groups'] for vsc_dc in vsc_dc_group['vsc_dcs'])
-
-        if not (physical_branch or physical_facts or physical_tt_dc or physical_vsc_dc):
+        if not corridor_physical[i]:
             corridor['type'] = 'virtual'
-            print('marking corridor {} as virtual'.format(corr_id))
-
-        corridors.append(corridor)
-
+            diagnostics.note('virtual_corridor', 'marking corridor {} as virtual', corr_id)
 
-        for substation in substations:
-            physical_bus = any(bus['type']=='physical' for bus in substation['buses'])
-            physical_branch = any(branch['type']=='physical' for branch_group in substation['branch_groups'] for branch in branch_group['branches'])
-            physical_transformer = any(transformer['type']=='physical' for transformer_group in substation['transformer_groups'] for transformer in transformer_group['transformers'])
+        yield corridor
 
-            if not (physical_bus or physical_branch or physical_transformer):
-                substation['type'] = 'virtual'
-                print('marking substation {} as virtual'.format(substation['id']))
 
-
-    connectivity = {
-        'case': args.raw_file,
-        'substations': substations,
-        'corridors': corridors
-    }
-    print('Nodes: %d' % len(raw_case.buses))
-    print('Edges: %d' % (len(raw_case.branches)+len(raw_case.transformers)+len(raw_case.tt_dc_lines)+len(raw_case.vsc_dc_lines)))
-    print('')
-    print('Substations: %d' % len(substations))
-    print('Corridors: %d' % len(corridors))
-
-    with open(args.output, 'w') as outfile:
-        json.dump(connectivity, outfile, sort_keys=True, indent=2, separators=(',', ': '))
-
-
-def get_base_kv(from_bus_id, to_bus_id, bus_lookup, comp_id):
-    from_base_kv = float(bus_lookup[from_bus_id].basekv)
-    to_base_kv = float(bus_lookup[to_bus_id].basekv)
+def get_base_kv(from_bus_id, to_bus_id, buses, comp_id, diagnostics=None):
+    from_base_kv, to_base_kv = buses.base_kvs[buses.rows([from_bus_id, to_bus_id])].tolist()
 
     #print(from_base_kv, to_base_kv)
     if from_base_kv != to_base_kv:
-        print('WARNING: different base kv values on component id {} {}:{} {}:{}'.format(comp_id, from_bus_id, from_base_kv, to_bus_id, to_base_kv))
+        if diagnostics == None:
+            diagnostics = Diagnostics()
+        diagnostics.warning('base_kv_differs', 'different base kv values on component id {} {}:{} {}:{}', comp_id, from_bus_id, from_base_kv, to_bus_id, to_base_kv)
     #assert(from_base_kv == to_base_kv)
     return max(from_base_kv, to_base_kv)
 
@@ -738,17 +1195,44 @@ def connectivity_range(lb, ub, value, watch, threshold):
     }
 
 
+def kv_threshold_list(value):
+    return [float(kv) for kv in value.split(',') if len(kv.strip()) > 0]
+
+
 def build_cli_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('raw_file', help='the psse file to operate on (.raw)')
     parser.add_argument('-o', '--output', help='the place to send the output (.json)', default='connectivity.json')
     parser.add_argument('-k', '--kv-threshold' , help='the minimum voltage to be represented in the network connectivity', type=float, default=0.0)
+    parser.add_argument('-K', '--kv-thresholds' , help='comma separated voltage levels (e.g. 69,115,230,345), writes one connectivity file per level', type=kv_threshold_list)
+    parser.add_argument('-c', '--compact', help='write the output without indentation', action='store_true', default=False)
     parser.add_argument('-g', '--bus-geolocations' , help='bus geolocation data (.geojson/csv)')
     parser.add_argument('-n', '--bus-geolocations-index', default='id', help='index field name for bus geolocations .geojson')
+    parser.add_argument('-L', '--bus-locations', help='location table (.csv, coordinates.csv layout), buses without a geolocation are placed at the location best matching their name and voltage')
+    parser.add_argument('--location-matches', help='write the ranked location candidates of each bus (.csv)')
+    parser.add_argument('--min-location-score', help='the lowest score of a location match, from 0 to 1', type=float, default=0.75)
+    parser.add_argument('-D', '--geolocation-distance', help='join buses whose geolocations are within this distance (m) into one substation', type=float)
+    parser.add_argument('--cache-dir', help='directory for caching parsed cases between runs')
+    parser.add_argument('--cache-size', help='maximum size of the parsed case cache in MB', type=float, default=1024)
+    parser.add_argument('-j', '--jobs', help='parse the raw file sections concurrently with this many processes', type=int)
+    parser.add_argument('--force', help='rebuild the outputs even when their inputs have not changed since they were written', action='store_true', default=False)
+    parser.add_argument('--index', help='also save an index of the connectivity for constant time lookups (.pickle, see connectivity_index.py)')
+    parser.add_argument('-q', '--quiet', help='do not print warnings about individual components, only their counts', action='store_true', default=False)
+    parser.add_argument('--diagnostics', help='write every warning about individual components to this file (.json or .csv), with -K one file per level')
+    parser.add_argument('--diagnostic-samples', help='the number of warnings of each kind that are printed', type=int, default=10)
+    parser.add_argument('--profile', help='write the wall time, cpu time, peak memory and item counts of each stage of the run to this file (.json)')
+    parser.add_argument('--profile-memory', help='with --profile, also trace the peak python allocations of each stage (slower)', action='store_true', default=False)
+    parser.add_argument('--state', help='state file of incremental runs (.pickle), only the parts of the raw file that changed since the run that saved it are parsed again, the output is the same as a full run')
 
     return parser
 
 
 if __name__ == '__main__':
+    # the -j workers of a frozen (pyinstaller) windows executable start it
+    # again, freeze_support runs them as workers instead of as main
+    multiprocessing.freeze_support()
     parser = build_cli_parser()
-    main(parser.parse_args())
+    args = parser.parse_args()
+    if args.profile_memory and args.profile == None:
+        parser.error('--profile-memory requires --profile')
+    main(args)
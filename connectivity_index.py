@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+'''an index of a connectivity (the output of connectivity_comp.py) for
+constant time lookups of the substation of a bus, the group of a component,
+the substation or corridor of a group and the corridor between two
+substations.  the index is built from the substations and corridors as they
+are written, or read from a connectivity file, and saved with pickle.'''
+
+import pickle
+
+import json_stream
+from case_cache import write_pickle
+
+# the group lists of substations and corridors, with the component list of
+# each kind of group
+group_components = [
+    ('transformer_groups', 'transformers'),
+    ('branch_groups', 'branches'),
+    ('facts_groups', 'facts'),
+    ('tt_dc_groups', 'tt_dcs'),
+    ('vsc_dc_groups', 'vsc_dcs'),
+]
+
+# bump when the layout of the saved index changes
+index_format_version = 1
+
+
+class Connectivity(object):
+    '''hash indexes of a connectivity.  components and groups are keyed by
+    their list and id, e.g. ('branches', 12) and ('branch_groups', 4), as
+    the ids of each kind are numbered separately.  group locations are
+    ('substations', id) or ('corridors', id).'''
+
+    def __init__(self, case=None):
+        self.case = case
+        self.bus_substations = {}
+        self.component_groups = {}
+        self.group_locations = {}
+        self.substation_corridors = {}
+
+    def add_groups(self, item, location):
+        for group_field, component_field in group_components:
+            for group in item.get(group_field, []):
+                group_key = (group_field, group['id'])
+                self.group_locations[group_key] = location
+                for component in group[component_field]:
+                    self.component_groups[(component_field, component['id'])] = group_key
+
+    def add_substation(self, substation):
+        for bus in substation['buses']:
+            self.bus_substations[bus['id']] = substation['id']
+        self.add_groups(substation, ('substations', substation['id']))
+
+    def add_corridor(self, corridor):
+        pair = substation_pair(corridor['from_substation'], corridor['to_substation'])
+        self.substation_corridors[pair] = corridor['id']
+        self.add_groups(corridor, ('corridors', corridor['id']))
+
+    def indexed(self, items, add):
+        '''yields items after adding each one with add'''
+        for item in items:
+            add(item)
+            yield item
+
+    def index_streams(self, connectivity):
+        '''replaces the substations and corridors of a connectivity built by
+        connectivity_comp.build_connectivity with streams that add them to
+        the index as they are written'''
+        connectivity['substations'] = json_stream.StreamedList(self.indexed(connectivity['substations'], self.add_substation))
+        connectivity['corridors'] = json_stream.StreamedList(self.indexed(connectivity['corridors'], self.add_corridor))
+
+    @classmethod
+    def from_connectivity(cls, connectivity):
+        '''the index of a connectivity built by build_connectivity, its
+        substations and corridors are consumed'''
+        index = cls(connectivity.get('case'))
+        for substation in connectivity['substations']:
+            index.add_substation(substation)
+        for corridor in connectivity['corridors']:
+            index.add_corridor(corridor)
+        return index
+
+    @classmethod
+    def from_file(cls, conn_file):
+        '''the index of a connectivity file, read one substation and corridor
+        at a time'''
+        with open(conn_file) as infile:
+            index = cls(json_stream.read_value(infile, 'case'))
+        for key, add in [('substations', index.add_substation), ('corridors', index.add_corridor)]:
+            with open(conn_file) as infile:
+                for item in json_stream.iter_items(infile, key):
+                    add(item)
+        return index
+
+    def substation(self, bus_id):
+        '''the id of the substation of a bus, None for an unknown bus'''
+        return self.bus_substations.get(bus_id)
+
+    def group(self, component_field, component_id):
+        '''the (group list, group id) of a component, e.g. group('branches',
+        12), None when the component is not in a group'''
+        return self.component_groups.get((component_field, component_id))
+
+    def location(self, group_field, group_id):
+        '''('substations', id) or ('corridors', id) of a group, None for an
+        unknown group'''
+        return self.group_locations.get((group_field, group_id))
+
+    def corridor(self, substation_id, other_substation_id):
+        '''the id of the corridor between two substations (in either order),
+        None when they are not connected'''
+        return self.substation_corridors.get(substation_pair(substation_id, other_substation_id))
+
+    def save(self, file_name):
+        write_pickle(file_name, {'version': index_format_version, 'index': self.__dict__})
+
+    @classmethod
+    def load(cls, file_name):
+        '''an index saved by save, raises ValueError when it was saved by
+        another version'''
+        with open(file_name, 'rb') as infile:
+            saved = pickle.load(infile)
+        if not isinstance(saved, dict) or saved.get('version') != index_format_version:
+            raise ValueError('connectivity index {} was saved by another version'.format(file_name))
+        index = cls()
+        index.__dict__.update(saved['index'])
+        return index
+
+
+def substation_pair(substation_id, other_substation_id):
+    return (min(substation_id, other_substation_id), max(substation_id, other_substation_id))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+'''warnings and notes about the components of a case, counted by category.
+only a sample of each category is printed so that large cases do not flood
+stdout, all of them can be written to a .json or .csv sidecar file.'''
+
+import csv, json
+
+# the number of messages of each category that are printed
+default_sample_size = 10
+
+
+class Diagnostics(object):
+    '''collects the messages of a run.  messages are format strings with
+    their arguments, they are only formatted when printed or kept.  with
+    quiet no messages are printed, only the counts in print_summary.  with
+    keep_all every message is kept for write.'''
+
+    def __init__(self, sample_size=default_sample_size, quiet=False, keep_all=False):
+        self.sample_size = sample_size
+        self.quiet = quiet
+        self.keep_all = keep_all
+        self.counts = {}
+        self.levels = {}
+        self.messages = []
+
+    def add(self, level, category, message, *args):
+        count = self.counts.get(category, 0) + 1
+        self.counts[category] = count
+        if count == 1:
+            self.levels[category] = level
+        if count <= self.sample_size and not self.quiet:
+            if level == 'warning':
+                print('WARNING: ' + message.format(*args))
+            else:
+                print(message.format(*args))
+        if self.keep_all:
+            self.messages.append((level, category, message.format(*args)))
+
+    def copy(self):
+        '''a Diagnostics with the counts and messages so far, which then
+        collects messages separately'''
+        other = Diagnostics(self.sample_size, self.quiet, self.keep_all)
+        other.counts = dict(self.counts)
+        other.levels = dict(self.levels)
+        other.messages = list(self.messages)
+        return other
+
+    def warning(self, category, message, *args):
+        self.add('warning', category, message, *args)
+
+    def note(self, category, message, *args):
+        self.add('note', category, message, *args)
+
+    def summary_lines(self):
+        '''one line per category with messages that were not printed'''
+        lines = []
+        for category in sorted(self.counts):
+            count = self.counts[category]
+            shown = 0 if self.quiet else min(count, self.sample_size)
+            if count > shown:
+                prefix = 'WARNING: ' if self.levels[category] == 'warning' else ''
+                lines.append('{}{} {} messages ({} not shown)'.format(prefix, count, category, count - shown))
+        return lines
+
+    def print_summary(self):
+        for line in self.summary_lines():
+            print(line)
+
+    def write(self, file_name):
+        '''writes the counts and kept messages to a .json or .csv file'''
+        if file_name.lower().endswith('.json'):
+            with open(file_name, 'w') as outfile:
+                json.dump({
+                    'counts': self.counts,
+                    'messages': [{'level': level, 'category': category, 'message': message}
+                        for level, category, message in self.messages]
+                }, outfile, sort_keys=True, indent=2, separators=(',', ': '))
+        elif file_name.lower().endswith('.csv'):
+            with open(file_name, 'w', newline='') as outfile:
+                writer = csv.writer(outfile)
+                writer.writerow(['level', 'category', 'message'])
+                writer.writerows(self.messages)
+        else:
+            raise ValueError("Invalid file extension")
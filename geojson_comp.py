@@ -1,44 +1,136 @@
 #!/usr/bin/env python3
 
-import json
+import json, os, sys
 from argparse import ArgumentParser
 
+import json_stream, output_manifest
 
-def create_geojson(conn_file, output_geojson):
-    with open(conn_file) as f:
-        conn_data = json.load(f)
 
-    crs = {"properties": {"name": "urn:ogc:def:crs:OGC:1.3:CRS84"}, "type": "name"}
+crs = {"properties": {"name": "urn:ogc:def:crs:OGC:1.3:CRS84"}, "type": "name"}
+
+slim_substation_properties = ['id', 'name', 'type']
+slim_corridor_properties = ['id', 'name', 'type', 'from_substation', 'to_substation']
+
+# RFC 8142 record separator
+record_separator = '\x1e'
+
 
-    substations = {'type': 'FeatureCollection', 'features': [], 'crs': crs}
-    corridors = {'type': 'FeatureCollection', 'features': [], 'crs': crs}
+def slim_properties(item, keys):
+    return {key: item[key] for key in keys if key in item}
 
-    sub_coordinates = {sub['id']: [sub['longitude'], sub['latitude']] 
-                       for sub in conn_data['substations']}
 
-    for sub in conn_data['substations']:
+def iter_connectivity_items(conn_file, key):
+    '''reads the substations or corridors of a connectivity file one at a time'''
+    with open(conn_file) as f:
+        for item in json_stream.iter_items(f, key):
+            yield item
+
+
+def substation_features(conn_file, sub_coordinates, slim=False):
+    for sub in iter_connectivity_items(conn_file, 'substations'):
         feature = {'type': 'Feature', 
                    'geometry': {'type': 'Point', 
                                 'coordinates': sub_coordinates[sub['id']]},
-                   'properties': sub}
-        substations['features'].append(feature)
+                   'properties': slim_properties(sub, slim_substation_properties) if slim else sub}
+        yield feature
+
 
-    for corridor in conn_data['corridors']:
+def corridor_features(conn_file, sub_coordinates, slim=False):
+    for corridor in iter_connectivity_items(conn_file, 'corridors'):
         feature = {'type': 'Feature', 
                    'geometry': {'type': 'LineString', 
                                 'coordinates': [sub_coordinates[corridor['from_substation']],
                                                 sub_coordinates[corridor['to_substation']]]},
-                   'properties': corridor}
-        corridors['features'].append(feature)
+                   'properties': slim_properties(corridor, slim_corridor_properties) if slim else corridor}
+        yield feature
+
+
+def load_sub_coordinates(conn_file):
+    return {sub['id']: [sub['longitude'], sub['latitude']] 
+            for sub in iter_connectivity_items(conn_file, 'substations')}
+
+
+def create_geojson(conn_file, output_geojson, slim=False):
+    # only the substation coordinates are held in memory, the substations and
+    # corridors are re-read from conn_file as their features are written
+    sub_coordinates = load_sub_coordinates(conn_file)
+
+    substations = {'type': 'FeatureCollection', 'crs': crs,
+                   'features': json_stream.StreamedList(substation_features(conn_file, sub_coordinates, slim))}
+    corridors = {'type': 'FeatureCollection', 'crs': crs,
+                 'features': json_stream.StreamedList(corridor_features(conn_file, sub_coordinates, slim))}
 
     connectivity_geojson = {'substations': substations, 'corridors': corridors}
     with open(output_geojson, 'w') as f:
-        f.write(json.dumps(connectivity_geojson, sort_keys=True))
+        json_stream.dump(connectivity_geojson, f, sort_keys=True)
 
 
-if __name__ == '__main__':
+def create_geojson_seq(conn_file, output_geojson, rfc8142=True, slim=False):
+    '''writes one feature per line, substations and corridors go to separate
+    files next to output_geojson (out.json -> out_substations.geojsons and
+    out_corridors.geojsons).  with rfc8142 each line starts with a record
+    separator (GeoJSONSeq), otherwise the files are plain NDJSON (.geojsonl).
+    returns the names of the files written.
+    '''
+    prefix = record_separator if rfc8142 else ''
+
+    sub_coordinates = load_sub_coordinates(conn_file)
+
+    substations_file, corridors_file = seq_file_names(output_geojson, rfc8142)
+    outputs = [
+        (substations_file, substation_features(conn_file, sub_coordinates, slim)),
+        (corridors_file, corridor_features(conn_file, sub_coordinates, slim))
+    ]
+    for file_name, features in outputs:
+        with open(file_name, 'w') as f:
+            for feature in features:
+                f.write(prefix + json.dumps(feature, sort_keys=True) + '\n')
+
+    return [file_name for file_name, features in outputs]
+
+
+def seq_file_names(output_geojson, rfc8142=True):
+    '''the substation and corridor files of create_geojson_seq'''
+    root = os.path.splitext(output_geojson)[0]
+    ext = '.geojsons' if rfc8142 else '.geojsonl'
+    return [root + '_substations' + ext, root + '_corridors' + ext]
+
+
+def main(args):
+    if args.format == 'collection':
+        outputs = [args.output_geojson]
+    else:
+        outputs = seq_file_names(args.output_geojson, args.format == 'seq')
+
+    # outputs made from the same connectivity file and options are kept
+    manifest = output_manifest.build_manifest({'connectivity': args.connectivity},
+        {'format': args.format, 'slim': args.slim},
+        output_manifest.source_version([sys.modules[__name__], json_stream]))
+    if not args.force and output_manifest.up_to_date(outputs, manifest):
+        print('outputs {} are up to date, skipping (--force to rebuild)'.format(', '.join(outputs)))
+        return
+
+    if args.format == 'collection':
+        create_geojson(args.connectivity, args.output_geojson, args.slim)
+    else:
+        create_geojson_seq(args.connectivity, args.output_geojson, args.format == 'seq', args.slim)
+
+    for output in outputs:
+        output_manifest.write_manifest(output, manifest)
+
+
+def build_cli_parser():
     parser = ArgumentParser()
     parser.add_argument('connectivity', help='Connectivity json file')
-    parser.add_argument('output_geojson', help='Output combined geojson file')
-    args = parser.parse_args()
-    create_geojson(args.connectivity, args.output_geojson)
+    parser.add_argument('output_geojson', help='Output combined geojson file, or the base name of the per layer files in seq/ndjson format')
+    parser.add_argument('-f', '--format', choices=['collection', 'seq', 'ndjson'], default='collection',
+                        help='collection: one document with both FeatureCollections, seq: RFC 8142 GeoJSON text sequences, ndjson: newline delimited features')
+    parser.add_argument('-s', '--slim', action='store_true', default=False,
+                        help='only include identifying properties instead of the entire substation/corridor')
+    parser.add_argument('--force', action='store_true', default=False,
+                        help='rebuild the outputs even when their inputs have not changed since they were written')
+    return parser
+
+
+if __name__ == '__main__':
+    main(build_cli_parser().parse_args())
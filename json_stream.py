@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+'''incremental json reading and writing, large lists are read and written
+one item at a time while the text matches json.load / json.dump'''
+
+import json, re
+
+
+class StreamedList(object):
+    '''a json array whose items are produced by an iterable, items are
+    encoded and written as soon as they are produced, the items themselves
+    are encoded as plain json values'''
+
+    def __init__(self, items):
+        self.items = items
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def dump(obj, outfile, indent=None, separators=None, sort_keys=True):
+    '''writes obj to outfile with the same formatting as json.dump, dicts
+    that contain StreamedList values are expanded incrementally'''
+    if separators is None:
+        separators = (',', ': ') if indent is not None else (', ', ': ')
+    encoder = json.JSONEncoder(indent=indent, separators=separators, sort_keys=sort_keys)
+    _write(obj, outfile, encoder, 0)
+
+
+class _Plain(object):
+    __slots__ = ['value']
+    def __init__(self, value):
+        self.value = value
+
+
+def _is_streamed(obj):
+    if isinstance(obj, StreamedList):
+        return True
+    if isinstance(obj, dict):
+        return any(_is_streamed(value) for value in obj.values())
+    return False
+
+
+def _newline(encoder, level):
+    if encoder.indent is None:
+        return ''
+    return '\n' + ' ' * (encoder.indent * level)
+
+
+def _write(obj, outfile, encoder, level):
+    if isinstance(obj, StreamedList):
+        _write_items(outfile, encoder, level, '[', ']',
+            ((None, _Plain(item)) for item in obj))
+    elif isinstance(obj, dict) and _is_streamed(obj):
+        keys = sorted(obj.keys()) if encoder.sort_keys else obj.keys()
+        _write_items(outfile, encoder, level, '{', '}',
+            ((key, obj[key]) for key in keys))
+    else:
+        if isinstance(obj, _Plain):
+            obj = obj.value
+        text = encoder.encode(obj)
+        if encoder.indent is not None:
+            text = text.replace('\n', _newline(encoder, level))
+        outfile.write(text)
+
+
+def _write_items(outfile, encoder, level, open_char, close_char, items):
+    item_separator, key_separator = encoder.item_separator, encoder.key_separator
+
+    outfile.write(open_char)
+    empty = True
+    for key, value in items:
+        if not empty:
+            outfile.write(item_separator)
+        outfile.write(_newline(encoder, level+1))
+        if key is not None:
+            outfile.write(json.dumps(key) + key_separator)
+        _write(value, outfile, encoder, level+1)
+        empty = False
+
+    if not empty:
+        outfile.write(_newline(encoder, level))
+    outfile.write(close_char)
+
+
+_whitespace = re.compile(r'[ \t\n\r]*')
+
+class _BufferedReader(object):
+    def __init__(self, infile, chunk_size):
+        self.infile = infile
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self, size=None):
+        if self.pos > self.chunk_size:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        chunk = self.infile.read(size or self.chunk_size)
+        if len(chunk) == 0:
+            self.eof = True
+        self.buffer += chunk
+
+    def peek(self):
+        '''returns the next non-whitespace character, '' at the end of input'''
+        while True:
+            self.pos = _whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos+1]
+            self.fill()
+
+    def expect(self, chars):
+        char = self.peek()
+        if char == '' or char not in chars:
+            raise ValueError('expected one of "{}" at offset {}, found "{}"'.format(chars, self.pos, char))
+        self.pos += 1
+        return char
+
+    def decode(self):
+        '''decodes the next json value, reading more input as needed'''
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number cut off by the end of the buffer may continue in
+                # the next chunk, in valid json nothing else follows a value
+                # with one of these characters
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in '0123456789.eE+-'):
+                    self.pos = end
+                    return value
+            except ValueError: # json.JSONDecodeError from python 3.5
+                if self.eof:
+                    raise
+            self.fill(max(self.chunk_size, len(self.buffer) - self.pos))
+
+
+def _iter_array(reader):
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        yield reader.decode()
+        if reader.expect(',]') == ']':
+            return
+
+
+def _find_key(reader, key):
+    '''moves the reader to the value stored under key in the top level
+    json object, skipping the values before it, returns False when the
+    object has no such key'''
+    reader.expect('{')
+    if reader.peek() == '}':
+        return False
+    while True:
+        item_key = reader.decode()
+        reader.expect(':')
+        if item_key == key:
+            return True
+        elif reader.peek() == '[':
+            for item in _iter_array(reader):
+                pass
+        else:
+            reader.decode()
+        if reader.expect(',}') == '}':
+            return False
+
+
+def iter_items(infile, key, chunk_size=1<<16):
+    '''yields the items of the array stored under key in the top level json
+    object of infile, without loading the rest of the document'''
+    reader = _BufferedReader(infile, chunk_size)
+    if _find_key(reader, key):
+        for item in _iter_array(reader):
+            yield item
+
+
+def read_value(infile, key, default=None, chunk_size=1<<16):
+    '''the value stored under key in the top level json object of infile,
+    default when there is no such key, the arrays before it are read one
+    item at a time'''
+    reader = _BufferedReader(infile, chunk_size)
+    if _find_key(reader, key):
+        return reader.decode()
+    return default
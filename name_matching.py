@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+'''similarity of bus names, edit distance and common prefix measures and
+candidate generation, only pairs of names that can pass the similarity test
+are produced so that the expensive comparison is not run on every pair'''
+
+import bisect, itertools, math
+
+import numpy
+
+
+def edit_distance(s1, s2, max_distance=None):
+    '''levenshtein distance between s1 and s2, computed with two rows of the
+    table.  with max_distance, any distance above it is reported as
+    max_distance+1 and the computation stops as soon as it is exceeded.'''
+    if max_distance != None and abs(len(s1) - len(s2)) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(s2)+1))
+    for i, c1 in enumerate(s1, 1):
+        current = [i]
+        for j, c2 in enumerate(s2, 1):
+            current.append(min(previous[j] + 1, current[j-1] + 1, previous[j-1] + (c1 != c2)))
+        if max_distance != None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+
+    if max_distance != None and previous[-1] > max_distance:
+        return max_distance + 1
+    return previous[-1]
+
+
+def encode_names(names):
+    '''names as an (n, longest name) array of character codes padded with
+    zeros, and an array of their lengths'''
+    if len(names) == 0:
+        return numpy.zeros((0, 0), dtype=numpy.uint32), numpy.zeros(0, dtype=numpy.intp)
+    array = numpy.array(names, dtype=str)
+    codes = array.view(numpy.uint32).reshape(len(names), array.dtype.itemsize//4)
+    return codes, numpy.char.str_len(array)
+
+
+def edit_distances(name, others, max_distance=None):
+    '''edit_distance from name to each of others, as an array.  the table
+    is filled one character of name at a time for all of others at once,
+    one row per other name.'''
+    codes, lengths = encode_names(others)
+    return encoded_edit_distances(name, codes, lengths, max_distance)
+
+
+def encoded_edit_distances(name, codes, lengths, max_distance=None):
+    '''edit_distances to names given by encode_names, for reusing the
+    encoding of names that are compared many times.  with max_distance,
+    names are dropped from the table once they exceed it.'''
+    count, width = codes.shape
+    columns = numpy.arange(width+1, dtype=numpy.int32)
+
+    distances = numpy.full(count, max_distance + 1 if max_distance != None else 0, dtype=numpy.int32)
+    remaining = numpy.arange(count)
+    if max_distance != None:
+        remaining = numpy.flatnonzero(numpy.abs(lengths - len(name)) <= max_distance)
+        codes = codes[remaining]
+
+    row = numpy.tile(columns, (len(remaining), 1))
+    step = numpy.empty_like(row)
+    for i, char in enumerate(name, 1):
+        if len(remaining) == 0:
+            return distances
+
+        # substitution and deletion from the previous row
+        step[:, 0] = i
+        numpy.minimum(row[:, :-1] + (codes != ord(char)), row[:, 1:] + 1, out=step[:, 1:])
+        # insertions, row[j] = min over k <= j of step[k] + j - k
+        step -= columns
+        numpy.minimum.accumulate(step, axis=1, out=row)
+        row += columns
+
+        if max_distance != None:
+            within = row.min(axis=1) <= max_distance
+            if not within.all():
+                remaining = remaining[within]
+                codes = codes[within]
+                row = row[within]
+                step = numpy.empty_like(row)
+
+    distances[remaining] = row[numpy.arange(len(remaining)), lengths[remaining]]
+    if max_distance != None:
+        numpy.minimum(distances, max_distance + 1, out=distances)
+    return distances
+
+
+def prefix_size(s1, s2):
+    '''the length of the common prefix of s1 and s2 as a fraction of the
+    shorter one'''
+    length = min(len(s1), len(s2))
+    prefix_length = 0
+    for i in range(length):
+        if s1[i] == s2[i]:
+            prefix_length = i+1
+        else:
+            break
+
+    return prefix_length/float(length)
+
+
+class EditDistanceIndex(object):
+    '''index of a list of names for finding the names that may be within
+    max_distance edits of a given name.
+
+    every name is split into max_distance+1 segments and each segment is
+    indexed by the name length, its position and its text.  k edits change
+    at most k of the k+1 segments, so a name within k edits contains one of
+    the segments unchanged.  taking the first unchanged segment, the edits
+    before it (at least one per earlier segment) and after it bound how far
+    it can be shifted, so only a few substrings of a name are looked up.
+    names too short to have k+1 non-empty segments are compared by length
+    alone.
+
+    the names found this way are then filtered by their q-grams, each edit
+    removes at most q of the q-grams a name has in common with another.
+    '''
+
+    def __init__(self, names, max_distance, q=2, index=True):
+        '''index=False only prepares the names, see add'''
+        self.names = list(names)
+        self.max_distance = max_distance
+        self.q = q
+        self.gram_sets = [self.grams(name) for name in self.names]
+        self.gram_counts = [len(grams) for grams in self.gram_sets]
+
+        self.segments = {}
+        self.short_names = []
+        if index:
+            for name_id in range(len(self.names)):
+                self.add(name_id)
+
+    def grams(self, name):
+        '''the set of padded q-grams of name, repeated q-grams are numbered
+        by a trailing character'''
+        padded = '\x00'*(self.q-1) + name + '\x01'*(self.q-1)
+        occurrences = {}
+        grams = set()
+        for i in range(len(padded) - self.q + 1):
+            gram = padded[i:i+self.q]
+            occurrence = occurrences.get(gram, 0)
+            grams.add(gram + chr(occurrence))
+            occurrences[gram] = occurrence + 1
+        return frozenset(grams)
+
+    def partition(self, length):
+        '''(start, end) of the segments of a name with the given length, the
+        last segments are one character longer when it does not divide
+        evenly'''
+        count = self.max_distance + 1
+        size, longer = divmod(length, count)
+        bounds = []
+        start = 0
+        for segment in range(count):
+            end = start + size + (1 if segment >= count - longer else 0)
+            bounds.append((start, end))
+            start = end
+        return bounds
+
+    def add(self, name_id):
+        '''indexes the name at position name_id of names'''
+        name = self.names[name_id]
+        if len(name) <= self.max_distance:
+            self.short_names.append(name_id)
+            return
+        for segment, (start, end) in enumerate(self.partition(len(name))):
+            self.segments.setdefault((len(name), segment, name[start:end]), []).append(name_id)
+
+    def candidates(self, name):
+        '''the ids (positions in names) of the indexed names that may be
+        within max_distance edits of name'''
+        max_distance = self.max_distance
+        segments = self.segments
+        name_ids = set()
+        for length in range(max(len(name) - max_distance, max_distance + 1), len(name) + max_distance + 1):
+            delta = len(name) - length
+            for segment, (start, end) in enumerate(self.partition(length)):
+                size = end - start
+                # shifts of the segment allowed by the edits on either side
+                remaining = max_distance - segment
+                low = max(-((max_distance - delta)//2), delta - remaining)
+                high = min((max_distance + delta)//2, delta + remaining)
+                for position in range(max(0, start + low), min(len(name) - size, start + high) + 1):
+                    name_ids.update(segments.get((length, segment, name[position:position+size]), ()))
+
+        names = self.names
+        for name_id in self.short_names:
+            if abs(len(names[name_id]) - len(name)) <= max_distance:
+                name_ids.add(name_id)
+
+        grams = self.grams(name)
+        gram_sets = self.gram_sets
+        gram_counts = self.gram_counts
+        gram_count = len(grams)
+        max_gram_edits = max_distance*self.q
+        candidate_ids = []
+        for name_id in name_ids:
+            # the bound of the name with more q-grams applies
+            common = max(gram_count, gram_counts[name_id]) - max_gram_edits
+            if common <= 0 or len(grams & gram_sets[name_id]) >= common:
+                candidate_ids.append(name_id)
+        candidate_ids.sort()
+        return candidate_ids
+
+
+def edit_distance_pairs(names, max_distance, q=2):
+    '''yields each pair (i, j), i < j, of positions in names that may be
+    within max_distance edits of each other.  the names are indexed one at a
+    time, after looking up the earlier ones, so each pair is found once.'''
+    index = EditDistanceIndex(names, max_distance, q, index=False)
+    for name_id, name in enumerate(index.names):
+        for other_id in index.candidates(name):
+            yield other_id, name_id
+        index.add(name_id)
+
+
+def similar_name_pairs(names, max_distance, q=2):
+    '''yields (i, j, distance), i < j, for each pair of positions in names
+    that are within max_distance edits, the candidates of each name are
+    scored together with edit_distances'''
+    candidate_pairs = edit_distance_pairs(names, max_distance, q)
+    for name_id, pairs in itertools.groupby(candidate_pairs, key=lambda pair: pair[1]):
+        other_ids = [pair[0] for pair in pairs]
+        distances = edit_distances(names[name_id], [names[other_id] for other_id in other_ids], max_distance)
+        for other_id, distance in zip(other_ids, distances.tolist()):
+            if distance <= max_distance:
+                yield other_id, name_id, distance
+
+
+def prefix_pairs(names, min_ratio):
+    '''yields each pair (i, j), i < j, of positions in names where the common
+    prefix covers at least min_ratio of the shorter name.  names are sorted
+    once, the names starting with a given prefix are then a contiguous
+    block.  empty names are ignored.'''
+    order = sorted(range(len(names)), key=lambda name_id: names[name_id])
+    sorted_names = [names[name_id] for name_id in order]
+
+    for name_id, name in enumerate(names):
+        if len(name) == 0:
+            continue
+
+        # the shortest prefix that reaches min_ratio of this name
+        length = len(name)
+        prefix_length = int(math.ceil(min_ratio*length))
+        while prefix_length > 0 and (prefix_length-1)/float(length) >= min_ratio:
+            prefix_length -= 1
+        while prefix_length < length and prefix_length/float(length) < min_ratio:
+            prefix_length += 1
+        prefix = name[:prefix_length]
+
+        start = bisect.bisect_left(sorted_names, prefix)
+        for position in range(start, len(sorted_names)):
+            other = sorted_names[position]
+            if not other.startswith(prefix):
+                break
+            other_id = order[position]
+            # each pair is found from its shorter name
+            if len(other) > length or (len(other) == length and other_id > name_id):
+                yield min(name_id, other_id), max(name_id, other_id)
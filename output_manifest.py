@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+'''manifests of the inputs an output was made from, stored next to the
+output, so that a run whose inputs have not changed can be skipped'''
+
+import hashlib, json, os, sys
+
+from case_cache import file_hash
+
+manifest_extension = '.manifest.json'
+
+
+def manifest_path(output):
+    return output + manifest_extension
+
+
+def source_version(modules):
+    '''a hash of the source files of the given modules, standing in for the
+    version of the tool made of them.  modules without a source file (e.g.
+    in a frozen executable) are versioned by the executable.'''
+    digest = hashlib.sha256()
+    for module in modules:
+        source_file = getattr(module, '__file__', None)
+        if source_file == None or not os.path.isfile(source_file):
+            source_file = sys.executable
+        digest.update(file_hash(source_file).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build_manifest(inputs, options, version):
+    '''the manifest of a run, inputs maps an input name to its file (None when
+    not given), options are the settings that change the output (json
+    values) and version identifies the tool'''
+    manifest = {
+        'version': version,
+        'options': options,
+        'inputs': { name: file_hash(file_name) if file_name != None else None
+            for name, file_name in inputs.items() }
+    }
+    # as it reads back from a manifest file, e.g. tuples become lists
+    return json.loads(json.dumps(manifest, sort_keys=True))
+
+
+def read_manifest(output):
+    '''the manifest stored with output, or None'''
+    try:
+        with open(manifest_path(output), 'r') as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(output, manifest):
+    '''stores manifest with output, together with the hash of output so that
+    a changed or replaced output is not taken as up to date'''
+    output_manifest = dict(manifest)
+    output_manifest['output'] = file_hash(output)
+    with open(manifest_path(output), 'w') as outfile:
+        json.dump(output_manifest, outfile, sort_keys=True, indent=2, separators=(',', ': '))
+
+
+def up_to_date(outputs, manifest):
+    '''True when every output exists and was made from the inputs, options
+    and version of manifest'''
+    for output in outputs:
+        if not os.path.isfile(output):
+            return False
+        output_manifest = read_manifest(output)
+        if output_manifest == None:
+            return False
+        output_hash = output_manifest.pop('output', None)
+        if output_manifest != manifest or output_hash != file_hash(output):
+            return False
+    return True
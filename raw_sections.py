@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+'''section index for pss/e raw files, a single scan finds the byte range of
+every data section so that sections can be read on demand'''
+
+import mmap, re, zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# the section order of a version 33 raw file, used when the section
+# terminators do not name the next section
+v33_sections = [
+    'BUS', 'LOAD', 'FIXED SHUNT', 'GENERATOR', 'BRANCH', 'TRANSFORMER',
+    'AREA', 'TWO-TERMINAL DC', 'VOLTAGE SOURCE CONVERTER',
+    'IMPEDANCE CORRECTION', 'MULTI-TERMINAL DC', 'MULTI-SECTION LINE',
+    'ZONE', 'INTER-AREA TRANSFER', 'OWNER', 'FACTS CONTROL DEVICE',
+    'SWITCHED SHUNT', 'GNE DEVICE', 'INDUCTION MACHINE'
+]
+
+# lines ending a section, e.g. "0 / END OF BUS DATA, BEGIN LOAD DATA", or
+# ending the case, "Q"
+_terminator = re.compile(rb'^[ \t]*(?:0[ \t]*(?:/([^\r\n]*))?|(Q)[^\r\n]*)\r?$', re.M)
+_begin_section = re.compile(r'BEGIN\s+(.*?)\s+DATA')
+
+header_lines = 3
+
+
+class RawFile(object):
+    '''memory maps a raw file and indexes its sections, use as a context
+    manager or call close() when done'''
+
+    def __init__(self, file_name, encoding='utf-8'):
+        self.file_name = file_name
+        self.encoding = encoding
+        self.file = open(file_name, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # empty file
+            self.data = b''
+        self._sections = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    @property
+    def sections(self):
+        '''the section index, built on first use so that reading a known
+        byte range does not scan the whole file'''
+        if self._sections == None:
+            self._sections = self._index()
+        return self._sections
+
+    def _index(self):
+        '''returns an ordered mapping of section name to (start, end) byte
+        offsets, end is the start of the section's terminator line'''
+        data = self.data
+
+        start = 0
+        for i in range(header_lines):
+            start = data.find(b'\n', start)
+            if start < 0:
+                return OrderedDict()
+            start += 1
+
+        sections = OrderedDict()
+        name = v33_sections[0]
+        for match in _terminator.finditer(data, start):
+            sections[name] = (start, match.start())
+            if match.group(2) != None:
+                break
+
+            start = match.end() + 1
+            next_name = None
+            if match.group(1) != None:
+                begin = _begin_section.search(match.group(1).decode(self.encoding, 'replace').upper())
+                if begin != None:
+                    next_name = begin.group(1)
+            if next_name == None:
+                position = v33_sections.index(name)+1 if name in v33_sections else len(v33_sections)
+                if position >= len(v33_sections):
+                    break
+                next_name = v33_sections[position]
+            name = next_name
+
+        return sections
+
+    def section_names(self):
+        return list(self.sections.keys())
+
+    def section_bytes(self, name):
+        if name not in self.sections:
+            return b''
+        start, end = self.sections[name]
+        return self.data[start:end]
+
+    def iter_lines(self, name, block_size=1<<20):
+        '''yields the non-empty lines of a section, stripped'''
+        if name not in self.sections:
+            return iter(())
+        start, end = self.sections[name]
+        return self.iter_range_lines(start, end, block_size)
+
+    def iter_range_lines(self, start, end, block_size=1<<20):
+        '''yields the non-empty lines between two byte offsets, stripped.  the
+        range is decoded in blocks of about block_size bytes.'''
+        data = self.data
+        while start < end:
+            block_end = end
+            if start + block_size < end:
+                block_end = data.rfind(b'\n', start, start + block_size)
+                if block_end < 0:
+                    block_end = data.find(b'\n', start + block_size, end)
+                    if block_end < 0:
+                        block_end = end
+            for line in data[start:block_end].decode(self.encoding).split('\n'):
+                line = line.strip()
+                if len(line) > 0:
+                    yield line
+            start = block_end + 1
+
+    def section_chunks(self, name, chunk_bytes):
+        '''splits a section into (start, end) byte ranges of about chunk_bytes
+        that begin and end on line boundaries, sections with multi-line
+        records are kept in one piece'''
+        if name not in self.sections:
+            return []
+        start, end = self.sections[name]
+        if name in multi_line_sections:
+            return [(start, end)]
+
+        chunks = []
+        while start + chunk_bytes < end:
+            chunk_end = self.data.find(b'\n', start + chunk_bytes, end)
+            if chunk_end < 0:
+                break
+            chunks.append((start, chunk_end))
+            start = chunk_end + 1
+        chunks.append((start, end))
+        return chunks
+
+    def content_chunks(self, name, chunk_lines=1024):
+        '''splits a section into (start, end) byte ranges that end after the
+        lines whose checksum is a multiple of chunk_lines, about chunk_lines
+        lines each.  the boundaries depend only on the lines next to them,
+        so an edit to a section changes the chunk around it and leaves the
+        others as they were.  sections with multi-line records are kept in
+        one piece.'''
+        if name not in self.sections:
+            return []
+        start, end = self.sections[name]
+        if name in multi_line_sections:
+            return [(start, end)]
+
+        data = self.data
+        chunks = []
+        chunk_start = start
+        position = start
+        while position < end:
+            line_end = data.find(b'\n', position, end)
+            if line_end < 0:
+                break
+            if zlib.crc32(data[position:line_end]) % chunk_lines == 0:
+                chunks.append((chunk_start, line_end))
+                chunk_start = line_end + 1
+            position = line_end + 1
+        if chunk_start < end or len(chunks) == 0:
+            chunks.append((chunk_start, end))
+        return chunks
+
+    def iter_records(self, name):
+        '''yields each record of a section as a list of lines, records of
+        the transformer and dc line sections span several lines'''
+        lines = self.iter_lines(name)
+        for line in lines:
+            extra_lines = record_extra_lines(name, line)
+            record = [line]
+            for i in range(extra_lines):
+                record.append(next(lines))
+            yield record
+
+    def iter_fields(self, name):
+        '''yields the comma separated fields of the first line of each record'''
+        if name not in multi_line_sections:
+            for line in self.iter_lines(name):
+                yield line.split(',')
+        else:
+            for record in self.iter_records(name):
+                yield record[0].split(',')
+
+
+multi_line_sections = ['TRANSFORMER', 'TWO-TERMINAL DC', 'VOLTAGE SOURCE CONVERTER', 'MULTI-TERMINAL DC']
+
+
+def read_fields_chunk(file_name, name, start, end):
+    '''the comma separated fields of the first line of each record in a
+    byte range of a section, see parse_parallel'''
+    with RawFile(file_name) as raw_file:
+        lines = raw_file.iter_range_lines(start, end)
+        if name not in multi_line_sections:
+            return [line.split(',') for line in lines]
+        fields = []
+        for line in lines:
+            fields.append(line.split(','))
+            for i in range(record_extra_lines(name, line)):
+                next(lines)
+        return fields
+
+
+def parse_parallel(file_name, parse_chunk, names, processes=None, chunk_bytes=1<<24, chunks=None):
+    '''parses the named sections of a raw file in a pool of processes.  large
+    sections are split into chunks of about chunk_bytes, or into the given
+    chunks, a mapping of section name to (start, end) byte ranges, and
+    parse_chunk(file_name, name, start, end) is called once per chunk, it
+    must be a module level function and return a list.
+
+    returns a mapping of section name to the list of chunk results, in file
+    order, sections that are not in the file map to an empty list.
+    '''
+    if chunks != None:
+        section_chunks = [(name, chunks.get(name, [])) for name in names]
+    else:
+        with RawFile(file_name) as raw_file:
+            section_chunks = [(name, raw_file.section_chunks(name, chunk_bytes)) for name in names]
+
+    # submit the largest chunks first so that they do not end up last
+    jobs = [(end - start, name, index, start, end)
+        for name, chunks in section_chunks for index, (start, end) in enumerate(chunks)]
+    jobs.sort(reverse=True)
+
+    results = OrderedDict((name, [None]*len(chunks)) for name, chunks in section_chunks)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [(name, index, executor.submit(parse_chunk, file_name, name, start, end))
+            for size, name, index, start, end in jobs]
+        for name, index, future in futures:
+            results[name][index] = future.result()
+
+    return results
+
+
+def record_extra_lines(name, line):
+    '''the number of lines following the first line of a record'''
+    if name == 'TRANSFORMER':
+        fields = line.split(',')
+        return 3 if int(fields[2]) == 0 else 4
+    if name in ['TWO-TERMINAL DC', 'VOLTAGE SOURCE CONVERTER']:
+        return 2
+    if name == 'MULTI-TERMINAL DC':
+        fields = line.split(',')
+        return int(fields[1]) + int(fields[2]) + int(fields[3])
+    return 0
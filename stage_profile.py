@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+'''wall time, cpu time, memory and item counts of the stages of a run,
+written as a json report (connectivity_comp.py --profile)'''
+
+import contextlib, json, sys, time, tracemalloc
+
+try:
+    import resource
+except ImportError: # windows
+    resource = None
+
+
+def max_rss_mb():
+    '''the peak resident set size of the process so far in MB, None where
+    it is not available'''
+    if resource == None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on mac os, kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return max_rss/(1024.0*1024.0)
+    return max_rss/1024.0
+
+
+class StageProfiler(object):
+    '''records one entry per stage of a run, see stage.  with trace_memory
+    the peak of the python allocations of each stage is traced with
+    tracemalloc, which slows the run down.'''
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+
+    def close(self):
+        '''stops the memory tracing started by the profiler'''
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    @contextlib.contextmanager
+    def stage(self, name, **fields):
+        '''times the code in the with block as stage name.  the block can set
+        'items' (the number of things processed) and other values on the
+        yielded record, fields are added to the record as they are.'''
+        record = {'name': name, 'items': None}
+        record.update(fields)
+        if self.trace_memory:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            else:
+                # python < 3.9 only resets the peak with the traces, the
+                # blocks allocated before the stage are then not traced
+                tracemalloc.clear_traces()
+            start_traced = tracemalloc.get_traced_memory()[0]
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = time.perf_counter() - start_wall
+            record['cpu_seconds'] = time.process_time() - start_cpu
+            record['max_rss_mb'] = max_rss_mb()
+            if self.trace_memory:
+                record['traced_peak_mb'] = (tracemalloc.get_traced_memory()[1] - start_traced)/(1024.0*1024.0)
+            self.stages.append(record)
+
+    def report(self):
+        '''the stages and totals of the run so far'''
+        return {
+            'stages': self.stages,
+            'wall_seconds': time.perf_counter() - self.start_wall,
+            'cpu_seconds': time.process_time() - self.start_cpu,
+            'max_rss_mb': max_rss_mb(),
+            'python': sys.version.split()[0]
+        }
+
+    def write(self, file_name):
+        with open(file_name, 'w') as outfile:
+            json.dump(self.report(), outfile, sort_keys=True, indent=2, separators=(',', ': '))
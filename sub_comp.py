@@ -1,75 +1,34 @@
 #!/usr/bin/env python3
 
-import argparse, json
+import argparse, itertools, json, multiprocessing
+from collections import OrderedDict
+
+from clustering import DisjointSet
+from name_matching import similar_name_pairs, prefix_pairs
+from raw_sections import RawFile, parse_parallel, read_fields_chunk
 
 power_equivelence_tolerence = 1e-2
 voltage_equivelence_tolerence = 1e-1
 
+# --name-merge settings, buses are joined when their names are within
+# name_edit_distance edits (edit) or share a prefix covering name_prefix_ratio
+# of the shorter name with substation bus numbers within name_bus_delta (prefix)
+name_edit_distance = 2
+name_prefix_ratio = 0.75
+name_bus_delta = 100
+
 def main(args):
-    raw_case = parse_raw(args.raw_file)
+    raw_case = parse_raw(args.raw_file, ['buses', 'branches', 'transformers'], args.jobs)
 
     print('raw , %d, %d, %d' % (len(raw_case['buses']), len(raw_case['branches']), len(raw_case['transformers'])))
 
     bus_lookup = { int(bus[0]):bus for bus in raw_case['buses'] }
 
-    bus_sub_lookup = {}
-    for bus in raw_case['buses']:
-        bus_id = int(bus[0])
-        #print(bus_id)
-        bus_sub_lookup[bus_id] = set([bus_id])
-
-    if False:
-        ed_dist = {}
-        for i, bus_1 in enumerate(raw_case['buses']):
-            bus_1_name = bus_1[1].strip('\'').strip()
-            for j in range(i+1, len(raw_case['buses'])):
-                bus_2 = raw_case['buses'][j]
-                bus_2_name = bus_2[1].strip('\'').strip()
-                ed = edit_distance(bus_1_name, bus_2_name)
-                #print(ed)
-                if not ed in ed_dist.keys():
-                    ed_dist[ed] = 0
-                ed_dist[ed] = ed_dist[ed] + 1
-
-                if ed <= 2:
-                    bus_1_id = int(bus_1[0])
-                    bus_2_id = int(bus_2[0])
-                    bus_id_set = bus_sub_lookup[bus_1_id] | bus_sub_lookup[bus_2_id]
-
-                    for bus_id in bus_id_set:
-                        bus_sub_lookup[bus_id] = bus_id_set
-
-        for ed in sorted(ed_dist.keys()):
-            print('%d - %d' % (ed, ed_dist[ed]))
-
-
-    if False:
-        for i, bus_1 in enumerate(raw_case['buses']):
-            bus_1_name = bus_1[1].strip('\'').strip()
-            for j in range(i+1, len(raw_case['buses'])):
-                bus_2 = raw_case['buses'][j]
-                bus_2_name = bus_2[1].strip('\'').strip()
-                size_percent = prefix_size(bus_1_name, bus_2_name)
-
-                #print(size_percent)
-
-                # TODO, don't merge buses if they have a line between them
-                if size_percent >= 0.75:
-                    bus_1_id = int(bus_1[0])
-                    bus_2_id = int(bus_2[0])
-
-                    min_bus_delta = max(bus_lookup.keys()*10)
-                    for bus_a in bus_sub_lookup[bus_1_id]:
-                        for bus_b in bus_sub_lookup[bus_2_id]:
-                            min_bus_delta = min(min_bus_delta, abs(bus_a - bus_b))
-                    if min_bus_delta <= 100:
-                        print('merging: {} {} - {}'.format(bus_1_name, bus_2_name, min_bus_delta))
-                        
-                        bus_id_set = bus_sub_lookup[bus_1_id] | bus_sub_lookup[bus_2_id]
-
-                        for bus_id in bus_id_set:
-                            bus_sub_lookup[bus_id] = bus_id_set
-
+    bus_sets = DisjointSet(int(bus[0]) for bus in raw_case['buses'])
+    if args.name_merge == 'edit':
+        merge_edit_distance_names(bus_sets, raw_case['buses'])
+    elif args.name_merge == 'prefix':
+        merge_prefix_names(bus_sets, raw_case['buses'])
 
     for trans in raw_case['transformers']:
         pr_bus = int(trans[0])
@@ -77,19 +36,13 @@ def main(args):
         tr_bus = int(trans[2])
 
         if tr_bus == 0:
-            bus_id_set = bus_sub_lookup[pr_bus] | bus_sub_lookup[sn_bus]
+            bus_sets.union(pr_bus, sn_bus)
         else:
-            bus_id_set = bus_sub_lookup[pr_bus] | bus_sub_lookup[sn_bus] | bus_sub_lookup[tr_bus]
-
-        for bus_id in bus_id_set:
-            bus_sub_lookup[bus_id] = bus_id_set
+            bus_sets.union_all((pr_bus, sn_bus, tr_bus))
 
         #print(pr_bus, sn_bus, tr_bus)
 
-    substation_buses = []
-    for k,v in bus_sub_lookup.items():
-        if not v in substation_buses:
-            substation_buses.append(v)
+    substation_buses = bus_sets.groups()
 
     #for v in substation_buses:
     #    print(v)
@@ -119,162 +72,142 @@ def main(args):
         json.dump(substations, outfile, sort_keys=True, indent=2, separators=(',', ': '))
 
 
-def parse_raw(raw_file_location):
-    with open(raw_file_location, 'r') as raw_file: 
-        raw_lines = raw_file.readlines()
+def bus_name(bus):
+    return bus[1].strip('\'').strip()
+
+
+def name_buses(buses):
+    '''distinct bus names and the ids of the buses with each name'''
+    name_bus_ids = OrderedDict()
+    for bus in buses:
+        name_bus_ids.setdefault(bus_name(bus), []).append(int(bus[0]))
+    return name_bus_ids
+
+
+def merge_edit_distance_names(bus_sets, buses, max_distance=name_edit_distance):
+    '''joins buses whose names are within max_distance edits, only the
+    candidate pairs of distinct names from similar_name_pairs are scored'''
+    name_bus_ids = name_buses(buses)
+    names = list(name_bus_ids.keys())
+
+    ed_dist = {}
+    for name, bus_ids in name_bus_ids.items():
+        if len(bus_ids) > 1:
+            ed_dist[0] = ed_dist.get(0, 0) + len(bus_ids)*(len(bus_ids)-1)//2
+            bus_sets.union_all(bus_ids)
+
+    for i, j, ed in similar_name_pairs(names, max_distance):
+        bus_ids_1 = name_bus_ids[names[i]]
+        bus_ids_2 = name_bus_ids[names[j]]
+        ed_dist[ed] = ed_dist.get(ed, 0) + len(bus_ids_1)*len(bus_ids_2)
+        bus_sets.union(bus_ids_1[0], bus_ids_2[0])
+
+    print('bus pairs by name edit distance')
+    for ed in sorted(ed_dist.keys()):
+        print('%d - %d' % (ed, ed_dist[ed]))
+
+
+def merge_prefix_names(bus_sets, buses, min_ratio=name_prefix_ratio, max_bus_delta=name_bus_delta):
+    '''joins buses whose names share a prefix of at least min_ratio of the
+    shorter name, when the bus numbers of their substations are within
+    max_bus_delta.  pairs are merged in the order of the buses in the file.'''
+    name_bus_ids = name_buses(buses)
+    names = list(name_bus_ids.keys())
+    bus_position = { int(bus[0]):position for position, bus in enumerate(buses) }
+
+    bus_pairs = []
+    for i, j in prefix_pairs(names, min_ratio):
+        bus_pairs.extend((bus_1, bus_2) for bus_1 in name_bus_ids[names[i]] for bus_2 in name_bus_ids[names[j]])
+    for name, bus_ids in name_bus_ids.items():
+        if len(name) > 0:
+            bus_pairs.extend(itertools.combinations(bus_ids, 2))
+    bus_pairs = [tuple(sorted(pair, key=bus_position.get)) for pair in bus_pairs]
+    bus_pairs.sort(key=lambda pair: (bus_position[pair[0]], bus_position[pair[1]]))
+
+    # the sorted bus ids of each cluster, by root
+    members = { bus_id:[bus_id] for bus_id in bus_position }
+    for bus_1_id, bus_2_id in bus_pairs:
+        root_1 = bus_sets.find(bus_1_id)
+        root_2 = bus_sets.find(bus_2_id)
+        if root_1 == root_2:
+            continue
+
+        # TODO, don't merge buses if they have a line between them
+        min_bus_delta = min_sorted_delta(members[root_1], members[root_2])
+        if min_bus_delta <= max_bus_delta:
+            print('merging: {} {} - {}'.format(bus_name(buses[bus_position[bus_1_id]]), bus_name(buses[bus_position[bus_2_id]]), min_bus_delta))
+            bus_sets.union(root_1, root_2)
+            merged = sorted(members.pop(root_1) + members.pop(root_2))
+            members[bus_sets.find(root_1)] = merged
+
+
+def min_sorted_delta(values_1, values_2):
+    '''the smallest absolute difference between items of two sorted lists'''
+    i = j = 0
+    min_delta = abs(values_1[0] - values_2[0])
+    while i < len(values_1) and j < len(values_2):
+        min_delta = min(min_delta, abs(values_1[i] - values_2[j]))
+        if values_1[i] < values_2[j]:
+            i += 1
+        else:
+            j += 1
+    return min_delta
+
+
+# parse_raw keys and the raw file sections they are read from
+raw_case_sections = OrderedDict([
+    ('buses', 'BUS'),
+    ('loads', 'LOAD'),
+    ('f_shunts', 'FIXED SHUNT'),
+    ('gens', 'GENERATOR'),
+    ('branches', 'BRANCH'),
+    ('transformers', 'TRANSFORMER'),
+    ('s_shunts', 'SWITCHED SHUNT'),
+])
+
+
+def parse_raw(raw_file_location, sections=None, processes=None):
+    '''reads the given sections (keys of raw_case_sections, default all) of a
+    raw file as lists of comma separated fields, transformers are
+    represented by the fields of their first line.  when processes is given
+    the sections are parsed concurrently by that many worker processes.'''
+    if sections == None:
+        sections = raw_case_sections.keys()
 
     raw_case = {}
+    if processes != None:
+        names = [raw_case_sections[key] for key in sections]
+        section_results = parse_parallel(raw_file_location, read_fields_chunk, names, processes)
+        for key, name in zip(sections, names):
+            raw_case[key] = [fields for chunk in section_results[name] for fields in chunk]
+        return raw_case
 
-    bus_lines = []
-    raw_case['buses'] = bus_lines
-
-    load_lines = []
-    raw_case['loads'] = load_lines
-
-    fixed_shunt_lines = []
-    raw_case['f_shunts'] = fixed_shunt_lines
-
-    gen_lines = []
-    raw_case['gens'] = gen_lines
-
-    switched_shunt_lines = []
-    raw_case['s_shunts'] = switched_shunt_lines
-
-    branch_lines = []
-    raw_case['branches'] = branch_lines
-
-    transformer_lines = []
-    raw_case['transformers'] = transformer_lines
-
-
-    reading_buses = True
-    reading_loads = False
-    reading_fixed_shunts = False
-    reading_gens = False
-    reading_branches = False
-    reading_transformers = False
-    reading_switched_shunts = False
-
-    line_index = 3
-    while line_index < len(raw_lines):
-        line = raw_lines[line_index]
-
-        if 'END OF BUS DATA' in line:
-            reading_buses = False
-
-        if 'END OF LOAD DATA' in line:
-            reading_loads = False
-
-        if 'END OF FIXED SHUNT DATA' in line:
-            reading_fixed_shunts = False
-
-        if 'END OF GENERATOR DATA' in line:
-            reading_gens = False
-
-        if 'END OF BRANCH DATA' in line:
-            reading_branches = False
-
-        if 'END OF TRANSFORMER DATA' in line:
-            reading_transformers = False
-
-        if 'END OF SWITCHED SHUNT DATA' in line:
-            reading_switched_shunts = False
-
-
-        if 'BEGIN LOAD DATA' in line:
-            reading_loads = True
-            line_index += 1
-            line = raw_lines[line_index]
-
-        if 'BEGIN FIXED SHUNT DATA' in line:
-            reading_fixed_shunts = True
-            line_index += 1
-            line = raw_lines[line_index]
-
-        if 'BEGIN GENERATOR DATA' in line:
-            reading_gens = True
-            line_index += 1
-            line = raw_lines[line_index]
-
-        if 'BEGIN BRANCH DATA' in line:
-            reading_branches = True
-            line_index += 1
-            line = raw_lines[line_index]
-
-        if 'BEGIN TRANSFORMER DATA' in line:
-            reading_transformers = True
-            line_index += 1
-            line = raw_lines[line_index]
-
-        if 'BEGIN SWITCHED SHUNT DATA' in line:
-            reading_switched_shunts = True
-            line_index += 1
-            line = raw_lines[line_index]
-
-
-        if reading_buses:
-            bus_lines.append(line.strip().split(','))
-
-        if reading_loads:
-            load_lines.append(line.strip().split(','))
-
-        if reading_fixed_shunts:
-            fixed_shunt_lines.append(line.strip().split(','))
-
-        if reading_branches:
-            branch_lines.append(line.strip().split(','))
-
-        if reading_transformers:
-            tr_parts = line.strip().split(',')
-            transformer_lines.append(tr_parts)
-            two_winding = int(tr_parts[2]) == 0
-            if two_winding:
-                line_index += 3
-            else:
-                line_index += 4
-
-        if reading_switched_shunts:
-            switched_shunt_lines.append(line.strip().split(','))
-
-        line_index += 1
+    with RawFile(raw_file_location) as raw_file:
+        for key in sections:
+            raw_case[key] = list(raw_file.iter_fields(raw_case_sections[key]))
 
     return raw_case
 
 
-def edit_distance(s1, s2):
-    m=len(s1)+1
-    n=len(s2)+1
-
-    tbl = {}
-    for i in range(m): tbl[i,0]=i
-    for j in range(n): tbl[0,j]=j
-    for i in range(1, m):
-        for j in range(1, n):
-            cost = 0 if s1[i-1] == s2[j-1] else 1
-            tbl[i,j] = min(tbl[i, j-1]+1, tbl[i-1, j]+1, tbl[i-1, j-1]+cost)
-
-    return tbl[i,j]
-
-
-def prefix_size(s1, s2):
-    length = min(len(s1), len(s2))
-    prefix_length = 0
-    for i in range(length):
-        if s1[i] == s2[i]:
-            prefix_length = i+1
-        else:
-            break
-
-    #print('{} {} {} {}'.format(s1, s2, length, prefix_length))
-    return prefix_length/float(length)
+def iter_raw(raw_file_location, key):
+    '''yields the records of one section of a raw file without reading the
+    rest of the file'''
+    with RawFile(raw_file_location) as raw_file:
+        for fields in raw_file.iter_fields(raw_case_sections[key]):
+            yield fields
 
 
 def build_cli_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('raw_file', help='the psse file to operate on (.raw)')
+    parser.add_argument('-j', '--jobs', help='parse the raw file sections concurrently with this many processes', type=int)
+    parser.add_argument('--name-merge', help='also join buses with similar names, by edit distance or common prefix', choices=['edit', 'prefix'])
 
     return parser
 
 if __name__ == '__main__':
+    # the -j workers of a frozen (pyinstaller) windows executable start it
+    # again, freeze_support runs them as workers instead of as main
+    multiprocessing.freeze_support()
     parser = build_cli_parser()
     main(parser.parse_args())
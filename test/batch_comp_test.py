@@ -0,0 +1,46 @@
+import sys, os, json
+
+from common_test import data_dir
+
+sys.path.append('.')
+import batch_comp
+
+
+def test_manifest_batch(capfd, tmpdir):
+    manifest = str(tmpdir.join('manifest.json'))
+    with open(manifest, 'w') as file:
+        json.dump([
+            {'raw_file': data_dir+'/frankenstein/network.raw', 'output': str(tmpdir.join('fraken.json'))},
+            {'raw_file': data_dir+'/does_not_exist.raw'},
+            {'raw_file': data_dir+'/nesta_case73_ieee_rts/network.raw', 'bus_geolocations': ''}
+        ], file)
+
+    report = str(tmpdir.join('report.json'))
+    status = batch_comp.main(batch_comp.build_cli_parser().parse_args([
+        '-m', manifest,
+        '-d', str(tmpdir.join('out')),
+        '-l', str(tmpdir.join('logs')),
+        '-r', report,
+        '-p', '2'
+    ]))
+    assert(status == 1)
+
+    with open(report) as file:
+        results = json.load(file)
+
+    assert([result['success'] for result in results] == [True, False, True])
+    assert('FileNotFoundError' in results[1]['error'])
+    assert(os.path.isfile(str(tmpdir.join('fraken.json'))))
+    assert(os.path.isfile(str(tmpdir.join('out', 'network.json'))))
+    assert(os.path.isfile(str(tmpdir.join('logs', 'does_not_exist.log'))))
+
+
+def test_duplicate_outputs(tmpdir):
+    cases = batch_comp.glob_cases(data_dir+'/*/network.raw')
+    assert(len(cases) > 1)
+    try:
+        batch_comp.run_batch(cases, str(tmpdir.join('out')))
+        assert(False)
+    except ValueError as e:
+        assert('network.json' in str(e))
+    assert(not os.path.exists(str(tmpdir.join('out', 'network.json'))))
@@ -0,0 +1,48 @@
+import sys, os, time
+
+sys.path.append('.')
+from case_cache import CaseCache
+
+
+def test_invalidation(tmpdir):
+    case_file = str(tmpdir.join('case.raw'))
+    cache = CaseCache(str(tmpdir.join('cache')), 1<<20, 'v1')
+
+    with open(case_file, 'w') as file:
+        file.write('case one')
+    key = cache.key(case_file)
+    assert(cache.get(key) == None)
+    cache.put(key, {'buses': [1, 2]})
+    assert(cache.get(key) == {'buses': [1, 2]})
+
+    # new file contents or a new parser version give a new key
+    with open(case_file, 'w') as file:
+        file.write('case two')
+    assert(cache.key(case_file) != key)
+    assert(CaseCache(str(tmpdir.join('cache')), 1<<20, 'v2').key(case_file) != cache.key(case_file))
+
+
+def test_lru_eviction(tmpdir):
+    cache = CaseCache(str(tmpdir), 2500, 'v1')
+    value = 'x' * 1000
+
+    cache.put('a', value)
+    cache.put('b', value)
+    os.utime(cache.path('a'), (time.time()-20, time.time()-20))
+    os.utime(cache.path('b'), (time.time()-10, time.time()-10))
+
+    # reading 'a' makes 'b' the least recently used entry
+    assert(cache.get('a') == value)
+    cache.put('c', value)
+
+    assert(cache.get('b') == None)
+    assert(cache.get('a') == value)
+    assert(cache.get('c') == value)
+
+
+def test_corrupt_entry(tmpdir, capfd):
+    cache = CaseCache(str(tmpdir), 1<<20)
+    with open(cache.path('a'), 'w') as file:
+        file.write('not a pickle')
+    assert(cache.get('a') == None)
+    assert(not os.path.exists(cache.path('a')))
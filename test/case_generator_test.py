@@ -0,0 +1,49 @@
+import sys, os, json
+
+sys.path.append('.')
+import case_generator, connectivity_comp, benchmark
+
+
+def test_write_case(tmpdir, capfd):
+    raw_file, coordinates_file, geolocations_file = case_generator.case_files(str(tmpdir), 2000)
+    counts = case_generator.write_case(raw_file, coordinates_file, geolocations_file, 2000)
+    assert(counts['buses'] == 2000)
+    assert(counts['three_winding_transformers'] > 0 and counts['transformers'] > counts['three_winding_transformers'])
+    assert(counts['facts'] > 0 and counts['tt_dc_lines'] > 0 and counts['vsc_dc_lines'] > 0)
+
+    # the same seed gives the same case
+    other_raw_file = str(tmpdir.join('other.raw'))
+    case_generator.write_case(other_raw_file, None, None, 2000)
+    with open(raw_file) as file, open(other_raw_file) as other_file:
+        assert(file.read() == other_file.read())
+
+    case_tables = connectivity_comp.load_case(raw_file)
+    assert(len(case_tables.buses) == 2000)
+    assert(len(case_tables.transformers) == counts['transformers'])
+    assert(len(case_tables.branches) == counts['branches'])
+    assert(len(connectivity_comp.load_locations(coordinates_file)) == 2000)
+
+    # the buses of a site are contracted into one substation above the feeders
+    output = str(tmpdir.join('connectivity.json'))
+    connectivity_comp.main(connectivity_comp.build_cli_parser().parse_args([raw_file, '-g', geolocations_file, '-k', '100', '-o', output]))
+    with open(output) as file:
+        connectivity = json.load(file)
+    assert(len(connectivity['substations']) == counts['sites'])
+    assert(all('longitude' in substation for substation in connectivity['substations']))
+
+
+def test_benchmark(tmpdir, capfd):
+    results = str(tmpdir.join('results.json'))
+    arguments = benchmark.build_cli_parser().parse_args(['-b', '500', '1000', '-d', str(tmpdir.join('cases')), '-r', results, '--compare'])
+    benchmark.main(arguments)
+    benchmark.main(arguments)
+    stdout, stderr = capfd.readouterr()
+    assert('compared to' in stdout)
+
+    with open(results) as file:
+        runs = json.load(file)
+    assert(len(runs) == 2)
+    assert([(result['buses'], result['name']) for result in runs[0]['results']] ==
+        [(bus_count, name) for bus_count in [500, 1000] for name in benchmark.benchmark_names])
+    assert(sorted(os.listdir(str(tmpdir.join('cases')))) == sorted(os.path.basename(file_name)
+        for bus_count in [500, 1000] for file_name in case_generator.case_files('.', bus_count)))
@@ -0,0 +1,87 @@
+import sys
+
+from grg_pssedata.io import parse_psse_case_file
+
+from common_test import data_dir
+
+sys.path.append('.')
+import case_tables
+
+
+def assert_same_tables(tables, other):
+    assert(tables.buses.ids.tolist() == other.buses.ids.tolist())
+    assert(tables.buses.base_kvs.tolist() == other.buses.base_kvs.tolist())
+    assert(tables.buses.zones.tolist() == other.buses.zones.tolist())
+    assert(tables.names.decode(tables.buses.names) == other.names.decode(other.buses.names))
+    for field in case_tables.component_fields:
+        table = getattr(tables, field)
+        other_table = getattr(other, field)
+        assert(table.ends.tolist() == other_table.ends.tolist())
+        assert(tables.names.decode(table.names) == other.names.decode(other_table.names))
+
+
+def test_name_table():
+    names = case_tables.NameTable(['a', 'b'])
+    codes = names.encode(['b', 'c', 'a', 'c'])
+    assert(codes.tolist() == [1, 2, 0, 2])
+    assert(len(names) == 3 and names[2] == 'c')
+    assert(names.decode(codes) == ['b', 'c', 'a', 'c'])
+
+
+def test_fraken_tables():
+    raw_file = data_dir+'/frankenstein/network.raw'
+    tables = case_tables.load_case_tables(raw_file)
+
+    assert(tables.buses.ids.tolist() == list(range(1001, 1010)))
+    assert(tables.names.decode(tables.buses.names)[0] == 'FAV SPOT 01')
+    assert(tables.transformers.bus_ids(tables.buses).tolist() == [[1001, 1004, 0], [1005, 1002, 0], [1007, 1006, 1003]])
+    assert(tables.transformers.ends.tolist() == [[0, 3, -1], [4, 1, -1], [6, 5, 2]])
+    assert(tables.facts.bus_ids(tables.buses).tolist() == [[1004, 0], [1008, 1009]])
+    assert(tables.tt_dc_lines.ends.tolist() == [[8, 3]])
+    assert(tables.names.decode(tables.vsc_dc_lines.names) == ['VSCDC Ln 1 '])
+
+    assert(tables.buses.rows([1009, 1001]).tolist() == [8, 0])
+    try:
+        tables.buses.rows([1001, 17])
+        assert(False)
+    except KeyError:
+        pass
+
+    # generators grouped by their bus, in file order
+    order, starts = tables.generators.bus_groups(len(tables.buses))
+    generator_rows = tables.generators.ends[:, 0].tolist()
+    for row in range(len(tables.buses)):
+        rows = order[starts[row]:starts[row+1]].tolist()
+        assert(rows == [i for i, generator_row in enumerate(generator_rows) if generator_row == row])
+
+
+def test_chunked_tables():
+    for case in ['nesta_case73_ieee_rts', 'frankenstein']:
+        raw_file = data_dir+'/'+case+'/network.raw'
+        tables = case_tables.CaseTables.from_case(parse_psse_case_file(raw_file))
+        assert_same_tables(tables, case_tables.load_case_tables(raw_file))
+        assert_same_tables(tables, case_tables.load_case_tables(raw_file, chunk_bytes=1000))
+        assert_same_tables(tables, case_tables.load_case_tables(raw_file, 2, chunk_bytes=1000))
+
+
+def test_incremental_tables(tmpdir):
+    raw_file = data_dir+'/nesta_case73_ieee_rts/network.raw'
+    tables, chunk_columns, parsed_count = case_tables.load_case_tables_incremental(raw_file, {}, chunk_lines=8)
+    assert_same_tables(tables, case_tables.load_case_tables(raw_file))
+    assert(parsed_count == len(chunk_columns))
+
+    tables, chunk_columns, parsed_count = case_tables.load_case_tables_incremental(raw_file, chunk_columns, chunk_lines=8)
+    assert(parsed_count == 0)
+
+    # a new bus voltage, only the chunk holding the bus is parsed again
+    with open(raw_file, 'rb') as file:
+        raw = file.read()
+    edited_file = str(tmpdir.join('network.raw'))
+    with open(edited_file, 'wb') as file:
+        file.write(raw.replace(b"  112,'112         ', 230.0000", b"  112,'112         ', 345.0000", 1))
+
+    tables, edited_columns, parsed_count = case_tables.load_case_tables_incremental(edited_file, chunk_columns, chunk_lines=8)
+    assert(parsed_count == 1)
+    assert_same_tables(tables, case_tables.load_case_tables(edited_file))
+    assert(tables.buses.base_kvs[tables.buses.rows([112])].tolist() == [345.0])
+    assert_same_tables(tables, case_tables.load_case_tables_incremental(edited_file, {}, 2, chunk_lines=8)[0])
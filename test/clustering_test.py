@@ -0,0 +1,63 @@
+import sys, itertools, random
+
+sys.path.append('.')
+from clustering import DisjointSet, IndexDisjointSet, grid_pairs
+
+
+def test_union_find():
+    bus_sets = DisjointSet([5, 3, 9, 1, 7])
+    assert(bus_sets.union(3, 7))
+    assert(not bus_sets.union(7, 3))
+    assert(bus_sets.union_all([1, 9, 7]) == 2)
+
+    assert(bus_sets.find(1) == bus_sets.find(3))
+    assert(bus_sets.find(5) != bus_sets.find(3))
+    assert(list(bus_sets.lookup().items()) == [(5, 0), (3, 1), (9, 1), (1, 1), (7, 1)])
+    assert(bus_sets.groups() == [[5], [3, 9, 1, 7]])
+
+
+def test_from_set_lookup():
+    bus_sets = DisjointSet.from_set_lookup({
+        10: set([10]),
+        20: set([20, 30]),
+        30: set([20, 30]),
+        40: set([40])
+    })
+    bus_sets.union(40, 10)
+    assert(bus_sets.lookup() == {10:0, 20:1, 30:1, 40:0})
+
+
+def test_from_lookup():
+    bus_sets = DisjointSet.from_lookup({10:0, 20:1, 30:1, 40:2})
+    assert(bus_sets.groups() == [[10], [20, 30], [40]])
+
+
+def test_index_union_find():
+    bus_sets = IndexDisjointSet(5)
+    assert(bus_sets.union(3, 1))
+    assert(not bus_sets.union(1, 3))
+    assert(bus_sets.union_all([4, 2, 1]) == 2)
+    assert(bus_sets.find(4) == bus_sets.find(3))
+    assert(bus_sets.find(0) != bus_sets.find(3))
+    assert(bus_sets.labels().tolist() == [0, 1, 1, 1, 1])
+
+    bus_sets = IndexDisjointSet.from_labels([7, 3, 7, 5, 3])
+    assert(bus_sets.labels().tolist() == [0, 1, 0, 2, 1])
+    bus_sets.union(3, 2)
+    assert(bus_sets.labels().tolist() == [0, 1, 0, 0, 1])
+    assert(IndexDisjointSet(0).labels().tolist() == [])
+
+
+def test_grid_pairs():
+    random.seed(0)
+    for dimensions in [1, 2, 3]:
+        points = [tuple(random.choice([0.0, 1.5, -2.25]) if random.random() < 0.2 else random.uniform(-5, 5)
+            for axis in range(dimensions)) for i in range(200)]
+        for distance in [0.0, 0.3, 1.0, 4.0]:
+            expected = set((i, j) for i, j in itertools.combinations(range(len(points)), 2)
+                if sum((x - y)**2 for x, y in zip(points[i], points[j])) <= distance**2)
+            pairs = list(grid_pairs(points, distance, batch_size=100))
+            assert(len(pairs) == len(set(pairs)))
+            assert(set(pairs) == expected)
+
+    assert(list(grid_pairs([], 1.0)) == [])
@@ -1,3 +1,10 @@
 import sys, os
 
 data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def remove_output(file_name):
+    '''removes a file written by one of the tools, with its manifest'''
+    os.remove(file_name)
+    if os.path.isfile(file_name + '.manifest.json'):
+        os.remove(file_name + '.manifest.json')
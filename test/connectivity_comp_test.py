@@ -1,9 +1,13 @@
-import sys, os, json
+import sys, os, json, tracemalloc
 
-from common_test import data_dir
+import numpy
+from grg_pssedata.io import parse_psse_case_file
+
+from common_test import data_dir, remove_output
 
 sys.path.append('.')
-import connectivity_comp
+import connectivity_comp, case_tables
+from diagnostics import Diagnostics
 
 parser = connectivity_comp.build_cli_parser()
 
@@ -11,7 +15,6 @@ parser = connectivity_comp.build_cli_parser()
 def test_rts(capfd):
     connectivity_comp.main(parser.parse_args([
         data_dir+'/nesta_case73_ieee_rts/network.raw',
-        '-scs',
         '-g', data_dir+'/nesta_case73_ieee_rts/coordinates.csv',
         '-o', data_dir+'/nesta_case73_ieee_rts/tmp.json'
     ]))
@@ -24,7 +27,7 @@ def test_rts(capfd):
     with open(data_dir+'/nesta_case73_ieee_rts/tmp.json') as file:
         result_data = json.load(file)
 
-    os.remove(data_dir+'/nesta_case73_ieee_rts/tmp.json')
+    remove_output(data_dir+'/nesta_case73_ieee_rts/tmp.json')
 
     with open(data_dir+'/nesta_case73_ieee_rts/connectivity.json') as file:
         expected_data = json.load(file)
@@ -40,7 +43,6 @@ def test_rts(capfd):
 def test_fraken(capfd):
     connectivity_comp.main(parser.parse_args([
         data_dir+'/frankenstein/network.raw',
-        '-scs',
         '-g', data_dir+'/frankenstein/coordinates.csv',
         '-o', data_dir+'/frankenstein/tmp.json'
     ]))
@@ -53,7 +55,7 @@ def test_fraken(capfd):
     with open(data_dir+'/frankenstein/tmp.json') as file:
         result_data = json.load(file)
 
-    os.remove(data_dir+'/frankenstein/tmp.json')
+    remove_output(data_dir+'/frankenstein/tmp.json')
 
     with open(data_dir+'/frankenstein/connectivity.json') as file:
         expected_data = json.load(file)
@@ -63,3 +65,409 @@ def test_fraken(capfd):
 
     assert(expected_data == result_data)
 
+
+def test_contract_voltage_level():
+    buses = case_tables.BusTable(
+        numpy.array([1, 2, 3, 4, 5, 6]),
+        numpy.array([345.0, 69.0, 69.0, 69.0, 345.0, 13.8]),
+        numpy.zeros(6, dtype=int),
+        numpy.zeros(6, dtype=int)
+    )
+    # branches between buses 1-2, 2-3, 3-4 and 4-5, by bus row
+    branches = case_tables.ComponentTable(numpy.array([[0, 1], [1, 2], [2, 3], [3, 4]]), numpy.zeros(4, dtype=int))
+    bus_metabuses = numpy.arange(6)
+
+    result = connectivity_comp.contract_voltage_level(bus_metabuses, buses, branches, 100.0)
+
+    # bus 3 is equidistant from both high voltage buses and goes to the first,
+    # bus 6 has no path to a high voltage bus and stays on its own
+    assert(result.tolist() == [0, 0, 0, 1, 1, 2])
+
+
+def test_group_edges():
+    # buses 0 and 1 in substation 0, 2 in 1 and 3 in 2
+    bus_substations = numpy.array([0, 0, 1, 2])
+    branch_ends = numpy.array([[0, 2], [0, 1], [2, 3], [0, 2], [3, 2]])
+    dc_ends = numpy.array([[3, 1], [1, 2]])
+
+    edges = connectivity_comp.group_edges([branch_ends, dc_ends], bus_substations)
+    assert(edges.edge_groups.tolist() == [0, 1, 2, 0, 3, 4, 5])
+    assert(edges.group_kinds.tolist() == [0, 0, 0, 0, 1, 1])
+    assert(edges.group_ids.tolist() == [1, 2, 3, 4, 1, 2])
+    assert(edges.group_corridors.tolist() == [0, -1, 2, 2, 1, 0])
+    assert(edges.corridor_substations.tolist() == [[0, 1], [0, 2], [1, 2]])
+
+    edges = connectivity_comp.group_edges([numpy.zeros((0, 2), dtype=int)], bus_substations)
+    assert(len(edges.edge_groups) == 0 and len(edges.corridor_substations) == 0)
+
+
+def test_rts_kv_sweep(capfd):
+    connectivity_comp.main(parser.parse_args([
+        data_dir+'/nesta_case73_ieee_rts/network.raw',
+        '-K', '100,200',
+        '-o', data_dir+'/nesta_case73_ieee_rts/tmp.json'
+    ]))
+
+    for kv_threshold in ['100', '200']:
+        connectivity_comp.main(parser.parse_args([
+            data_dir+'/nesta_case73_ieee_rts/network.raw',
+            '-k', kv_threshold,
+            '-o', data_dir+'/nesta_case73_ieee_rts/tmp_single.json'
+        ]))
+
+        sweep_file = data_dir+'/nesta_case73_ieee_rts/tmp_{}kv.json'.format(kv_threshold)
+        with open(sweep_file) as file:
+            sweep_data = json.load(file)
+        with open(data_dir+'/nesta_case73_ieee_rts/tmp_single.json') as file:
+            single_data = json.load(file)
+
+        remove_output(sweep_file)
+        remove_output(data_dir+'/nesta_case73_ieee_rts/tmp_single.json')
+
+        assert(sweep_data == single_data)
+
+
+def test_fraken_compact(capfd):
+    for output, options in [('tmp.json', []), ('tmp_compact.json', ['-c'])]:
+        connectivity_comp.main(parser.parse_args([
+            data_dir+'/frankenstein/network.raw',
+            '-o', data_dir+'/frankenstein/'+output
+        ] + options))
+
+    with open(data_dir+'/frankenstein/tmp.json') as file:
+        pretty_data = json.load(file)
+    with open(data_dir+'/frankenstein/tmp_compact.json') as file:
+        compact_text = file.read()
+
+    remove_output(data_dir+'/frankenstein/tmp.json')
+    remove_output(data_dir+'/frankenstein/tmp_compact.json')
+
+    assert('\n' not in compact_text)
+    assert(json.loads(compact_text) == pretty_data)
+
+
+def test_fraken_cache(capfd, tmpdir):
+    for run in range(2):
+        connectivity_comp.main(parser.parse_args([
+            data_dir+'/frankenstein/network.raw',
+            '--cache-dir', str(tmpdir),
+            '-o', data_dir+'/frankenstein/tmp_{}.json'.format(run)
+        ]))
+
+    stdout, stderr = capfd.readouterr()
+    assert(stdout.count('loaded parsed case from cache') == 1)
+
+    with open(data_dir+'/frankenstein/tmp_0.json') as file:
+        parsed_text = file.read()
+    with open(data_dir+'/frankenstein/tmp_1.json') as file:
+        cached_text = file.read()
+
+    remove_output(data_dir+'/frankenstein/tmp_0.json')
+    remove_output(data_dir+'/frankenstein/tmp_1.json')
+
+    assert(parsed_text == cached_text)
+
+
+def test_fraken_location_matching():
+    locations = connectivity_comp.load_locations(data_dir+'/frankenstein/coordinates.csv')
+    assert(len(locations) == 9)
+    assert(locations.location(0) == connectivity_comp.typed_location('-1', '1001', '201', '-1', '-1', '-113.2', '41.0', 'FAV SPOT 01'))
+
+    raw_case = parse_psse_case_file(data_dir+'/frankenstein/network.raw')
+    tables = case_tables.CaseTables.from_case(raw_case)
+    location_index = connectivity_comp.LocationIndex(locations)
+    bus_candidates = connectivity_comp.match_bus_locations(tables, location_index, min_score=0.8)
+    for bus in raw_case.buses:
+        candidates = bus_candidates[bus.i]
+        assert(candidates[0].match_name == bus.name)
+        assert([candidate.score for candidate in candidates] == sorted([candidate.score for candidate in candidates], reverse=True))
+
+    # buses of a zone without locations are matched against every zone
+    bus = raw_case.buses[0]
+    bus.zone = 999
+    bus.name = 'FAV SPOT 1'
+    raw_case.buses[:] = [bus]
+    for field in case_tables.component_fields:
+        getattr(raw_case, field)[:] = []
+    candidates = connectivity_comp.match_bus_locations(case_tables.CaseTables.from_case(raw_case), location_index)[bus.i]
+    assert(candidates[0].location.raw_bus_name == 'FAV SPOT 01')
+
+
+def test_quoted_locations(tmpdir):
+    with open(data_dir+'/frankenstein/coordinates.csv') as file:
+        lines = file.readlines()
+    locations_file = str(tmpdir.join('coordinates.csv'))
+    with open(locations_file, 'w') as file:
+        file.write(''.join(lines[:2]))
+        file.write('-1,1002,201,-1,-1,-113.1,41.1,"FAV SPOT, 02"\n')
+    locations = connectivity_comp.load_locations(locations_file)
+    assert(len(locations) == 2)
+    assert(locations.location(1) == connectivity_comp.typed_location('-1', '1002', '201', '-1', '-1', '-113.1', '41.1', 'FAV SPOT, 02'))
+    assert(locations.location(0) == connectivity_comp.load_locations(data_dir+'/frankenstein/coordinates.csv').location(0))
+
+
+def test_fraken_bus_locations(capfd):
+    connectivity_comp.main(parser.parse_args([
+        data_dir+'/frankenstein/network.raw',
+        '-L', data_dir+'/frankenstein/coordinates.csv',
+        '--location-matches', data_dir+'/frankenstein/tmp_matches.csv',
+        '-o', data_dir+'/frankenstein/tmp.json'
+    ]))
+
+    stdout, stderr = capfd.readouterr()
+    assert('located 9 of 9 buses' in stdout)
+
+    with open(data_dir+'/frankenstein/tmp.json') as file:
+        result_data = json.load(file)
+    with open(data_dir+'/frankenstein/tmp_matches.csv') as file:
+        matches = file.readlines()
+
+    remove_output(data_dir+'/frankenstein/tmp.json')
+    remove_output(data_dir+'/frankenstein/tmp_matches.csv')
+
+    assert(all('longitude' in substation for substation in result_data['substations']))
+    assert(matches[1].startswith('1001,FAV SPOT 01,1,FAV SPOT 01,'))
+
+
+def test_contract_geolocations(capfd):
+    buses = case_tables.BusTable(numpy.arange(1, 7), numpy.zeros(6), numpy.zeros(6, dtype=int), numpy.zeros(6, dtype=int))
+    bus_metabuses = numpy.array([0, 1, 1, 2, 3, 4])
+    geolocation_lookup = {
+        1: {'longitude': -105.0, 'latitude': 40.0},
+        2: {'longitude': -105.0, 'latitude': 40.0},
+        # about 45 m north of bus 1
+        4: {'longitude': -105.0, 'latitude': 40.0004},
+        5: {'longitude': -104.0, 'latitude': 40.0},
+        # not in the case
+        7: {'longitude': -104.0, 'latitude': 40.0}
+    }
+
+    result = connectivity_comp.contract_geolocations(bus_metabuses, buses, geolocation_lookup, 10)
+    assert(result.tolist() == [0, 0, 0, 1, 2, 3])
+    result = connectivity_comp.contract_geolocations(bus_metabuses, buses, geolocation_lookup, 50)
+    assert(result.tolist() == [0, 0, 0, 0, 1, 2])
+    result = connectivity_comp.contract_geolocations(bus_metabuses, buses, geolocation_lookup, 100000)
+    assert(result.tolist() == [0, 0, 0, 0, 0, 1])
+
+
+def test_contract_geolocations_string_ids(capfd):
+    buses = case_tables.BusTable(numpy.arange(1, 4), numpy.zeros(3), numpy.zeros(3, dtype=int), numpy.zeros(3, dtype=int))
+    bus_metabuses = numpy.array([0, 1, 2])
+    geolocation_lookup = {
+        1: {'longitude': -105.0, 'latitude': 40.0},
+        '3': {'longitude': -105.0, 'latitude': 40.0},
+        'bus 2': {'longitude': -105.0, 'latitude': 40.0},
+        None: {'longitude': -105.0, 'latitude': 40.0}
+    }
+
+    diagnostics = Diagnostics()
+    result = connectivity_comp.contract_geolocations(bus_metabuses, buses, geolocation_lookup, 10, diagnostics)
+    assert(result.tolist() == [0, 1, 0])
+    assert(diagnostics.counts == {'geolocation_id_invalid': 2})
+    out, err = capfd.readouterr()
+    assert("WARNING: geolocation id 'bus 2' is not a bus number" in out)
+
+
+def test_fraken_geolocation_distance(tmpdir, capfd):
+    geolocations = str(tmpdir.join('geolocations.csv'))
+    with open(geolocations, 'w') as file:
+        file.write('id,longitude,latitude\n')
+        for bus_id in range(1001, 1010):
+            file.write('{},{},{}\n'.format(bus_id, -113.0, 41.0 + 0.0001*(bus_id % 2)))
+
+    output = str(tmpdir.join('tmp.json'))
+    connectivity_comp.main(parser.parse_args([data_dir+'/frankenstein/network.raw', '-g', geolocations, '-o', output]))
+    with open(output) as file:
+        separate = json.load(file)
+
+    connectivity_comp.main(parser.parse_args([data_dir+'/frankenstein/network.raw', '-g', geolocations, '-D', '5', '-o', output]))
+    with open(output) as file:
+        odd_even = json.load(file)
+
+    connectivity_comp.main(parser.parse_args([data_dir+'/frankenstein/network.raw', '-g', geolocations, '-D', '20', '-o', output]))
+    with open(output) as file:
+        merged = json.load(file)
+
+    stdout, stderr = capfd.readouterr()
+    assert('geolocation contraction joined' in stdout)
+
+    assert(len(separate['substations']) > len(odd_even['substations']))
+    assert(len(odd_even['substations']) <= 2)
+    assert(len(merged['substations']) == 1)
+
+
+def test_fraken_virtual(tmpdir, capfd):
+    with open(data_dir+'/frankenstein/network.raw') as file:
+        raw = file.read()
+    raw = raw.replace("1004,1006,'1 '", "1004,1006,'99'").replace("1008,1005,'1 '", "1008,1005,'EQ'")
+    raw = raw.replace("1001,1004,    0,'1 '", "1001,1004,    0,'EQ'")
+    raw_file = str(tmpdir.join('network.raw'))
+    with open(raw_file, 'w') as file:
+        file.write(raw)
+
+    output = str(tmpdir.join('tmp.json'))
+    connectivity_comp.main(parser.parse_args([raw_file, '-k', '0', '-o', output]))
+    with open(output) as file:
+        result = json.load(file)
+
+    stdout, stderr = capfd.readouterr()
+    assert('marking branch 1 - 1004 1006 99 as virtual' in stdout)
+    assert('marking transformer 1 - 1001 1004 0 EQ as virtual' in stdout)
+
+    # a corridor is virtual when all of its branches, facts and dc lines are
+    branch_types = {}
+    for corridor in result['corridors']:
+        members = [member for branch_group in corridor['branch_groups'] for member in branch_group['branches']]
+        branch_types.update((branch['id'], branch['type']) for branch in members)
+        for field, list_field in [('facts_groups', 'facts'), ('tt_dc_groups', 'tt_dcs'), ('vsc_dc_groups', 'vsc_dcs')]:
+            members.extend(member for group in corridor[field] for member in group[list_field])
+        physical = any(member['type'] == 'physical' for member in members)
+        assert(corridor['type'] == ('physical' if physical else 'virtual'))
+    assert(branch_types == {1:'virtual', 2:'virtual', 3:'physical'})
+    assert('virtual' in [corridor['type'] for corridor in result['corridors']])
+    assert(all(substation['type'] == 'physical' for substation in result['substations']))
+
+    # substations without a physical bus, branch or transformer are virtual
+    tables = connectivity_comp.load_case(raw_file)
+    physical = connectivity_comp.component_physical(tables)
+    assert(physical['branches'].tolist() == [False, False, True])
+    assert(physical['transformers'].tolist() == [False, True, True])
+    # substation 0 holds buses 1001 and 1004
+    bus_substations = connectivity_comp.contract_transformers(numpy.arange(len(tables.buses)), tables.transformers)
+    physical['buses'][bus_substations == 0] = False
+    edge_rows = [numpy.flatnonzero(getattr(tables, field).ends[:, 1] >= 0)
+        for field, group_field, list_field, substation_field in connectivity_comp.corridor_components]
+    edges = connectivity_comp.group_edges([getattr(tables, field).ends[rows, :2]
+        for rows, (field, group_field, list_field, substation_field) in zip(edge_rows, connectivity_comp.corridor_components)], bus_substations)
+    substation_physical, corridor_physical = connectivity_comp.classify_groups(physical, bus_substations, tables.transformers, edge_rows, edges)
+    assert(substation_physical.tolist() == [False, True, True, True, True])
+    # the corridors of the virtual branches 1004-1006 and 1008-1005
+    virtual_corridors = [[0, 2], [1, 3]]
+    assert(corridor_physical.tolist() == [substations not in virtual_corridors for substations in edges.corridor_substations.tolist()])
+
+
+def test_rts_state(tmpdir, capfd):
+    raw_file = data_dir+'/nesta_case73_ieee_rts/network.raw'
+    state_file = str(tmpdir.join('state.pickle'))
+    outputs = [str(tmpdir.join('tmp_{}.json'.format(i))) for i in range(3)]
+
+    connectivity_comp.main(parser.parse_args([raw_file, '-k', '200', '-o', outputs[0]]))
+    connectivity_comp.main(parser.parse_args([raw_file, '-k', '200', '--state', state_file, '-o', outputs[1]]))
+    assert(os.path.isfile(state_file))
+    capfd.readouterr()
+
+    connectivity_comp.main(parser.parse_args([raw_file, '-k', '200', '--state', state_file, '-o', outputs[2]]))
+    stdout, stderr = capfd.readouterr()
+    assert('parsed 0 new section chunks' in stdout)
+    assert('reused the transformer contraction of the previous run' in stdout)
+
+    results = []
+    for output in outputs:
+        with open(output) as file:
+            results.append(json.load(file))
+    assert(results[0] == results[1] and results[0] == results[2])
+
+
+def test_fraken_up_to_date(tmpdir, capfd):
+    raw_file = str(tmpdir.join('network.raw'))
+    with open(data_dir+'/frankenstein/network.raw') as file:
+        raw = file.read()
+    with open(raw_file, 'w') as file:
+        file.write(raw)
+    output = str(tmpdir.join('tmp.json'))
+
+    def run(*options):
+        connectivity_comp.main(parser.parse_args([raw_file, '-o', output] + list(options)))
+        stdout, stderr = capfd.readouterr()
+        return 'up to date, skipping' not in stdout
+
+    assert(run())
+    assert(os.path.isfile(output + '.manifest.json'))
+    assert(not run())
+    assert(run('--force'))
+    # other options, inputs or outputs are rebuilt
+    assert(run('-k', '100'))
+    assert(not run('-k', '100'))
+    with open(raw_file, 'w') as file:
+        file.write(raw.replace("'FAV SPOT 01'", "'FAV SPOT 10'"))
+    assert(run('-k', '100'))
+    with open(output, 'a') as file:
+        file.write(' ')
+    assert(run('-k', '100'))
+    assert(not run('-k', '100'))
+
+    # the report files of a skipped run are not refreshed
+    profile = str(tmpdir.join('profile.json'))
+    connectivity_comp.main(parser.parse_args([raw_file, '-o', output, '-k', '100', '--profile', profile]))
+    stdout, stderr = capfd.readouterr()
+    assert('WARNING: {} not written'.format(profile) in stdout)
+    assert(not os.path.exists(profile))
+
+
+def test_fraken_profile(tmpdir, capfd):
+    output = str(tmpdir.join('tmp.json'))
+    profile = str(tmpdir.join('profile.json'))
+    connectivity_comp.main(parser.parse_args([data_dir+'/frankenstein/network.raw', '-g', data_dir+'/frankenstein/coordinates.csv',
+        '-K', '100,200', '-o', output, '--profile', profile, '--profile-memory']))
+
+    with open(profile) as file:
+        report = json.load(file)
+    stages = report['stages']
+    assert([stage['name'] for stage in stages[:4]] == ['parse', 'transformer contraction', 'lookup build', 'metabus graph'])
+    assert([stage['name'] for stage in stages[4:11]] == ['voltage contraction', 'bus data build', 'geolocation',
+        'transformer grouping', 'corridor aggregation', 'classification', 'write'])
+    assert([stage.get('kv_threshold') for stage in stages if stage['name'] == 'voltage contraction'] == [200, 100])
+    assert(stages[0]['items'] == 9)
+    for stage in stages:
+        assert(stage['wall_seconds'] >= 0 and stage['cpu_seconds'] >= 0)
+        assert(stage['traced_peak_mb'] >= 0)
+    assert(report['wall_seconds'] >= sum(stage['wall_seconds'] for stage in stages))
+
+
+def test_fraken_profile_failure(tmpdir, capfd):
+    # the stages before a failure are reported and tracing is stopped
+    profile = str(tmpdir.join('profile.json'))
+    locations_file = str(tmpdir.join('coordinates.csv'))
+    with open(locations_file, 'w') as file:
+        file.write('OBJECTID,Bus_Name\n')
+    try:
+        connectivity_comp.main(parser.parse_args([data_dir+'/frankenstein/network.raw', '-L', locations_file,
+            '-o', str(tmpdir.join('tmp.json')), '--profile', profile, '--profile-memory']))
+        assert(False)
+    except ValueError:
+        pass
+    assert(not tracemalloc.is_tracing())
+
+    with open(profile) as file:
+        stages = json.load(file)['stages']
+    assert([stage['name'] for stage in stages] == ['parse', 'transformer contraction', 'location matching'])
+
+
+def test_fraken_diagnostics(tmpdir, capfd):
+    output = str(tmpdir.join('tmp.json'))
+    diagnostics_file = str(tmpdir.join('diagnostics.json'))
+    connectivity_comp.main(parser.parse_args([data_dir+'/frankenstein/network.raw', '-g', data_dir+'/frankenstein/coordinates.csv',
+        '-o', output, '--quiet', '--diagnostics', diagnostics_file]))
+    stdout, stderr = capfd.readouterr()
+    assert('no location for bus id' not in stdout)
+    assert('WARNING: 9 bus_location_missing messages (9 not shown)' in stdout)
+
+    with open(diagnostics_file) as file:
+        report = json.load(file)
+    assert(report['counts']['bus_location_missing'] == 9)
+    assert('no location for bus id 1001 in substation 1' in [message['message'] for message in report['messages']])
+
+
+def test_fraken_kv_thresholds_diagnostics(tmpdir, capfd):
+    raw_file = data_dir+'/frankenstein/network.raw'
+    geolocations = data_dir+'/frankenstein/coordinates.csv'
+    connectivity_comp.main(parser.parse_args([raw_file, '-g', geolocations, '-K', '0,200',
+        '-o', str(tmpdir.join('tmp.json')), '--quiet', '--diagnostics', str(tmpdir.join('diagnostics.json'))]))
+    for kv_threshold in [0, 200]:
+        connectivity_comp.main(parser.parse_args([raw_file, '-g', geolocations, '-k', str(kv_threshold),
+            '-o', str(tmpdir.join('single.json')), '--quiet', '--diagnostics', str(tmpdir.join('single.json.json')), '--force']))
+        with open(str(tmpdir.join('diagnostics_{}kv.json'.format(kv_threshold)))) as file:
+            report = json.load(file)
+        with open(str(tmpdir.join('single.json.json'))) as file:
+            assert(report == json.load(file))
+        assert(report['counts']['bus_location_missing'] > 0)
@@ -0,0 +1,51 @@
+import sys, os, pickle
+
+from common_test import data_dir
+
+sys.path.append('.')
+import connectivity_comp
+from connectivity_index import Connectivity
+
+
+def index_tables(index):
+    return [index.bus_substations, index.component_groups, index.group_locations, index.substation_corridors]
+
+
+def test_fraken_index(tmpdir, capfd):
+    raw_file = data_dir+'/frankenstein/network.raw'
+    output = str(tmpdir.join('tmp.json'))
+    index_file = str(tmpdir.join('index.pickle'))
+    connectivity_comp.main(connectivity_comp.build_cli_parser().parse_args([raw_file, '-o', output, '--index', index_file]))
+
+    index = Connectivity.load(index_file)
+    assert(index.case == raw_file)
+    assert(index_tables(index) == index_tables(Connectivity.from_file(output)))
+    assert(Connectivity.from_file(output).case == index.case)
+    assert(index_tables(index) == index_tables(connectivity_comp.load_connectivity(raw_file)))
+
+    assert(index.substation(1001) == index.substation(1004))
+    assert(index.substation(1001) != index.substation(1009))
+    assert(index.substation(42) == None)
+
+    group = index.group('transformers', 1)
+    assert(group[0] == 'transformer_groups')
+    assert(index.location(*group) == ('substations', index.substation(1001)))
+
+    # the branch 1005 - 1009 joins two substations
+    group = index.group('branches', 3)
+    location = index.location(*group)
+    assert(location[0] == 'corridors')
+    assert(index.corridor(index.substation(1005), index.substation(1009)) == location[1])
+    assert(index.corridor(index.substation(1009), index.substation(1005)) == location[1])
+    assert(index.corridor(index.substation(1001), index.substation(1001)) == None)
+
+
+def test_index_version(tmpdir):
+    index_file = str(tmpdir.join('index.pickle'))
+    with open(index_file, 'wb') as file:
+        pickle.dump({'version': -1, 'index': {}}, file)
+    try:
+        Connectivity.load(index_file)
+        assert(False)
+    except ValueError:
+        pass
@@ -0,0 +1,59 @@
+import sys, csv, json
+
+sys.path.append('.')
+from diagnostics import Diagnostics
+
+
+def test_samples(tmpdir, capfd):
+    diagnostics = Diagnostics(sample_size=2, keep_all=True)
+    for bus_id in range(5):
+        diagnostics.warning('bus_location_missing', 'no location for bus id {}', bus_id)
+    diagnostics.note('virtual_branch', 'marking branch {} as virtual', 7)
+    diagnostics.print_summary()
+    stdout, stderr = capfd.readouterr()
+    assert(stdout.splitlines() == [
+        'WARNING: no location for bus id 0',
+        'WARNING: no location for bus id 1',
+        'marking branch 7 as virtual',
+        'WARNING: 5 bus_location_missing messages (3 not shown)'
+    ])
+    assert(diagnostics.counts == {'bus_location_missing': 5, 'virtual_branch': 1})
+
+    json_file = str(tmpdir.join('diagnostics.json'))
+    diagnostics.write(json_file)
+    with open(json_file) as file:
+        report = json.load(file)
+    assert(report['counts'] == diagnostics.counts)
+    assert(len(report['messages']) == 6)
+    assert(report['messages'][4] == {'level': 'warning', 'category': 'bus_location_missing', 'message': 'no location for bus id 4'})
+
+    csv_file = str(tmpdir.join('diagnostics.csv'))
+    diagnostics.write(csv_file)
+    with open(csv_file) as file:
+        rows = list(csv.reader(file))
+    assert(rows[0] == ['level', 'category', 'message'])
+    assert(rows[-1] == ['note', 'virtual_branch', 'marking branch 7 as virtual'])
+
+
+def test_quiet(capfd):
+    diagnostics = Diagnostics(quiet=True)
+    for bus_id in range(3):
+        diagnostics.warning('bus_location_missing', 'no location for bus id {}', bus_id)
+    diagnostics.print_summary()
+    stdout, stderr = capfd.readouterr()
+    assert(stdout.splitlines() == ['WARNING: 3 bus_location_missing messages (3 not shown)'])
+    assert(diagnostics.messages == [])
+
+
+def test_copy(capfd):
+    diagnostics = Diagnostics(sample_size=2, keep_all=True)
+    diagnostics.warning('bus_location_missing', 'no location for bus id {}', 1)
+    level = diagnostics.copy()
+    for bus_id in range(2, 4):
+        level.warning('bus_location_missing', 'no location for bus id {}', bus_id)
+    out, err = capfd.readouterr()
+    assert(out.count('WARNING') == 2)
+    assert(diagnostics.counts == {'bus_location_missing': 1})
+    assert(len(diagnostics.messages) == 1)
+    assert(level.counts == {'bus_location_missing': 3})
+    assert(len(level.messages) == 3)
@@ -8,7 +8,7 @@ import geojson_comp
 
 def test_rts(capfd):
     geojson_comp.create_geojson(
-        data_dir+'/nesta_case73_ieee_rts/connectivity.json',
+        data_dir+'/nesta_case73_ieee_rts/geo_connectivity.json',
         data_dir+'/nesta_case73_ieee_rts/tmp.json'
     )
 
@@ -35,7 +35,7 @@ def test_rts(capfd):
 
 def test_fraken(capfd):
     geojson_comp.create_geojson(
-        data_dir+'/frankenstein/connectivity.json',
+        data_dir+'/frankenstein/geo_connectivity.json',
         data_dir+'/frankenstein/tmp.json'
     )
 
@@ -57,3 +57,51 @@ def test_fraken(capfd):
 
     assert(expected_data == result_data)
 
+
+
+def test_fraken_seq(capfd):
+    file_names = geojson_comp.create_geojson_seq(
+        data_dir+'/frankenstein/geo_connectivity.json',
+        data_dir+'/frankenstein/tmp.json'
+    )
+
+    with open(data_dir+'/frankenstein/geo.json') as file:
+        expected_data = json.load(file)
+
+    for file_name, layer in zip(file_names, ['substations', 'corridors']):
+        with open(file_name) as file:
+            lines = file.read().split('\n')
+        os.remove(file_name)
+
+        assert(lines[-1] == '')
+        assert(all(line.startswith('\x1e') for line in lines[:-1]))
+        features = [json.loads(line[1:]) for line in lines[:-1]]
+        assert(features == expected_data[layer]['features'])
+
+
+def test_fraken_ndjson_slim(capfd):
+    file_names = geojson_comp.create_geojson_seq(
+        data_dir+'/frankenstein/geo_connectivity.json',
+        data_dir+'/frankenstein/tmp.json',
+        rfc8142=False, slim=True
+    )
+
+    with open(file_names[1]) as file:
+        features = [json.loads(line) for line in file]
+    for file_name in file_names:
+        os.remove(file_name)
+
+    assert(file_names[1].endswith('tmp_corridors.geojsonl'))
+    assert(len(features) == 6)
+    assert(sorted(features[0]['properties'].keys()) == ['from_substation', 'id', 'name', 'to_substation', 'type'])
+
+
+def test_fraken_up_to_date(capfd, tmpdir):
+    output = str(tmpdir.join('tmp.json'))
+    parser = geojson_comp.build_cli_parser()
+    for options in [[], [], ['--force'], ['-f', 'ndjson'], ['-f', 'ndjson']]:
+        geojson_comp.main(parser.parse_args([data_dir+'/frankenstein/geo_connectivity.json', output] + options))
+
+    stdout, stderr = capfd.readouterr()
+    assert(stdout.count('up to date, skipping') == 2)
+    assert(os.path.isfile(str(tmpdir.join('tmp_corridors.geojsonl.manifest.json'))))
@@ -0,0 +1,69 @@
+import sys, io, json
+
+from common_test import data_dir
+
+sys.path.append('.')
+import json_stream
+
+
+data = {
+    'case': 'network.raw',
+    'corridors': [],
+    'substations': [
+        {'id': 1, 'buses': [{'id': 101, 'name': 'bé'}], 'groups': []},
+        {'id': 2, 'buses': [], 'groups': [{'id': 3}]}
+    ]
+}
+
+
+def streamed(data):
+    return {
+        'case': data['case'],
+        'corridors': json_stream.StreamedList(iter(data['corridors'])),
+        'substations': json_stream.StreamedList(substation for substation in data['substations'])
+    }
+
+
+def test_pretty():
+    outfile = io.StringIO()
+    json_stream.dump(streamed(data), outfile, indent=2, separators=(',', ': '))
+    assert(outfile.getvalue() == json.dumps(data, sort_keys=True, indent=2, separators=(',', ': ')))
+
+
+def test_compact():
+    outfile = io.StringIO()
+    json_stream.dump(streamed(data), outfile, separators=(',', ':'))
+    assert(outfile.getvalue() == json.dumps(data, sort_keys=True, separators=(',', ':')))
+
+
+def test_nested_default_separators():
+    nested = {'b': {'features': data['substations'], 'type': 'x'}, 'a': {}}
+    nested_streamed = {'b': {'features': json_stream.StreamedList(data['substations']), 'type': 'x'}, 'a': {}}
+
+    outfile = io.StringIO()
+    json_stream.dump(nested_streamed, outfile)
+    assert(outfile.getvalue() == json.dumps(nested, sort_keys=True))
+
+
+def test_iter_items():
+    text = json.dumps({'a': [1, 2.5, {'x': [1, 2]}], 'case': 'a b', 'b': [123456789, 'q', None], 'c': []}, indent=2)
+    for chunk_size in [1, 3, 1<<16]:
+        assert(list(json_stream.iter_items(io.StringIO(text), 'b', chunk_size)) == [123456789, 'q', None])
+        assert(list(json_stream.iter_items(io.StringIO(text), 'a', chunk_size)) == [1, 2.5, {'x': [1, 2]}])
+        assert(list(json_stream.iter_items(io.StringIO(text), 'c', chunk_size)) == [])
+        assert(list(json_stream.iter_items(io.StringIO(text), 'd', chunk_size)) == [])
+        assert(json_stream.read_value(io.StringIO(text), 'case', chunk_size=chunk_size) == 'a b')
+        assert(json_stream.read_value(io.StringIO(text), 'b', chunk_size=chunk_size) == [123456789, 'q', None])
+        assert(json_stream.read_value(io.StringIO(text), 'd', chunk_size=chunk_size) == None)
+
+
+def test_iter_items_straddling_chunks(monkeypatch):
+    # python 3.4 has no json.JSONDecodeError, the decode errors of values
+    # cut off by a chunk boundary are plain ValueErrors
+    monkeypatch.delattr(json, 'JSONDecodeError')
+    with open(data_dir+'/frankenstein/connectivity.json') as file:
+        text = file.read()
+    expected = json.loads(text)
+    for chunk_size in [7, 64, 1000]:
+        for key in ['substations', 'corridors']:
+            assert(list(json_stream.iter_items(io.StringIO(text), key, chunk_size)) == expected[key])
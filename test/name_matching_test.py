@@ -0,0 +1,91 @@
+import sys, itertools, random
+
+from common_test import data_dir
+
+sys.path.append('.')
+import name_matching, sub_comp
+from clustering import DisjointSet
+
+
+def table_edit_distance(s1, s2):
+    table = {}
+    for i in range(len(s1)+1): table[i,0] = i
+    for j in range(len(s2)+1): table[0,j] = j
+    for i in range(1, len(s1)+1):
+        for j in range(1, len(s2)+1):
+            cost = 0 if s1[i-1] == s2[j-1] else 1
+            table[i,j] = min(table[i, j-1]+1, table[i-1, j]+1, table[i-1, j-1]+cost)
+    return table[len(s1),len(s2)]
+
+
+def random_names(count, alphabet, seed=0):
+    random.seed(seed)
+    return sorted(set(''.join(random.choice(alphabet) for i in range(random.randint(0, 10))) for n in range(count)))
+
+
+def test_edit_distance():
+    names = random_names(40, 'ab c')
+    for name_1 in names:
+        expected = [table_edit_distance(name_1, name_2) for name_2 in names]
+        assert([name_matching.edit_distance(name_1, name_2) for name_2 in names] == expected)
+        assert(name_matching.edit_distances(name_1, names).tolist() == expected)
+        for max_distance in range(3):
+            bounded = [min(distance, max_distance+1) for distance in expected]
+            assert([name_matching.edit_distance(name_1, name_2, max_distance) for name_2 in names] == bounded)
+            assert(name_matching.edit_distances(name_1, names, max_distance).tolist() == bounded)
+
+    assert(name_matching.edit_distance('kitten', 'sitting') == 3)
+    assert(name_matching.edit_distances('kitten', []).tolist() == [])
+    assert(name_matching.edit_distances('', ['', 'ab']).tolist() == [0, 2])
+
+
+def test_similar_name_pairs():
+    names = random_names(120, 'abc d', seed=1)
+    expected = [(i, j, table_edit_distance(names[i], names[j]))
+        for i, j in itertools.combinations(range(len(names)), 2)]
+    expected = sorted(pair for pair in expected if pair[2] <= 2)
+    assert(sorted(name_matching.similar_name_pairs(names, 2)) == expected)
+
+
+def test_edit_distance_pairs():
+    for alphabet in ['ab', 'abc d', 'BUS 0123']:
+        names = random_names(120, alphabet)
+        distances = { (i, j):name_matching.edit_distance(names[i], names[j])
+            for i, j in itertools.combinations(range(len(names)), 2) }
+        for max_distance in range(4):
+            expected = set(pair for pair, distance in distances.items() if distance <= max_distance)
+            pairs = list(name_matching.edit_distance_pairs(names, max_distance))
+            assert(len(pairs) == len(set(pairs)))
+            assert(all(i < j for i, j in pairs))
+            assert(expected <= set(pairs))
+
+
+def test_candidates():
+    names = ['FAV SPOT 01', 'FAV SPOT 02', 'FAV PLACE 05', 'FAV PLC 08', 'AB']
+    index = name_matching.EditDistanceIndex(names, 2)
+    assert(index.candidates('FAV SPOT 1') == [0, 1])
+    assert(index.candidates('FAV PLACE 8') == [2])
+    assert(index.candidates('A') == [4])
+
+
+def test_prefix_pairs():
+    names = random_names(200, 'abc') + ['']
+    for min_ratio in [0.5, 0.75, 1.0]:
+        expected = set((i, j) for i, j in itertools.combinations(range(len(names)), 2)
+            if len(names[i]) > 0 and len(names[j]) > 0 and name_matching.prefix_size(names[i], names[j]) >= min_ratio)
+        pairs = list(name_matching.prefix_pairs(names, min_ratio))
+        assert(len(pairs) == len(set(pairs)))
+        assert(set(pairs) == expected)
+
+
+def test_fraken_name_merge(capfd):
+    raw_case = sub_comp.parse_raw(data_dir+'/frankenstein/network.raw', ['buses'])
+    buses = raw_case['buses']
+
+    bus_sets = DisjointSet(int(bus[0]) for bus in buses)
+    sub_comp.merge_edit_distance_names(bus_sets, buses)
+    assert(bus_sets.groups() == [[1001, 1002, 1003, 1004, 1006], [1005, 1007, 1009], [1008]])
+
+    bus_sets = DisjointSet(int(bus[0]) for bus in buses)
+    sub_comp.merge_prefix_names(bus_sets, buses, max_bus_delta=1)
+    assert(bus_sets.groups() == [[1001, 1002, 1003, 1004], [1005], [1006], [1007], [1008], [1009]])
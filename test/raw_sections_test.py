@@ -0,0 +1,81 @@
+import sys
+
+from common_test import data_dir
+
+sys.path.append('.')
+import raw_sections, sub_comp
+
+
+def test_fraken_sections():
+    with raw_sections.RawFile(data_dir+'/frankenstein/network.raw') as raw_file:
+        assert(raw_file.section_names() == raw_sections.v33_sections)
+
+        buses = list(raw_file.iter_fields('BUS'))
+        assert(len(buses) == 9)
+        assert(buses[0][1] == "'FAV SPOT 01'")
+
+        transformers = list(raw_file.iter_records('TRANSFORMER'))
+        assert([len(record) for record in transformers] == [4, 4, 5])
+
+        mt_dc_lines = list(raw_file.iter_records('MULTI-TERMINAL DC'))
+        assert(len(mt_dc_lines) == 1 and len(mt_dc_lines[0]) == 10)
+
+        assert(list(raw_file.iter_lines('MULTI-SECTION LINE')) == [])
+        assert(list(raw_file.iter_lines('NOT A SECTION')) == [])
+
+
+def test_small_blocks():
+    with raw_sections.RawFile(data_dir+'/nesta_case73_ieee_rts/network.raw') as raw_file:
+        assert(list(raw_file.iter_lines('GENERATOR', block_size=7)) == list(raw_file.iter_lines('GENERATOR')))
+
+
+def test_parse_raw():
+    raw_case = sub_comp.parse_raw(data_dir+'/nesta_case73_ieee_rts/network.raw')
+    assert({k:len(v) for k,v in raw_case.items()} == {
+        'buses': 73, 'loads': 51, 'f_shunts': 0, 'gens': 99,
+        'branches': 105, 'transformers': 15, 's_shunts': 3
+    })
+
+    raw_case = sub_comp.parse_raw(data_dir+'/frankenstein/network.raw', ['transformers'])
+    assert(list(raw_case.keys()) == ['transformers'])
+    assert([int(tr[2]) for tr in raw_case['transformers']] == [0, 0, 1003])
+
+
+def test_section_chunks():
+    with raw_sections.RawFile(data_dir+'/nesta_case73_ieee_rts/network.raw') as raw_file:
+        chunks = raw_file.section_chunks('BRANCH', 1000)
+        assert(len(chunks) > 1)
+        lines = [line for start, end in chunks for line in raw_file.iter_range_lines(start, end)]
+        assert(lines == list(raw_file.iter_lines('BRANCH')))
+
+        assert(len(raw_file.section_chunks('TRANSFORMER', 100)) == 1)
+        assert(raw_file.section_chunks('NOT A SECTION', 100) == [])
+
+
+def test_parse_raw_parallel():
+    for case in ['nesta_case73_ieee_rts', 'frankenstein']:
+        raw_file = data_dir+'/'+case+'/network.raw'
+        assert(sub_comp.parse_raw(raw_file, processes=2) == sub_comp.parse_raw(raw_file))
+
+
+def test_content_chunks(tmpdir):
+    raw_file = data_dir+'/nesta_case73_ieee_rts/network.raw'
+    with raw_sections.RawFile(raw_file) as psse_file:
+        chunks = psse_file.content_chunks('BRANCH', 8)
+        assert(len(chunks) > 1)
+        lines = [line for start, end in chunks for line in psse_file.iter_range_lines(start, end)]
+        assert(lines == list(psse_file.iter_lines('BRANCH')))
+        chunk_bytes = [psse_file.data[start:end] for start, end in chunks]
+        assert(psse_file.content_chunks('TRANSFORMER', 8) == [psse_file.sections['TRANSFORMER']])
+
+    # removing a line only changes the chunk that held it
+    with open(raw_file, 'rb') as file:
+        raw_lines = file.readlines()
+    line_number = raw_lines.index(next(raw_line for raw_line in raw_lines if raw_line.decode().strip() == lines[len(lines)//2]))
+    edited_file = str(tmpdir.join('network.raw'))
+    with open(edited_file, 'wb') as file:
+        file.writelines(raw_lines[:line_number] + raw_lines[line_number+1:])
+    with raw_sections.RawFile(edited_file) as psse_file:
+        edited_bytes = [psse_file.data[start:end] for start, end in psse_file.content_chunks('BRANCH', 8)]
+    assert(len(set(chunk_bytes) - set(edited_bytes)) == 1)
+    assert(len(set(edited_bytes) - set(chunk_bytes)) <= 1)
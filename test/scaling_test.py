@@ -0,0 +1,88 @@
+import sys, os, json
+
+sys.path.append('.')
+import benchmark, case_generator, connectivity_comp, geojson_comp
+from stage_profile import StageProfiler
+
+parser = connectivity_comp.build_cli_parser()
+
+# the stages of connectivity_comp and geojson_comp, and the whole run, may
+# grow at most growth_bound times faster than the number of buses between a
+# small and a large generated case, quadratic growth is bus_ratio times
+# faster.  stages that take less than min_seconds (cpu) or min_mb (peak
+# python allocations) are counted as taking that much, below it a stage is
+# too short to time reliably.
+growth_bound = 2.0
+min_seconds = 0.05
+min_mb = 0.5
+
+
+def profile_case(directory, bus_count, trace_memory=False, locations=False):
+    '''the stage records of connectivity_comp (--profile) and create_geojson
+    on a generated case, by stage name, and the whole run as 'total'.  with
+    locations the buses are placed by matching the location table (-L)
+    instead of by their geolocations.'''
+    raw_file, geolocations_file = benchmark.case_inputs(directory, bus_count)
+    output = os.path.join(directory, 'connectivity_{}.json'.format(bus_count))
+    profile = os.path.join(directory, 'profile_{}.json'.format(bus_count))
+    if locations:
+        locations_option = ['-L', case_generator.case_files(directory, bus_count)[1]]
+    else:
+        locations_option = ['-g', geolocations_file]
+    arguments = [raw_file] + locations_option + ['-k', '100', '-o', output, '--profile', profile, '--force']
+    if trace_memory:
+        arguments.append('--profile-memory')
+    connectivity_comp.main(parser.parse_args(arguments))
+
+    with open(profile) as file:
+        report = json.load(file)
+
+    profiler = StageProfiler(trace_memory)
+    with profiler.stage('create_geojson', items=bus_count):
+        geojson_comp.create_geojson(output, os.path.join(directory, 'geo_{}.json'.format(bus_count)))
+    profiler.close()
+
+    stages = {stage['name']: stage for stage in report['stages'] + profiler.stages}
+    total = {'name': 'total', 'cpu_seconds': report['cpu_seconds'] + stages['create_geojson']['cpu_seconds']}
+    if trace_memory:
+        total['traced_peak_mb'] = max(stage['traced_peak_mb'] for stage in stages.values())
+    stages['total'] = total
+    return stages
+
+
+def growth_failures(small, large, field, minimum, bus_ratio):
+    '''the stages whose field grew more than growth_bound times faster than
+    the buses, with their growth'''
+    failures = []
+    for name, stage in large.items():
+        growth = max(stage[field], minimum)/max(small[name][field], minimum)
+        if growth > growth_bound*bus_ratio:
+            failures.append((name, small[name][field], stage[field], growth))
+    return failures
+
+
+def test_time_scaling(tmpdir, capfd):
+    small = profile_case(str(tmpdir), 10000)
+    large = profile_case(str(tmpdir), 40000)
+    assert(set(small) == set(large))
+    assert('corridor aggregation' in large and 'create_geojson' in large)
+
+    failures = growth_failures(small, large, 'cpu_seconds', min_seconds, 4)
+    assert(failures == [])
+
+
+def test_memory_scaling(tmpdir, capfd):
+    small = profile_case(str(tmpdir), 500, trace_memory=True)
+    large = profile_case(str(tmpdir), 2000, trace_memory=True)
+
+    failures = growth_failures(small, large, 'traced_peak_mb', min_mb, 4)
+    assert(failures == [])
+
+
+def test_location_matching_scaling(tmpdir, capfd):
+    small = profile_case(str(tmpdir), 1000, locations=True)
+    large = profile_case(str(tmpdir), 4000, locations=True)
+
+    stage = 'location matching'
+    failures = growth_failures({stage: small[stage]}, {stage: large[stage]}, 'cpu_seconds', min_seconds, 4)
+    assert(failures == [])